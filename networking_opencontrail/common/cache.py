@@ -0,0 +1,83 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import collections
+import copy
+import threading
+
+from oslo_utils import timeutils
+
+
+class LRUCache(object):
+    """Size bounded cache with expiration of entries.
+
+    When the cache is full, the least recently used entry is evicted.
+    Values are deep-copied on the way in and out, so callers can freely
+    modify what they get without corrupting the cache.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0,
+                      'misses': 0,
+                      'evictions': 0,
+                      'expirations': 0,
+                      'invalidations': 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.stats['misses'] += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= timeutils.now():
+                self.stats['expirations'] += 1
+                self.stats['misses'] += 1
+                return default
+            # Re-insert to mark the entry as the most recently used one
+            self._entries[key] = entry
+            self.stats['hits'] += 1
+        return copy.deepcopy(value)
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        entry = (timeutils.now() + ttl, copy.deepcopy(value))
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def invalidate(self, match):
+        """Remove entries for which ``match(key)`` is true."""
+        with self._lock:
+            keys = [key for key in self._entries if match(key)]
+            for key in keys:
+                del self._entries[key]
+            self.stats['invalidations'] += len(keys)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,117 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import contextlib
+import threading
+
+import eventlet
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+def replace_pending(pending, new):
+    """Default merge policy: the newest item wins."""
+    return new
+
+
+class Coalescer(object):
+    """Merge items submitted for the same key within a time window.
+
+    The first item submitted for a key opens a window of ``window`` seconds.
+    Items submitted for that key before the window ends are merged into
+    the pending one with ``merge(pending, new)``, and only the result is
+    passed to ``flush(key, item)`` when the window closes. Flushes of the
+    same key run one at a time, so items of a key are flushed in order.
+    """
+
+    def __init__(self, window, flush, merge=replace_pending):
+        self.window = window
+        self._flush = flush
+        self._merge = merge
+        self._pending = {}
+        # Green threads flushing pending items when their windows close
+        self._timers = {}
+        # Locks serializing flushes by keys, with numbers of their users
+        self._flush_locks = {}
+        self._lock = threading.Lock()
+        self.stats = {'submitted': 0,
+                      'flushed': 0,
+                      'collapsed': 0,
+                      'discarded': 0}
+
+    def submit(self, key, item):
+        with self._lock:
+            self.stats['submitted'] += 1
+            if key in self._pending:
+                self._pending[key] = self._merge(self._pending[key], item)
+                self.stats['collapsed'] += 1
+                return
+            self._pending[key] = item
+            self._timers[key] = eventlet.spawn_after(self.window, self.flush,
+                                                     key)
+
+    def discard(self, key):
+        """Drop pending item, e.g. when the resource has been deleted."""
+        with self._lock:
+            item = self._pending.pop(key, None)
+            timer = self._timers.pop(key, None)
+            if item is not None:
+                self.stats['discarded'] += 1
+        if timer is not None:
+            # Timer must not flush an item submitted later, too early
+            timer.cancel()
+        return item
+
+    def flush(self, key):
+        with self._serialized(key):
+            with self._lock:
+                item = self._pending.pop(key, None)
+                timer = self._timers.pop(key, None)
+                if item is not None:
+                    self.stats['flushed'] += 1
+            if timer is not None:
+                # Nothing to do when the timer is the current green thread
+                timer.cancel()
+            if item is None:
+                return
+            try:
+                self._flush(key, item)
+            except Exception:
+                LOG.exception("Flushing coalesced item %s failed", key)
+
+    def flush_all(self):
+        with self._lock:
+            keys = list(self._pending)
+        for key in keys:
+            self.flush(key)
+
+    @contextlib.contextmanager
+    def _serialized(self, key):
+        with self._lock:
+            lock, users = self._flush_locks.get(key, (None, 0))
+            if lock is None:
+                lock = threading.Lock()
+            self._flush_locks[key] = (lock, users + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self._lock:
+                lock, users = self._flush_locks[key]
+                if users > 1:
+                    self._flush_locks[key] = (lock, users - 1)
+                else:
+                    del self._flush_locks[key]
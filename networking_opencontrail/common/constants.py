@@ -19,3 +19,14 @@ VNC_API_DEFAULT_PORT = 8082
 VNC_API_DEFAULT_BASE_URL = '/'
 VNC_API_DEFAULT_USE_SSL = False
 VNC_API_DEFAULT_INSECURE = False
+
+# Owners of ports created by the plugin for Tungsten Fabric compatibility
+TF_SNAT_DEVICE_OWNER = 'tf-compatibility:snat'
+TF_DNS_DEVICE_OWNER = 'tf-compatibility:dns'
+
+# Ports which the plugin does not propagate to Tungsten Fabric
+OMITTED_DEVICE_OWNERS = [
+    "network:floatingip",
+    TF_SNAT_DEVICE_OWNER,
+    TF_DNS_DEVICE_OWNER,
+]
@@ -0,0 +1,352 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import atexit
+import collections
+import copy
+import os
+import re
+import socket
+import tempfile
+import threading
+
+import eventlet
+from oslo_config import cfg
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                    10.0)
+
+# Values of circuit breaker states reported as gauges
+CIRCUIT_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+class RequestMetrics(object):
+    """Statistics of requests sent to Contrail API server.
+
+    Requests are aggregated by object type and operation, e.g.
+    ``('port', 'CREATE')`` for Neutron relay requests or
+    ``('virtual-router', 'GET')`` for VNC API requests. Every recorded
+    request is also passed to ``sink``, if given.
+
+    States of circuit breakers of API server endpoints are kept as well.
+    """
+
+    def __init__(self, sink=None):
+        self.sink = sink
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._circuits = {}
+
+    def record(self, obj_type, operation, duration, request_bytes=0,
+               response_bytes=0, status=None, retries=0):
+        """Record request which took ``duration`` seconds.
+
+        :param status: HTTP status of the response, None if the server
+            could not be reached
+        :param retries: number of times the request was re-sent, e.g.
+            with a refreshed token
+        """
+        key = (obj_type, operation)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = {
+                    'count': 0,
+                    'duration_sum': 0.0,
+                    'duration_max': 0.0,
+                    'duration_buckets': [0] * (len(DURATION_BUCKETS) + 1),
+                    'request_bytes': 0,
+                    'response_bytes': 0,
+                    'retries': 0,
+                    'statuses': collections.Counter(),
+                }
+            stats['count'] += 1
+            stats['duration_sum'] += duration
+            stats['duration_max'] = max(stats['duration_max'], duration)
+            stats['duration_buckets'][self._get_bucket(duration)] += 1
+            stats['request_bytes'] += request_bytes
+            stats['response_bytes'] += response_bytes
+            stats['retries'] += retries
+            stats['statuses'][str(status) if status else 'error'] += 1
+
+        if self.sink is not None:
+            try:
+                self.sink.emit(self, obj_type, operation, duration,
+                               request_bytes, response_bytes, status, retries)
+            except Exception:
+                LOG.exception("Cannot emit metrics of %s %s requests",
+                              operation, obj_type)
+
+    def record_circuit(self, endpoint, state):
+        """Record change of state of circuit breaker of ``endpoint``."""
+        with self._lock:
+            circuit = self._circuits.setdefault(
+                endpoint, {'state': state, 'opened': 0})
+            circuit['state'] = state
+            if state == 'open':
+                circuit['opened'] += 1
+
+        if self.sink is not None:
+            try:
+                self.sink.emit_circuit(self, endpoint, state)
+            except Exception:
+                LOG.exception("Cannot emit circuit state of %s", endpoint)
+
+    def snapshot(self):
+        """Return copy of statistics, by ``(obj_type, operation)``."""
+        with self._lock:
+            return copy.deepcopy(self._stats)
+
+    def circuits(self):
+        """Return copy of circuit breaker states, by endpoint."""
+        with self._lock:
+            return copy.deepcopy(self._circuits)
+
+    @staticmethod
+    def _get_bucket(duration):
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if duration <= bound:
+                return index
+        return len(DURATION_BUCKETS)
+
+
+class StatsdSink(object):
+    """Send every request as statsd timer and counters over UDP."""
+
+    def __init__(self, host, port, prefix):
+        self.address = (host, port)
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def emit(self, metrics, obj_type, operation, duration, request_bytes,
+             response_bytes, status, retries):
+        name = '.'.join((self.prefix, obj_type.replace('-', '_'),
+                         operation.lower()))
+        lines = [
+            '%s.duration:%.3f|ms' % (name, duration * 1000),
+            '%s.status.%s:1|c' % (name, status or 'error'),
+            '%s.request_bytes:%d|c' % (name, request_bytes),
+            '%s.response_bytes:%d|c' % (name, response_bytes),
+        ]
+        if retries:
+            lines.append('%s.retries:%d|c' % (name, retries))
+        self._send(lines)
+
+    def emit_circuit(self, metrics, endpoint, state):
+        # Dots and colons of the endpoint would break the metric name
+        name = '%s.circuit.%s' % (self.prefix,
+                                  re.sub(r'[^A-Za-z0-9_-]+', '_', endpoint))
+        self._send(['%s.state:%d|g' % (name, CIRCUIT_STATES[state])])
+
+    def _send(self, lines):
+        try:
+            self._socket.sendto('\n'.join(lines).encode('utf-8'),
+                                self.address)
+        except socket.error as e:
+            # Metrics must never fail requests
+            LOG.debug("Cannot send metrics to statsd: %s", e)
+
+
+class PrometheusFileSink(object):
+    """Write statistics in Prometheus text format, e.g. for node exporter.
+
+    Every process, e.g. every neutron-server API worker, has statistics of
+    its own, so it writes its own file: ``path`` with the process id
+    inserted before the extension, e.g. ``contrail.1234.prom``. Series are
+    labeled with ``pid`` too. Requests only mark statistics as changed,
+    a green thread of the process rewrites the file at most once per
+    ``interval`` seconds. The file is removed when the process exits.
+    """
+
+    def __init__(self, path, prefix, interval):
+        self.path = path
+        self.prefix = prefix
+        self.interval = interval
+        self._metrics = None
+        self._changed = threading.Event()
+        self._writer_pid = None
+        self._lock = threading.Lock()
+
+    def emit(self, metrics, *args):
+        self._set_changed(metrics)
+
+    def emit_circuit(self, metrics, endpoint, state):
+        self._set_changed(metrics)
+
+    def get_path(self, pid=None):
+        """Return path of the file written by process ``pid``."""
+        root, extension = os.path.splitext(self.path)
+        return '%s.%d%s' % (root, pid or os.getpid(), extension)
+
+    def flush(self):
+        """Write statistics, if changed since they were last written."""
+        if not self._changed.is_set():
+            return
+        self._changed.clear()
+        try:
+            self.write(self._metrics)
+        except Exception:
+            LOG.exception("Cannot write metrics to %s", self.get_path())
+
+    def write(self, metrics):
+        pid = os.getpid()
+        path = self.get_path(pid)
+        # Replace the file atomically, so that it is never read half-written
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path) or None,
+            prefix='.%s.' % os.path.basename(path))
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.format(metrics.snapshot(), metrics.circuits(),
+                                    pid))
+            os.rename(tmp_path, path)
+        except Exception:
+            self._remove(tmp_path)
+            raise
+
+    def _set_changed(self, metrics):
+        self._metrics = metrics
+        self._changed.set()
+        pid = os.getpid()
+        if self._writer_pid == pid:
+            return
+        with self._lock:
+            # The sink may have been created before API workers were forked
+            if self._writer_pid == pid:
+                return
+            self._writer_pid = pid
+            atexit.register(self._remove, self.get_path(pid))
+            eventlet.spawn_n(self._run)
+
+    def _run(self):
+        while True:
+            self._changed.wait()
+            self.flush()
+            eventlet.sleep(self.interval)
+
+    @staticmethod
+    def _remove(path):
+        # Statistics of a stopped process must not be reported anymore
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def format(self, snapshot, circuits=None, pid=None):
+        process = 'pid="%d",' % pid if pid is not None else ''
+        name = self.prefix + '_request'
+        lines = [
+            '# TYPE %s_duration_seconds histogram' % name,
+        ]
+        for (obj_type, operation), stats in sorted(snapshot.items()):
+            labels = '%sobj_type="%s",operation="%s"' % (process, obj_type,
+                                                         operation)
+            cumulative = 0
+            bounds = [str(bound) for bound in DURATION_BUCKETS] + ['+Inf']
+            for bound, count in zip(bounds, stats['duration_buckets']):
+                cumulative += count
+                lines.append('%s_duration_seconds_bucket{%s,le="%s"} %d' %
+                             (name, labels, bound, cumulative))
+            lines.append('%s_duration_seconds_sum{%s} %f' %
+                         (name, labels, stats['duration_sum']))
+            lines.append('%s_duration_seconds_count{%s} %d' %
+                         (name, labels, stats['count']))
+
+        for counter in ('request_bytes', 'response_bytes', 'retries'):
+            lines.append('# TYPE %s_%s_total counter' % (name, counter))
+            for (obj_type, operation), stats in sorted(snapshot.items()):
+                lines.append(
+                    '%s_%s_total{%sobj_type="%s",operation="%s"} %d' %
+                    (name, counter, process, obj_type, operation,
+                     stats[counter]))
+
+        lines.append('# TYPE %ss_total counter' % name)
+        for (obj_type, operation), stats in sorted(snapshot.items()):
+            for status, count in sorted(stats['statuses'].items()):
+                lines.append(
+                    '%ss_total{%sobj_type="%s",operation="%s",status="%s"} '
+                    '%d' % (name, process, obj_type, operation, status, count))
+
+        if circuits:
+            name = self.prefix + '_circuit'
+            lines.append('# TYPE %s_state gauge' % name)
+            for endpoint, circuit in sorted(circuits.items()):
+                lines.append('%s_state{%sendpoint="%s"} %d' %
+                             (name, process, endpoint,
+                              CIRCUIT_STATES[circuit['state']]))
+            lines.append('# TYPE %s_opened_total counter' % name)
+            for endpoint, circuit in sorted(circuits.items()):
+                lines.append('%s_opened_total{%sendpoint="%s"} %d' %
+                             (name, process, endpoint, circuit['opened']))
+        return '\n'.join(lines) + '\n'
+
+
+def _make_sink(conf):
+    if conf.sink == 'statsd':
+        return StatsdSink(conf.statsd_host, conf.statsd_port, conf.prefix)
+    if conf.sink == 'prometheus':
+        if not conf.prometheus_file:
+            LOG.error("[METRICS] prometheus_file is not set, metrics of "
+                      "API server requests are kept only in memory")
+            return None
+        return PrometheusFileSink(conf.prometheus_file, conf.prefix,
+                                  conf.prometheus_interval)
+    return None
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """Return metrics of this process, None if they are disabled."""
+    global _metrics
+    if _metrics is None:
+        conf = cfg.CONF.METRICS
+        if conf.sink == 'none':
+            return None
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = RequestMetrics(_make_sink(conf))
+    return _metrics
+
+
+def record(obj_type, operation, duration, request_bytes=0, response_bytes=0,
+           status=None, retries=0):
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.record(obj_type, operation, duration, request_bytes,
+                       response_bytes, status, retries)
+
+
+def record_circuit(endpoint, state):
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.record_circuit(endpoint, state)
+
+
+def snapshot():
+    metrics = get_metrics()
+    return metrics.snapshot() if metrics is not None else {}
+
+
+def reset():
+    global _metrics
+    with _metrics_lock:
+        _metrics = None
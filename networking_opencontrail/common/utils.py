@@ -12,12 +12,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from neutron_lib import context as n_context
 import requests
 
 from oslo_config import cfg
 
 from networking_opencontrail.common import constants
 
+# Attributes of request context sent to the API server on its behalf
+CONTEXT_ATTRIBUTES = ('user_id', 'project_id', 'is_admin', 'roles',
+                      'request_id')
+
 vnc_opts = [
     cfg.StrOpt('api_server_ip',
                default=constants.VNC_API_DEFAULT_HOST,
@@ -39,7 +44,121 @@ vnc_opts = [
     cfg.StrOpt('keyfile',
                help='Key file path to connect securely to  VNC API'),
     cfg.StrOpt('cafile',
-               help='CA file path to connect securely to VNC API')
+               help='CA file path to connect securely to VNC API'),
+    cfg.IntOpt('auth_token_refresh_margin',
+               default=60, min=0,
+               help='Time in seconds before expiration of the Keystone '
+               'token when it is refreshed in background'),
+    cfg.IntOpt('http_pool_connections',
+               default=4, min=1,
+               help='Number of remote hosts (API servers and Keystone) '
+               'for which persistent connections are pooled'),
+    cfg.IntOpt('http_pool_maxsize',
+               default=10, min=1,
+               help='Maximum number of persistent connections kept open '
+               'to each API server by a single neutron-server process'),
+    cfg.BoolOpt('http_pool_block',
+                default=False,
+                help='Wait for a free pooled connection when all of them are '
+                'busy, instead of opening an extra one. Makes '
+                'http_pool_maxsize a hard limit of concurrent connections '
+                'to each API server'),
+    cfg.FloatOpt('connect_timeout',
+                 default=10.0, min=0.0,
+                 help='Time in seconds to wait for a connection to the API '
+                 'server or Keystone to be established. 0 waits as long as '
+                 'the operating system does'),
+    cfg.IntOpt('circuit_breaker_threshold',
+               default=5, min=0,
+               help='Number of consecutive failed requests to an API server '
+               'after which requests to it fail immediately, without '
+               'waiting for connection timeouts. 0 disables the circuit '
+               'breaker'),
+    cfg.FloatOpt('circuit_breaker_reset_timeout',
+                 default=30.0, min=0.0,
+                 help='Time in seconds for which requests to an unavailable '
+                 'API server fail immediately, before a single request is '
+                 'sent to check if it is available again'),
+    cfg.FloatOpt('port_update_coalescing_window',
+                 default=0.0, min=0.0,
+                 help='Time in seconds for which port updates are held back '
+                 'and merged with following updates of the same port, so '
+                 'that only the final state is sent to the API server. '
+                 '0 disables coalescing'),
+    cfg.IntOpt('resource_cache_size',
+               default=0, min=0,
+               help='Maximum number of resources read from the API server '
+               'kept in a cache of each neutron-server process. '
+               '0 disables the cache'),
+    cfg.FloatOpt('resource_cache_ttl',
+                 default=5.0, min=0.0,
+                 help='Time in seconds for which a cached resource is used '
+                 'without reading it again from the API server. It bounds '
+                 'staleness of resources changed by other processes'),
+    cfg.IntOpt('vrouter_cache_ttl',
+               default=60, min=0,
+               help='Time in seconds for which a host found to run vRouter '
+               'is remembered when binding ports. 0 disables caching'),
+    cfg.IntOpt('vrouter_negative_cache_ttl',
+               default=10, min=0,
+               help='Time in seconds for which a host found not to run '
+               'vRouter is remembered when binding ports. 0 disables '
+               'caching'),
+    cfg.FloatOpt('port_create_batch_window',
+                 default=0.0, min=0.0,
+                 help='Time in seconds for which ports created by the same '
+                 'Neutron request, e.g. a bulk create, are collected and '
+                 'then sent to the API server together. A port created '
+                 'alone waits for the window too, unless it is bound or '
+                 'updated earlier. 0 disables batching'),
+    cfg.IntOpt('port_create_batch_size',
+               default=8, min=1,
+               help='Maximum number of concurrent requests sent to the API '
+               'server when creating ports in bulk'),
+    cfg.IntOpt('max_concurrent_requests',
+               default=8, min=1,
+               help='Maximum number of independent requests, e.g. reads of '
+               'several resources, sent concurrently to the API server by '
+               'one operation'),
+    cfg.IntOpt('list_page_size',
+               default=0, min=0,
+               help='Maximum number of resources read from the API server '
+               'in one response when listing them. Lists are read in pages '
+               'with limit and marker, and each page is decoded while it is '
+               'received. 0 reads each list in one response'),
+    cfg.StrOpt('json_codec',
+               default='auto', choices=('auto', 'orjson', 'json'),
+               help='Library encoding and decoding JSON bodies of requests '
+               'to the API server. auto uses orjson when it is installed '
+               'and the json module of the standard library otherwise'),
+    cfg.BoolOpt('compression',
+                default=False,
+                help='Send large request bodies to the API server gzipped. '
+                'The API server, or a proxy in front of it, must accept '
+                'gzipped requests. Gzipped responses are accepted '
+                'regardless of this option'),
+    cfg.IntOpt('compression_threshold',
+               default=1024, min=0,
+               help='Minimum size in bytes of a request body which is sent '
+               'gzipped, when compression is enabled'),
+    cfg.IntOpt('snat_retry_attempts',
+               default=6, min=1,
+               help='Number of attempts to read SNAT service of a router, '
+               'which Tungsten Fabric creates asynchronously'),
+    cfg.FloatOpt('snat_retry_initial_delay',
+                 default=0.05, min=0.0,
+                 help='Time in seconds to wait before the first retry of '
+                 'reading SNAT service of a router. Next retries wait '
+                 'twice as long as the previous one'),
+    cfg.FloatOpt('snat_retry_max_delay',
+                 default=1.0, min=0.0,
+                 help='Maximum time in seconds to wait between attempts '
+                 'to read SNAT service of a router'),
+    cfg.BoolOpt('snat_sync_async',
+                default=False,
+                help='Synchronize SNAT interfaces of routers in background, '
+                'so that router requests return as soon as Tungsten Fabric '
+                'accepts the router'),
 ]
 
 dm_integration_opts = [
@@ -50,6 +169,100 @@ dm_integration_opts = [
     cfg.StrOpt('topology',
                help='File path to yaml file with topology of baremetals '
                'used by DM integration'),
+    cfg.IntOpt('topology_file_check_interval',
+               default=0, min=0,
+               help='Check topology file for changes at most once per this '
+               'number of seconds and reload it when changed, without '
+               'restarting neutron-server. 0 loads the file only on '
+               'start'),
+    cfg.IntOpt('topology_refresh_interval',
+               default=0, min=0,
+               help='Keep topology read from the API server in memory and '
+               'reload it when older than this number of seconds. 0 reads '
+               'nodes and ports from the API server on every lookup'),
+    cfg.IntOpt('cache_ttl',
+               default=0, min=0,
+               help='Time in seconds fabrics of switches and auto-created '
+               'VPGs read from the API server are cached for. The cache '
+               'is kept by each process: VPGs changed by the process '
+               'update it at once, VPGs created elsewhere are read when '
+               'not cached, VPGs changed or deleted elsewhere may be used '
+               'until their entry expires or creating a VMI with them '
+               'fails. 0 disables caching'),
+    cfg.FloatOpt('vlan_tagging_reconcile_window',
+                 default=0.0, min=0.0,
+                 help='Time in seconds for which port events are collected '
+                 'and then VMIs of each touched network and host are '
+                 'created or deleted once, after listing their ports. '
+                 '0 handles every port event separately'),
+]
+
+journal_opts = [
+    cfg.BoolOpt('enabled',
+                default=False,
+                help='Record ML2 operations in a journal table, within '
+                'the Neutron transaction, and synchronize them with '
+                'Tungsten Fabric in background, instead of calling the API '
+                'server within the Neutron request'),
+    cfg.IntOpt('sync_interval',
+               default=10, min=1,
+               help='Interval in seconds between scans of the journal '
+               'for entries to (re)try'),
+    cfg.IntOpt('max_retries',
+               default=5, min=1,
+               help='Number of attempts to synchronize a journal entry '
+               'before it is marked as failed'),
+    cfg.IntOpt('processing_timeout',
+               default=100, min=1,
+               help='Time in seconds after which an entry left in '
+               'processing state, e.g. by a dead worker, is retried'),
+]
+
+full_sync_opts = [
+    cfg.IntOpt('interval',
+               default=0, min=0,
+               help='Interval in seconds between full synchronizations of '
+               'Neutron resources with Tungsten Fabric, run by a worker of '
+               'neutron-server. 0 disables periodic synchronization'),
+    cfg.IntOpt('page_size',
+               default=500, min=1,
+               help='Number of resources read from Neutron in one page '
+               'during full synchronization'),
+    cfg.BoolOpt('delete_extra',
+                default=False,
+                help='Delete resources which exist only in Tungsten Fabric '
+                'during full synchronization, instead of only reporting '
+                'them'),
+]
+
+metrics_opts = [
+    cfg.StrOpt('sink',
+               default='none',
+               choices=['none', 'memory', 'statsd', 'prometheus'],
+               help='Where to report duration, size, status and retries '
+               'of requests sent to the API server: nowhere, only in '
+               'memory of the process, to statsd over UDP or to a '
+               'Prometheus text file'),
+    cfg.StrOpt('prefix',
+               default='networking_opencontrail',
+               help='Prefix of reported metric names'),
+    cfg.HostAddressOpt('statsd_host',
+                       default='127.0.0.1',
+                       help='Host of statsd daemon'),
+    cfg.PortOpt('statsd_port',
+                default=8125,
+                help='UDP port of statsd daemon'),
+    cfg.StrOpt('prometheus_file',
+               help='Path of file with metrics in Prometheus text format, '
+               'e.g. in directory of node exporter textfile collector. '
+               'Each process writes its own file, with its pid inserted '
+               'before the extension and as the pid label of its series, '
+               'and removes it on exit'),
+    cfg.FloatOpt('prometheus_interval',
+                 default=10.0, min=0.0,
+                 help='Minimum time in seconds between rewrites of '
+                 'Prometheus metrics file. The file is rewritten in '
+                 'background, only when metrics changed'),
 ]
 
 
@@ -57,6 +270,33 @@ def register_vnc_api_options():
     """Register Contrail Neutron core plugin configuration flags"""
     cfg.CONF.register_opts(vnc_opts, 'APISERVER')
     cfg.CONF.register_opts(dm_integration_opts, 'DM_INTEGRATION')
+    cfg.CONF.register_opts(journal_opts, 'JOURNAL')
+    cfg.CONF.register_opts(full_sync_opts, 'FULL_SYNC')
+    cfg.CONF.register_opts(metrics_opts, 'METRICS')
+
+
+def context_to_dict(context):
+    """Return attributes of request context, e.g. to store it in journal."""
+    return dict((attribute, getattr(context, attribute, None))
+                for attribute in CONTEXT_ATTRIBUTES)
+
+
+def context_from_dict(values):
+    """Return new request context with attributes from context_to_dict."""
+    return n_context.Context(values.get('user_id'), values.get('project_id'),
+                             is_admin=bool(values.get('is_admin')),
+                             roles=list(values.get('roles') or []),
+                             request_id=values.get('request_id'))
+
+
+def detach_context(context):
+    """Return copy of request context usable after the request is finished.
+
+    Operations deferred to green threads must not use the request context,
+    as its database session belongs to the finished request. The copy has
+    the same tenant, user and request id, and a session of its own.
+    """
+    return context_from_dict(context_to_dict(context))
 
 
 def vnc_api_is_authenticated():
@@ -0,0 +1,106 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import datetime
+
+from neutron_lib import context as n_context
+from neutron_lib.db import api as db_api
+from oslo_serialization import jsonutils
+from oslo_utils import timeutils
+
+from networking_opencontrail.common import utils
+from networking_opencontrail.db import models
+
+
+def create_pending_row(context, object_type, object_uuid, operation, data):
+    row = models.OpenContrailJournal(object_type=object_type,
+                                     object_uuid=object_uuid,
+                                     operation=operation,
+                                     data=jsonutils.dumps(data),
+                                     context=jsonutils.dumps(
+                                         utils.context_to_dict(context)),
+                                     state=models.PENDING,
+                                     retry_count=0)
+    with db_api.CONTEXT_WRITER.using(context):
+        context.session.add(row)
+    return row
+
+
+def get_unfinished_rows(context, limit):
+    """Return the oldest rows which still wait for or are in processing."""
+    with db_api.CONTEXT_READER.using(context):
+        query = context.session.query(models.OpenContrailJournal).filter(
+            models.OpenContrailJournal.state.in_(
+                [models.PENDING, models.PROCESSING]))
+        return query.order_by(
+            models.OpenContrailJournal.seqnum).limit(limit).all()
+
+
+def get_row_data(row):
+    return jsonutils.loads(row.data) if row.data else {}
+
+
+def get_row_context(row):
+    """Return context of the request which recorded the row.
+
+    Rows without recorded context are synchronized as admin.
+    """
+    if not row.context:
+        return n_context.get_admin_context()
+    return utils.context_from_dict(jsonutils.loads(row.context))
+
+
+def lock_pending_row(context, row):
+    """Mark row as processed, unless another worker has already taken it.
+
+    :returns: True if this worker owns the row
+    """
+    with db_api.CONTEXT_WRITER.using(context):
+        count = context.session.query(models.OpenContrailJournal).filter_by(
+            seqnum=row.seqnum, state=models.PENDING).update(
+            {'state': models.PROCESSING,
+             'last_retried': timeutils.utcnow()},
+            synchronize_session=False)
+    return count == 1
+
+
+def delete_row(context, row):
+    with db_api.CONTEXT_WRITER.using(context):
+        context.session.query(models.OpenContrailJournal).filter_by(
+            seqnum=row.seqnum).delete(synchronize_session=False)
+
+
+def update_row_after_failure(context, row, max_retries):
+    """Return row to the queue or mark it failed when out of retries."""
+    retry_count = (row.retry_count or 0) + 1
+    state = models.FAILED if retry_count >= max_retries else models.PENDING
+    with db_api.CONTEXT_WRITER.using(context):
+        context.session.query(models.OpenContrailJournal).filter_by(
+            seqnum=row.seqnum).update(
+            {'state': state,
+             'retry_count': retry_count,
+             'last_retried': timeutils.utcnow()},
+            synchronize_session=False)
+    return state
+
+
+def reset_stale_processing_rows(context, timeout):
+    """Return rows left by a dead worker back to the pending state."""
+    deadline = timeutils.utcnow() - datetime.timedelta(seconds=timeout)
+    with db_api.CONTEXT_WRITER.using(context):
+        return context.session.query(models.OpenContrailJournal).filter(
+            models.OpenContrailJournal.state == models.PROCESSING,
+            models.OpenContrailJournal.last_retried < deadline).update(
+            {'state': models.PENDING}, synchronize_session=False)
@@ -0,0 +1,30 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""start networking-opencontrail chain
+
+Revision ID: start_networking_opencontrail
+Revises: None
+Create Date: 2019-06-03 10:00:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'start_networking_opencontrail'
+down_revision = None
+
+
+def upgrade():
+    pass
@@ -0,0 +1,33 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""Initial contract branch of networking-opencontrail
+
+Revision ID: bda89b861df4
+Revises: start_networking_opencontrail
+Create Date: 2019-06-03 10:00:00.000000
+
+"""
+
+from neutron.db.migration import cli
+
+# revision identifiers, used by Alembic.
+revision = 'bda89b861df4'
+down_revision = 'start_networking_opencontrail'
+branch_labels = (cli.CONTRACT_BRANCH,)
+
+
+def upgrade():
+    pass
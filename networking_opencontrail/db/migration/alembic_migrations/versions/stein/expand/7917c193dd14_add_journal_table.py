@@ -0,0 +1,53 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""Add journal table for asynchronous Contrail synchronization
+
+Revision ID: 7917c193dd14
+Revises: start_networking_opencontrail
+Create Date: 2019-06-03 10:00:00.000000
+
+"""
+
+from alembic import op
+from neutron.db.migration import cli
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '7917c193dd14'
+down_revision = 'start_networking_opencontrail'
+branch_labels = (cli.EXPAND_BRANCH,)
+
+
+def upgrade():
+    op.create_table(
+        'opencontrail_journal',
+        sa.Column('seqnum', sa.BigInteger(),
+                  primary_key=True, autoincrement=True),
+        sa.Column('object_type', sa.String(36), nullable=False),
+        sa.Column('object_uuid', sa.String(36), nullable=False),
+        sa.Column('operation', sa.String(36), nullable=False),
+        sa.Column('data', sa.Text(), nullable=True),
+        sa.Column('context', sa.Text(), nullable=True),
+        sa.Column('state',
+                  sa.Enum('pending', 'processing', 'failed',
+                          name='opencontrail_journal_state'),
+                  nullable=False, default='pending'),
+        sa.Column('retry_count', sa.Integer(), default=0),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('last_retried', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_opencontrail_journal_state_seqnum',
+                    'opencontrail_journal', ['state', 'seqnum'])
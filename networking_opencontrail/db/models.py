@@ -0,0 +1,50 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+from neutron_lib.db import model_base
+from oslo_utils import timeutils
+import sqlalchemy as sa
+
+PENDING = 'pending'
+PROCESSING = 'processing'
+FAILED = 'failed'
+
+
+class OpenContrailJournal(model_base.BASEV2):
+    """Operation waiting to be synchronized with Tungsten Fabric."""
+
+    __tablename__ = 'opencontrail_journal'
+
+    seqnum = sa.Column(sa.BigInteger().with_variant(sa.Integer(), 'sqlite'),
+                       primary_key=True, autoincrement=True)
+    object_type = sa.Column(sa.String(36), nullable=False)
+    object_uuid = sa.Column(sa.String(36), nullable=False)
+    operation = sa.Column(sa.String(36), nullable=False)
+    data = sa.Column(sa.Text, nullable=True)
+    # Tenant and user of the request which recorded the operation
+    context = sa.Column(sa.Text, nullable=True)
+    state = sa.Column(sa.Enum(PENDING, PROCESSING, FAILED,
+                              name='opencontrail_journal_state'),
+                      nullable=False, default=PENDING)
+    retry_count = sa.Column(sa.Integer, default=0)
+    created_at = sa.Column(sa.DateTime, nullable=False,
+                           default=timeutils.utcnow)
+    last_retried = sa.Column(sa.DateTime, nullable=False,
+                             default=timeutils.utcnow)
+
+    __table_args__ = (
+        sa.Index('ix_opencontrail_journal_state_seqnum', 'state', 'seqnum'),
+        model_base.BASEV2.__table_args__
+    )
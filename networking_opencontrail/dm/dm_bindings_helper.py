@@ -13,16 +13,21 @@
 #    under the License.
 #
 import json
+import threading
 
 from oslo_config import cfg
 from oslo_log import log as logging
 
+from networking_opencontrail.common import cache
 from networking_opencontrail.dm.dm_topology import DmTopologyApi
+from networking_opencontrail.dm.dm_topology import DmTopologyApiCached
 from networking_opencontrail.dm.dm_topology import DmTopologyFile
 
 LOG = logging.getLogger(__name__)
 
 DM_MANAGED_VNIC_TYPE = 'baremetal'
+# Maximum number of switches and VPGs cached
+CACHE_SIZE = 1000
 
 
 class DmBindingsHelper(object):
@@ -35,11 +40,26 @@ class DmBindingsHelper(object):
     def __init__(self, tf_client):
         self.tf_client = tf_client
         topology_file = cfg.CONF.DM_INTEGRATION.topology
+        refresh_interval = cfg.CONF.DM_INTEGRATION.topology_refresh_interval
         if topology_file:
-            self.topology = DmTopologyFile(topology_file)
+            self.topology = DmTopologyFile(
+                topology_file,
+                cfg.CONF.DM_INTEGRATION.topology_file_check_interval)
+        elif refresh_interval:
+            self.topology = DmTopologyApiCached(self.tf_client,
+                                                refresh_interval)
         else:
             self.topology = DmTopologyApi(self.tf_client)
 
+        self.cache_ttl = cfg.CONF.DM_INTEGRATION.cache_ttl
+        self._fabric_cache = cache.LRUCache(CACHE_SIZE, self.cache_ttl)
+        # Names of auto-created VPGs by sets of their (switch, port) pairs
+        self._vpg_index = cache.LRUCache(CACHE_SIZE, self.cache_ttl)
+        # Keys of VPGs in the index by their names
+        self._vpg_keys = {}
+        self._vpg_index_lock = threading.Lock()
+        self.tf_client.add_change_listener(self._update_vpg_index)
+
     def initialize(self):
         self.topology.initialize()
 
@@ -47,12 +67,20 @@ class DmBindingsHelper(object):
         return host_id in self.topology
 
     def get_bindings_for_host(self, host_id):
-        node = self.topology.get_node(host_id)
-
+        try:
+            return self._get_bindings_for_node(
+                self.topology.get_node(host_id))
+        except PhysicalInterfaceNotFoundError:
+            # Physical interfaces may have changed since topology was read
+            if not self.topology.refresh_node(host_id):
+                raise
+            return self._get_bindings_for_node(
+                self.topology.get_node(host_id))
+
+    def _get_bindings_for_node(self, node):
         port_profiles = []
         for port in node['ports']:
-            fabric_name = self.tf_client.read_fabric_name_from_switch(
-                port['switch_name'])
+            fabric_name = self._get_fabric_name(port['switch_name'])
 
             if not fabric_name:
                 LOG.error("Cannot find fabric name for switch %s" %
@@ -73,31 +101,105 @@ class DmBindingsHelper(object):
 
         return self.tf_client.make_key_value_pairs(bindings_list)
 
+    def drop_cached_vpg(self, host_id):
+        """Drop VPG cached for ports of host, e.g. when it was rejected.
+
+        Return True when an entry was dropped, so that bindings got again
+        are made of the VPG read from the API server.
+        """
+        if not self.cache_ttl:
+            return False
+        node = self.topology.get_node(host_id)
+        if not node:
+            return False
+        vpg_name = self._vpg_index.get(self._get_ports_key(node['ports']))
+        if not vpg_name:
+            return False
+        self._drop_vpg_index_entry(vpg_name)
+        return True
+
     def _find_existing_vpg(self, ports):
+        required_pi = self._get_ports_key(ports)
+        if self.cache_ttl:
+            vpg_name = self._vpg_index.get(required_pi)
+            if vpg_name:
+                return vpg_name
+
+        vpg_name = self._read_existing_vpg(ports, required_pi)
+        if vpg_name and self.cache_ttl:
+            self._set_vpg_index_entry(vpg_name, required_pi)
+        return vpg_name
+
+    def _read_existing_vpg(self, ports, required_pi):
         pi = self.tf_client.read_pi_from_switch(ports[0]['switch_name'],
                                                 ports[0]['port_name'])
-
         if not pi:
             LOG.error("PI %s on switch %s not found in API" %
                       (ports[0]['port_name'], ports[0]['switch_name']))
             raise PhysicalInterfaceNotFoundError
 
-        vpg_refs = pi.get_virtual_port_group_back_refs() or []
-        for vpg_ref in vpg_refs:
-            vpg = self.tf_client.get_virtual_port_group(
-                uuid=vpg_ref['uuid'])
-            if vpg.get_virtual_port_group_user_created():
-                continue
-            pi_refs = vpg.get_physical_interface_refs() or []
-            if self._check_refs_to_all_ports(pi_refs, ports):
+        for vpg_ref in pi.get_virtual_port_group_back_refs() or []:
+            vpg = self.tf_client.get_virtual_port_group(uuid=vpg_ref['uuid'])
+            if vpg and self._get_vpg_key(vpg) == required_pi:
                 return vpg.fq_name[-1]
         return None
 
-    def _check_refs_to_all_ports(self, pi_refs, ports):
-        required_pi = {(port['switch_name'], port['port_name'])
-                       for port in ports}
-        existing_refs = {(ref['to'][-2], ref['to'][-1]) for ref in pi_refs}
-        return required_pi == existing_refs
+    def _get_fabric_name(self, switch_name):
+        fabric_name = self._fabric_cache.get(switch_name)
+        if fabric_name is None:
+            fabric_name = self.tf_client.read_fabric_name_from_switch(
+                switch_name)
+            if fabric_name:
+                self._fabric_cache.set(switch_name, fabric_name)
+        return fabric_name
+
+    @staticmethod
+    def _get_ports_key(ports):
+        return frozenset((port['switch_name'], port['port_name'])
+                         for port in ports)
+
+    @staticmethod
+    def _get_vpg_key(vpg):
+        """Return set of (switch, port) pairs of VPG, None if not usable."""
+        # Don't connect to VPGs created manually by someone
+        if vpg.get_virtual_port_group_user_created():
+            return None
+        pi_refs = vpg.get_physical_interface_refs()
+        if not pi_refs:
+            return None
+        return frozenset((ref['to'][-2], ref['to'][-1]) for ref in pi_refs)
+
+    def _set_vpg_index_entry(self, vpg_name, key):
+        with self._vpg_index_lock:
+            old_key = self._vpg_keys.get(vpg_name)
+            self._vpg_keys[vpg_name] = key
+        if old_key is not None and old_key != key:
+            self._vpg_index.invalidate(lambda index_key: index_key == old_key)
+        self._vpg_index.set(key, vpg_name)
+
+    def _drop_vpg_index_entry(self, vpg_name):
+        with self._vpg_index_lock:
+            old_key = self._vpg_keys.pop(vpg_name, None)
+        if old_key is not None:
+            self._vpg_index.invalidate(lambda index_key: index_key == old_key)
+
+    def _update_vpg_index(self, obj_type, operation, obj):
+        """Update index entry of VPG changed through tf_client.
+
+        VPGs created by Device Manager or other workers are found by
+        reading physical interfaces on index miss. Those changed or deleted
+        elsewhere are noticed once their entries expire, or dropped with
+        drop_cached_vpg when VMI creation with them fails.
+        """
+        if obj_type != 'virtual_port_group' or not self.cache_ttl:
+            return
+
+        key = self._get_vpg_key(obj)
+        # Auto-created VPG is deleted with its last VMI
+        if key is None or not obj.get_virtual_machine_interface_refs():
+            self._drop_vpg_index_entry(obj.fq_name[-1])
+            return
+        self._set_vpg_index_entry(obj.fq_name[-1], key)
 
 
 class FabricNotFoundError(Exception):
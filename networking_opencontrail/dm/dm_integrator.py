@@ -19,7 +19,10 @@ from neutron_lib import constants
 from neutron_lib.plugins import directory
 from oslo_config import cfg
 from oslo_log import log as logging
+from osprofiler import profiler
 
+from networking_opencontrail.common import coalescer
+from networking_opencontrail.common import utils
 from networking_opencontrail.dm.dm_bindings_helper import DmBindingsHelper
 from networking_opencontrail.drivers.vnc_api_driver import VncApiClient
 
@@ -32,6 +35,12 @@ class DeviceManagerIntegrator(object):
     This class provides support for Device Manager to inform it
     about L2 virtual networks that are used by virtual machines.
     It allows DM to properly configure physical devices inside Fabric.
+
+    One VMI is created for all ports of a network bound to a host. With
+    [DM_INTEGRATION] vlan_tagging_reconcile_window set, port events are
+    not handled one by one. Instead, VMIs of the touched network and host
+    pairs are reconciled once per window with ports in Neutron, which
+    saves listing the ports after each of many ports deleted at once.
     """
 
     REQUIRED_PORT_FIELDS = [
@@ -43,11 +52,17 @@ class DeviceManagerIntegrator(object):
     def __init__(self):
         self.tf_client = VncApiClient()
         self.bindings_helper = DmBindingsHelper(self.tf_client)
+        self.reconciler = None
+        window = cfg.CONF.DM_INTEGRATION.vlan_tagging_reconcile_window
+        if window > 0:
+            self.reconciler = coalescer.Coalescer(
+                window, self._reconcile_vlan_tagging)
 
     def initialize(self):
         if self.enabled:
             self.bindings_helper.initialize()
 
+    @profiler.trace('dm_integration', hide_args=True)
     def sync_vlan_tagging_for_port(self, context, port, previous_port):
         if self._check_data_was_changed(port, previous_port):
             self.delete_vlan_tagging_for_port(context, previous_port)
@@ -58,6 +73,13 @@ class DeviceManagerIntegrator(object):
                       "connected VM. DM integration skipped. " % (host_id))
             return
 
+        if self.reconciler:
+            self._submit_reconciliation(context, port)
+            return
+
+        self._create_vlan_tagging(context, port)
+
+    def _create_vlan_tagging(self, context, port):
         network_id = port['network_id']
         vlan_tag = self._get_vlan_tag(context, network_id)
         if not vlan_tag:
@@ -80,13 +102,24 @@ class DeviceManagerIntegrator(object):
             return
 
         properties = self.tf_client.make_vmi_properties_with_vlan_tag(vlan_tag)
-        bindings = self.bindings_helper.get_bindings_for_host(
-            port['binding:host_id'])
+        host_id = port['binding:host_id']
+        try:
+            self._create_vmi(vmi_name, tf_vn, properties, host_id, tf_project)
+        except Exception:
+            # Cached VPG may have been deleted meanwhile, e.g. through
+            # another Neutron worker, so retry with one read again
+            if not self.bindings_helper.drop_cached_vpg(host_id):
+                raise
+            LOG.warning("Cannot create VMI %s with cached VPG, retrying",
+                        vmi_name)
+            self._create_vmi(vmi_name, tf_vn, properties, host_id, tf_project)
+        LOG.debug("Created VMI with bindings for DM for port %s", port['id'])
+
+    def _create_vmi(self, vmi_name, tf_vn, properties, host_id, tf_project):
+        bindings = self.bindings_helper.get_bindings_for_host(host_id)
         vmi = self.tf_client.make_virtual_machine_interface(
             vmi_name, tf_vn, properties, bindings, tf_project)
-
         self.tf_client.create_virtual_machine_interface(vmi)
-        LOG.debug("Created VMI with bindings for DM for port %s", port['id'])
 
     def delete_vlan_tagging_for_port(self, context, port):
         if not self._check_contains_required_fields(port):
@@ -94,6 +127,10 @@ class DeviceManagerIntegrator(object):
                       "DM skipped" % port['id'])
             return
 
+        if self.reconciler:
+            self._submit_reconciliation(context, port)
+            return
+
         tf_project = self.tf_client.get_project(
             str(uuid.UUID(port['tenant_id'])))
         vmi_name = self._make_vmi_name(port)
@@ -108,12 +145,51 @@ class DeviceManagerIntegrator(object):
         are_ports_assigned = any(
             port for port in vmi_ports if self._check_should_be_tagged(port))
         if existing_vmi and not are_ports_assigned:
-            self._detach_vmi_from_vpg(existing_vmi)
-            self.tf_client.delete_virtual_machine_interface(
-                fq_name=vmi_fq_name)
+            self._delete_vmi(existing_vmi, vmi_fq_name)
             LOG.debug("Deleted VMI with bindings for DM for port %s" %
                       port['id'])
 
+    def _submit_reconciliation(self, context, port):
+        # VMI is identified by its project, network and host
+        key = (port['tenant_id'], port['network_id'], port['binding:host_id'])
+        # Reconciliation runs after the request has finished
+        self.reconciler.submit(key, (utils.detach_context(context), port))
+
+    def _reconcile_vlan_tagging(self, key, item):
+        """Create or delete VMI of network and host to match their ports.
+
+        The VMI is required as long as any port of the network on the host
+        is connected to a VM.
+        """
+        context, port = item
+        vmi_ports = self._core_plugin.get_ports(
+            context, filters={
+                'network_id': [port['network_id']],
+                'binding:host_id': [port['binding:host_id']]})
+        tagged_ports = [vmi_port for vmi_port in vmi_ports
+                        if self._check_should_be_tagged(vmi_port)]
+        project_ports = [vmi_port for vmi_port in tagged_ports
+                         if vmi_port['tenant_id'] == port['tenant_id']]
+        if project_ports:
+            self._create_vlan_tagging(context, project_ports[0])
+            return
+        if tagged_ports:
+            return
+
+        tf_project = self.tf_client.get_project(
+            str(uuid.UUID(port['tenant_id'])))
+        vmi_fq_name = tf_project.fq_name + [self._make_vmi_name(port)]
+        existing_vmi = self.tf_client.get_virtual_machine_interface(
+            fq_name=vmi_fq_name)
+        if existing_vmi:
+            self._delete_vmi(existing_vmi, vmi_fq_name)
+            LOG.debug("Deleted VMI with bindings for DM for network %s on "
+                      "host %s", port['network_id'], port['binding:host_id'])
+
+    def _delete_vmi(self, vmi, vmi_fq_name):
+        self._detach_vmi_from_vpg(vmi)
+        self.tf_client.delete_virtual_machine_interface(fq_name=vmi_fq_name)
+
     def _check_data_was_changed(self, current, previous):
         for field in self.REQUIRED_PORT_FIELDS:
             if current.get(field) != previous.get(field):
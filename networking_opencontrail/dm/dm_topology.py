@@ -13,11 +13,17 @@
 #    under the License.
 #
 import abc
+import copy
+import functools
 import six
+import threading
 
 from oslo_log import log as logging
+from oslo_utils import timeutils
 
+from networking_opencontrail.common import utils
 from networking_opencontrail.dm.dm_topology_loader import DmTopologyLoader
+from networking_opencontrail.drivers import concurrent_requests
 
 LOG = logging.getLogger(__name__)
 
@@ -33,6 +39,13 @@ class DmTopologyBase(object):
     def get_node(self, node_id):
         """Get requested node data from topology."""
 
+    def refresh_node(self, host_id):
+        """Refresh data of node, which turned out to be outdated.
+
+        :returns: True if the node data may have changed
+        """
+        return False
+
     def __contains__(self, host_id):
         try:
             return self.get_node(host_id) is not None
@@ -44,6 +57,7 @@ class DmTopologyApi(DmTopologyBase):
     """Object contaning node topology based on Tungsten API."""
 
     def __init__(self, client):
+        utils.register_vnc_api_options()
         self.tf_client = client
 
     def __contains__(self, host_id):
@@ -57,13 +71,15 @@ class DmTopologyApi(DmTopologyBase):
 
             node = {'name': host_id,
                     'ports': []}
-            for port_ref in vnc_node.get_ports():
-                port = self.tf_client.get_port(uuid=port_ref['uuid'])
-                pi = port.get_physical_interface_back_refs()
-                if pi:
-                    node['ports'].append({'name': port.fq_name[-1],
-                                          'port_name': pi[0]['to'][-1],
-                                          'switch_name': pi[0]['to'][-2]})
+            # Ports are independent, read them concurrently
+            ports = concurrent_requests.gather(*[
+                functools.partial(self.tf_client.get_port,
+                                  uuid=port_ref['uuid'])
+                for port_ref in vnc_node.get_ports()])
+            for port in ports:
+                node_port = self._make_node_port(port)
+                if node_port:
+                    node['ports'].append(node_port)
             if len(node['ports']) == 0:
                 LOG.error("Node %s has no port connected to physical interface"
                           % host_id)
@@ -80,13 +96,127 @@ class DmTopologyApi(DmTopologyBase):
         vnc_node = self.tf_client.read_node_by_hostname(host_id)
         return vnc_node is not None
 
+    @staticmethod
+    def _make_node_port(port):
+        """Return port connected to physical interface, None otherwise."""
+        pi = port.get_physical_interface_back_refs()
+        if not pi:
+            return None
+        return {'name': port.fq_name[-1],
+                'port_name': pi[0]['to'][-1],
+                'switch_name': pi[0]['to'][-2]}
+
+
+class DmTopologyApiCached(DmTopologyApi):
+    """Node topology based on Tungsten API, kept in memory.
+
+    All nodes and ports are loaded with two list requests and lookups are
+    served from memory. The snapshot is reloaded on the first lookup after
+    ``refresh_interval`` seconds, which bounds how stale it can be. A node
+    found outdated in the meantime is re-read with refresh_node().
+    """
+
+    def __init__(self, client, refresh_interval):
+        super(DmTopologyApiCached, self).__init__(client)
+        self.refresh_interval = refresh_interval
+        # Nodes by host name, nodes without connected ports included
+        self._nodes = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def initialize(self):
+        try:
+            self._get_nodes()
+        except Exception:
+            # API server may start after Neutron, load topology on first use
+            LOG.exception("Cannot load topology from API, it will be loaded "
+                          "on first use")
+
+    def __contains__(self, host_id):
+        return host_id in self._get_nodes()
+
+    def get_node(self, host_id):
+        node = self._get_nodes().get(host_id)
+        if node is None:
+            raise NodeNotFoundError
+        if not node['ports']:
+            LOG.error("Node %s has no port connected to physical interface"
+                      % host_id)
+            raise InvalidNodeError
+        return copy.deepcopy(node)
+
+    def refresh_node(self, host_id):
+        try:
+            node = super(DmTopologyApiCached, self).get_node(host_id)
+        except NodeNotFoundError:
+            node = None
+        except InvalidNodeError:
+            node = {'name': host_id, 'ports': []}
+
+        with self._lock:
+            if self._nodes is None:
+                return True
+            if node is None:
+                self._nodes.pop(host_id, None)
+            else:
+                self._nodes[host_id] = node
+        LOG.debug("Node %s refreshed in topology", host_id)
+        return True
+
+    def _get_nodes(self):
+        if not self._is_stale():
+            return self._nodes
+        with self._lock:
+            if self._is_stale():
+                try:
+                    self._nodes = self._load_nodes()
+                    self._loaded_at = timeutils.now()
+                except Exception:
+                    if self._nodes is None:
+                        raise
+                    # Retried on next lookup
+                    LOG.exception("Cannot reload topology from API, "
+                                  "using topology loaded %d seconds ago",
+                                  timeutils.now() - self._loaded_at)
+            return self._nodes
+
+    def _is_stale(self):
+        return (self._loaded_at is None or
+                timeutils.now() - self._loaded_at >= self.refresh_interval)
+
+    def _load_nodes(self):
+        nodes = {}
+        for vnc_node in self.tf_client.list_nodes():
+            host_id = vnc_node.fq_name[-1]
+            nodes[host_id] = {'name': host_id, 'ports': []}
+
+        for port in self.tf_client.list_ports(
+                fields=['physical_interface_back_refs']):
+            node = nodes.get(port.fq_name[-2])
+            node_port = self._make_node_port(port)
+            if node is not None and node_port:
+                node['ports'].append(node_port)
+
+        LOG.debug("Topology of %d nodes loaded from API", len(nodes))
+        return nodes
+
 
 class DmTopologyFile(DmTopologyBase):
-    """Object contaning node topology based on topology file declaration."""
+    """Object contaning node topology based on topology file declaration.
 
-    def __init__(self, topology_file):
+    When ``check_interval`` is set, the file is checked for changes on
+    lookups, at most once per ``check_interval`` seconds. A changed file is
+    loaded and validated while lookups are served from the previous
+    topology, which is then replaced.
+    """
+
+    def __init__(self, topology_file, check_interval=0):
         self.topology_loader = DmTopologyLoader(topology_file)
         self.topology = None
+        self.check_interval = check_interval
+        self._file_stat = None
+        self._checked_at = None
+        self._lock = threading.Lock()
 
     def __contains__(self, host_id):
         return self.get_node_from_file(host_id) is not None
@@ -100,13 +230,46 @@ class DmTopologyFile(DmTopologyBase):
         return node
 
     def initialize(self):
+        # Stat before loading, so that changes made meanwhile are reloaded
+        self._file_stat = self.topology_loader.stat()
         self.topology = self.topology_loader.load()
+        self._checked_at = timeutils.now()
 
     def get_node_from_file(self, host_id):
+        if self.check_interval:
+            self._reload_if_changed()
         if not self.topology:
             return None
         return self.topology.get(host_id)
 
+    def _reload_if_changed(self):
+        now = timeutils.now()
+        if (self._checked_at is None or
+                now - self._checked_at < self.check_interval):
+            return
+        if not self._lock.acquire(False):
+            # Other thread is checking the file, use current topology
+            return
+        try:
+            self._checked_at = now
+            file_stat = self.topology_loader.stat()
+            if file_stat is None or file_stat == self._file_stat:
+                return
+            try:
+                topology = self.topology_loader.load()
+            except Exception:
+                # Retried on next check
+                LOG.exception("Cannot reload topology file %s, using "
+                              "previously loaded topology",
+                              self.topology_loader.path)
+                return
+            self.topology = topology
+            self._file_stat = file_stat
+            LOG.info("Topology of %d nodes reloaded from %s",
+                     len(topology), self.topology_loader.path)
+        finally:
+            self._lock.release()
+
 
 class NodeNotFoundError(Exception):
     pass
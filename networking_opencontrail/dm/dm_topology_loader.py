@@ -13,11 +13,49 @@
 #    under the License.
 #
 
-from jsonschema import validate
+import os
+
+from jsonschema import Draft4Validator
 from jsonschema import ValidationError
 
 import yaml
 
+# libyaml parser is much faster for big topologies, when PyYAML is built
+# with it
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+TOPOLOGY_SCHEMA = yaml.safe_load("""
+type: object
+required:
+- nodes
+properties:
+  nodes:
+    type: array
+    items:
+      type: object
+      required:
+      - name
+      - ports
+      properties:
+        name:
+          type: string
+        ports:
+          type: array
+          items:
+            type: object
+            required:
+            - switch_name
+            - port_name
+            properties:
+              name:
+                type: string
+              switch_name:
+                type: string
+              port_name:
+                type: string
+""")
+TOPOLOGY_VALIDATOR = Draft4Validator(TOPOLOGY_SCHEMA)
+
 
 class DmTopologyLoader(object):
 
@@ -29,6 +67,17 @@ class DmTopologyLoader(object):
         self.validate(topology)
         return {node['name']: node for node in topology['nodes']}
 
+    def stat(self):
+        """Return modification time, size and inode of the file.
+
+        Returns None when the file cannot be accessed.
+        """
+        try:
+            file_stat = os.stat(self.path)
+        except OSError:
+            return None
+        return file_stat.st_mtime, file_stat.st_size, file_stat.st_ino
+
     def validate(self, config):
         self._validate_schema(config)
         self._validate_unique_names(config)
@@ -47,40 +96,8 @@ class DmTopologyLoader(object):
              ]}
         ]}
         """
-
-        schema = """
-        type: object
-        required:
-        - nodes
-        properties:
-          nodes:
-            type: array
-            items:
-              type: object
-              required:
-              - name
-              - ports
-              properties:
-                name:
-                  type: string
-                ports:
-                  type: array
-                  items:
-                    type: object
-                    required:
-                    - switch_name
-                    - port_name
-                    properties:
-                      name:
-                        type: string
-                      switch_name:
-                        type: string
-                      port_name:
-                        type: string
-                """
-
         try:
-            validate(config, yaml.safe_load(schema))
+            TOPOLOGY_VALIDATOR.validate(config)
         except ValidationError as e:
             raise ConfigInvalidFormat(e)
 
@@ -91,7 +108,7 @@ class DmTopologyLoader(object):
 
     def _load_yaml_file(self, topology_filename):
         with open(topology_filename, "r") as topology_yaml:
-            return yaml.safe_load(topology_yaml)
+            return yaml.load(topology_yaml, Loader=SafeLoader)
 
 
 class ConfigInvalidFormat(Exception):
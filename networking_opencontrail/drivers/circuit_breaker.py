@@ -0,0 +1,123 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""Circuit breakers of API server endpoints.
+
+When an API server is down, every request waits for a connect timeout and
+holds a Neutron API worker meanwhile. After [APISERVER]
+circuit_breaker_threshold consecutive failed requests to an endpoint, its
+circuit opens and requests to it fail immediately with
+:class:`CircuitOpenError`, handled by drivers as any connection error.
+After circuit_breaker_reset_timeout a single probe request is let through:
+the circuit closes when it succeeds and opens again when it fails.
+"""
+
+import threading
+
+from oslo_log import log as logging
+from oslo_utils import timeutils
+import requests
+
+from networking_opencontrail.common import metrics
+
+LOG = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Request was not sent, as its endpoint is unavailable."""
+
+
+class CircuitBreaker(object):
+    """Circuit breaker of a single endpoint, e.g. ``http://10.0.0.1:8082``.
+
+    Callers check :meth:`before_request` before sending a request and
+    report its outcome with :meth:`record_success` or
+    :meth:`record_failure`, or call :meth:`release` when it has none.
+    """
+
+    def __init__(self, endpoint, failure_threshold, reset_timeout):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.rejected = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        """Raise CircuitOpenError unless a request may be sent now."""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            previous = self.state
+            if (self.state == OPEN and
+                    timeutils.now() - self._opened_at >= self.reset_timeout):
+                self.state = HALF_OPEN
+            if self.state == OPEN or self._probing:
+                # Only one probe request at a time is sent to the endpoint
+                self.rejected += 1
+                raise CircuitOpenError(
+                    "Requests to %s are stopped after %d consecutive "
+                    "failures" % (self.endpoint, self.failures))
+            self._probing = True
+        self._report(previous)
+
+    def record_success(self):
+        with self._lock:
+            previous = self.state
+            self.failures = 0
+            self._probing = False
+            self.state = CLOSED
+        self._report(previous)
+
+    def record_failure(self):
+        with self._lock:
+            previous = self.state
+            self.failures += 1
+            self._probing = False
+            if (self.state == HALF_OPEN or
+                    self.failures >= self.failure_threshold):
+                self._opened_at = timeutils.now()
+                self.state = OPEN
+        self._report(previous)
+
+    def release(self):
+        """End a request which says nothing about the endpoint.
+
+        E.g. one interrupted by a timeout of the caller. A probe is given
+        up, so that the next request probes the endpoint instead.
+        """
+        with self._lock:
+            self._probing = False
+
+    def _report(self, previous):
+        # State is read without lock, a later change reports itself
+        state = self.state
+        if state == previous:
+            return
+        if state == OPEN:
+            LOG.warning("API server %(endpoint)s is unavailable, requests "
+                        "to it fail immediately for %(timeout)s seconds",
+                        {'endpoint': self.endpoint,
+                         'timeout': self.reset_timeout})
+        elif state == CLOSED:
+            LOG.info("API server %s is available again", self.endpoint)
+        metrics.record_circuit(self.endpoint, state)
@@ -0,0 +1,73 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""Concurrent requests to the API server.
+
+Drivers send requests synchronously. Independent requests, e.g. reads of
+several resources, can be sent concurrently with :func:`gather`, which
+calls them in green threads::
+
+    first, second = concurrent_requests.gather(
+        functools.partial(driver.get_resource, 'port', None, first_id),
+        functools.partial(driver.get_resource, 'port', None, second_id))
+"""
+
+import sys
+
+import eventlet
+from oslo_config import cfg
+import six
+
+
+class _Failure(object):
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
+
+
+def _call(call):
+    try:
+        return call()
+    except Exception:
+        return _Failure(sys.exc_info())
+
+
+def gather(*calls, **kwargs):
+    """Call ``calls`` concurrently and return their results, in order.
+
+    At most [APISERVER] max_concurrent_requests calls run at a time.
+    All calls are completed even if some of them fail. Then the exception
+    of the first failed call is raised, unless ``return_exceptions`` is
+    True, in which case exceptions are returned in place of results.
+    """
+    return_exceptions = kwargs.pop('return_exceptions', False)
+    if kwargs:
+        raise TypeError("Unexpected arguments: %s" % ', '.join(kwargs))
+
+    if len(calls) == 1:
+        # Nothing to run concurrently
+        results = [_call(calls[0])]
+    else:
+        size = min(cfg.CONF.APISERVER.max_concurrent_requests,
+                   len(calls)) or 1
+        pool = eventlet.GreenPool(size)
+        threads = [pool.spawn(_call, call) for call in calls]
+        results = [thread.wait() for thread in threads]
+
+    for index, result in enumerate(results):
+        if isinstance(result, _Failure):
+            if not return_exceptions:
+                six.reraise(*result.exc_info)
+            results[index] = result.exc_info[1]
+    return results
@@ -13,6 +13,9 @@
 #    under the License.
 #
 
+import functools
+
+import eventlet
 from neutron.extensions import portbindings
 from neutron.extensions import securitygroup
 from neutron_lib.exceptions import allowedaddresspairs
@@ -112,7 +115,12 @@ class OpenContrailDriversBase(object):
     def _delete_resource(self, res_type, context, id):
         pass
 
-    def _list_resource(self, res_type, context, filters, fields):
+    def _list_resource(self, res_type, context, filters, fields, sorts=None,
+                       limit=None, marker=None, page_reverse=False):
+        pass
+
+    def _iter_resource(self, res_type, context, filters, fields, sorts=None,
+                       limit=None, marker=None, page_reverse=False):
         pass
 
     def _count_resource(self, res_type, context, filters):
@@ -145,11 +153,13 @@ class OpenContrailDriversBase(object):
 
         self._delete_resource('network', context, network_id)
 
-    def get_networks(self, context, filters=None, fields=None):
+    def get_networks(self, context, filters=None, fields=None, sorts=None,
+                     limit=None, marker=None, page_reverse=False):
         """Gets the list of Virtual Networks."""
 
         return self._list_resource('network', context, filters,
-                                   fields)
+                                   fields, sorts=sorts, limit=limit,
+                                   marker=marker, page_reverse=page_reverse)
 
     def get_networks_count(self, context, filters=None):
         """Gets the count of Virtual Network."""
@@ -267,27 +277,57 @@ class OpenContrailDriversBase(object):
 
         return port
 
+    def create_ports(self, context, ports):
+        """Creates several ports.
+
+        API server has no bulk operation, so the ports are created by
+        concurrent requests, at most [APISERVER] port_create_batch_size
+        at a time. Returns the created ports, or exceptions raised for
+        them, in the order of ``ports``.
+        """
+        pool = eventlet.GreenPool(cfg.CONF.APISERVER.port_create_batch_size)
+        return list(pool.imap(
+            functools.partial(self._create_port_of_bulk, context), ports))
+
+    def _create_port_of_bulk(self, context, port):
+        try:
+            return self.create_port(context, port)
+        except Exception as e:
+            return e
+
     def get_port(self, context, port_id, fields=None):
         """Gets the attributes of a particular port."""
 
         return self._get_port(context, port_id, fields)
 
-    def update_port(self, context, port_id, port):
+    def _get_original_port(self, context, port_id, original=None):
+        """Return the port as it was before the update.
+
+        The copy known by Neutron is used when it describes the same port,
+        otherwise the port is read from the API server.
+        """
+        if (original and original.get('id') == port_id
+                and original.get('network_id')
+                and original.get('fixed_ips') is not None):
+            # Copy, as the list is modified and still in use by Neutron
+            return {'network_id': original['network_id'],
+                    'fixed_ips': list(original['fixed_ips'])}
+        return self._get_port(context, port_id)
+
+    def update_port(self, context, port_id, port, original=None):
         """Updates a port.
 
         Updates the attributes of a port on the specified Virtual
-        Network.
+        Network. The port before the update, if given in ``original``,
+        saves reading it from the API server when fixed IPs are changed.
         """
-        original = self._get_port(context, port_id)
         if 'fixed_ips' in port['port']:
+            original = self._get_original_port(context, port_id, original)
             added_ips, prev_ips = self._update_ips_for_port(
                 context, original['network_id'], port_id,
                 original['fixed_ips'], port['port']['fixed_ips'])
             port['port']['fixed_ips'] = prev_ips + added_ips
 
-        if 'binding:host_id' in port['port']:
-            original['binding:host_id'] = port['port']['binding:host_id']
-
         if (port['port'].get('port_security_enabled') is False
                 and port['port'].get('allowed_address_pairs') == []):
             del port['port']['allowed_address_pairs']
@@ -320,8 +360,15 @@ class OpenContrailDriversBase(object):
         port = {'port': context.current}
         port_id = context.current['id']
 
-        self.update_port(context, port_id, port)
+        self.update_port(context, port_id, port, original=context.original)
+        self.set_port_binding(context)
 
+    def set_port_binding(self, context):
+        """Bind segments of a port to vRouter.
+
+        Unlike bind_port, the port is not updated in the API server.
+        """
+        port = {'port': context.current}
         vif_type = 'vrouter'
         vif_details = {CAP_PORT_FILTER: True}
         port_status = port.get('status', PORT_STATUS_ACTIVE)
@@ -330,14 +377,17 @@ class OpenContrailDriversBase(object):
             context.set_binding(segment['id'], vif_type,
                                 vif_details, port_status)
 
-    def get_ports(self, context, filters=None, fields=None):
+    def get_ports(self, context, filters=None, fields=None, sorts=None,
+                  limit=None, marker=None, page_reverse=False):
         """Gets all ports.
 
         Retrieves all port identifiers belonging to the
         specified Virtual Network with the specfied filter.
         """
 
-        return self._list_resource('port', context, filters, fields)
+        return self._list_resource('port', context, filters, fields,
+                                   sorts=sorts, limit=limit, marker=marker,
+                                   page_reverse=page_reverse)
 
     def get_ports_count(self, context, filters=None):
         """Gets the count of ports."""
@@ -412,6 +462,11 @@ class OpenContrailDriversBase(object):
 
         self._delete_resource('floatingip', context, ip_id)
 
+    def get_floatingips(self, context, filters=None, fields=None):
+        """Retrieves all floating IPs."""
+
+        return self._list_resource('floatingip', context, filters, fields)
+
     # Route table handlers
     def create_route_table(self, context, table):
         """Creates a route table."""
@@ -510,7 +565,8 @@ class OpenContrailDriversBase(object):
         """Retrieves all security group identifiers."""
 
         return self._list_resource('security_group', context,
-                                   filters, fields)
+                                   filters, fields, sorts=sorts, limit=limit,
+                                   marker=marker, page_reverse=page_reverse)
 
     def get_security_groups_count(self, context, filters=None):
         """Gets the count of security groups."""
@@ -549,4 +605,13 @@ class OpenContrailDriversBase(object):
         """Retrieves all security group rules."""
 
         return self._list_resource('security_group_rule', context,
-                                   filters, fields)
+                                   filters, fields, sorts=sorts, limit=limit,
+                                   marker=marker, page_reverse=page_reverse)
+
+    def iter_resources(self, res_type, context, filters=None, fields=None):
+        """Yields resources of a type, without listing all of them at once.
+
+        Resources are read in pages of [APISERVER] list_page_size.
+        """
+
+        return self._iter_resource(res_type, context, filters, fields)
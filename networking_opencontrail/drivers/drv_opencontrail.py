@@ -16,6 +16,8 @@
 import errno
 import os
 import requests
+import threading
+import zlib
 
 from neutron_lib.constants import ATTR_NOT_SPECIFIED
 from neutron_lib.exceptions import BadRequest
@@ -23,11 +25,20 @@ from neutron_lib.exceptions import BadRequest
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils as json
+from oslo_utils import timeutils
+from osprofiler import profiler
+from osprofiler import web as profiler_web
+import six
 
 from eventlet.greenthread import getcurrent
-from simplejson import JSONDecodeError
 
+from networking_opencontrail.common import cache
+from networking_opencontrail.common import metrics
 from networking_opencontrail.drivers import contrail_driver_base as driver_base
+from networking_opencontrail.drivers import json_codec
+from networking_opencontrail.drivers import json_stream
+from networking_opencontrail.drivers import session_pool
+from networking_opencontrail.drivers import token_manager
 
 _DEFAULT_KS_CERT_BUNDLE = "/tmp/keystonecertbundle.pem"
 _DEFAULT_API_CERT_BUNDLE = "/tmp/apiservercertbundle.pem"
@@ -36,6 +47,78 @@ _DEFAULT_SECURE_SERVER_CONNECT = "https"
 
 LOG = logging.getLogger(__name__)
 
+# Fastest gzip level, JSON compresses well already with it
+_COMPRESSION_LEVEL = 1
+
+# Cached resources which change when a resource of the given type is written
+_RELATED_RESOURCES = {
+    'subnet': ('network',),
+    'router': ('port',),
+    'security_group_rule': ('security_group',),
+}
+
+_resource_cache = None
+_resource_cache_lock = threading.Lock()
+
+
+def get_resource_cache():
+    """Return cache of resources shared by drivers of this process.
+
+    The cache is created on first use. None is returned when it is
+    disabled with [APISERVER] resource_cache_size.
+    """
+    global _resource_cache
+    if _resource_cache is None:
+        if not cfg.CONF.APISERVER.resource_cache_size:
+            return None
+        with _resource_cache_lock:
+            if _resource_cache is None:
+                _resource_cache = cache.LRUCache(
+                    cfg.CONF.APISERVER.resource_cache_size,
+                    cfg.CONF.APISERVER.resource_cache_ttl)
+    return _resource_cache
+
+
+def reset_resource_cache():
+    global _resource_cache
+    with _resource_cache_lock:
+        _resource_cache = None
+
+
+def add_trace_headers(headers=None):
+    """Return ``headers`` with OSProfiler trace id, if a trace is active.
+
+    The receiving service continues the trace with the current trace
+    point as parent.
+    """
+    trace_headers = profiler_web.get_trace_id_headers()
+    if not trace_headers:
+        return headers
+    headers = headers if headers is not None else {}
+    headers.update(trace_headers)
+    return headers
+
+
+def compress_request(data, headers=None):
+    """Return body and ``headers`` of a request, gzipped when enabled.
+
+    With [APISERVER] compression, a body of at least compression_threshold
+    bytes is gzipped. Gzipped responses are accepted by requests anyway.
+    """
+    if not cfg.CONF.APISERVER.compression:
+        return data, headers
+    if (data is not None and
+            len(data) >= cfg.CONF.APISERVER.compression_threshold):
+        headers = headers if headers is not None else {}
+        if isinstance(data, six.text_type):
+            data = data.encode('utf-8')
+        # Window bits above 16 write gzip header and trailer
+        compressor = zlib.compressobj(_COMPRESSION_LEVEL, zlib.DEFLATED,
+                                      16 + zlib.MAX_WBITS)
+        data = compressor.compress(data) + compressor.flush()
+        headers['Content-Encoding'] = 'gzip'
+    return data, headers
+
 
 class OpenContrailDrivers(driver_base.OpenContrailDriversBase):
     PLUGIN_URL_PREFIX = '/neutron'
@@ -46,7 +129,6 @@ class OpenContrailDrivers(driver_base.OpenContrailDriversBase):
 
     def _build_auth_details(self):
         # keystone
-        self._authn_token = None
         if cfg.CONF.auth_strategy == 'keystone':
             kcfg = cfg.CONF.keystone_authtoken
             body = '{"auth":{"passwordCredentials":{'
@@ -55,7 +137,8 @@ class OpenContrailDrivers(driver_base.OpenContrailDriversBase):
             body += ' "tenantName":"%s"}}' % (kcfg.admin_tenant_name)
 
             self._authn_body = body
-            self._authn_token = cfg.CONF.keystone_authtoken.admin_token
+            token_manager.set_initial_token(
+                cfg.CONF.keystone_authtoken.admin_token)
             try:
                 auth_token_url = cfg.CONF.APISERVER.auth_token_url
             except cfg.NoSuchOptError:
@@ -107,7 +190,8 @@ class OpenContrailDrivers(driver_base.OpenContrailDriversBase):
                 _DEFAULT_API_CERT_BUNDLE, certs)
             self._use_api_certs = True
 
-    def _request_api_server(self, url, data=None, headers=None):
+    def _request_api_server(self, url, data=None, headers=None,
+                            stream=False):
         LOG.debug('Api-Server request:\n'
                   'URL: %(url)s\n'
                   'Headers: %(headers)s\n'
@@ -115,50 +199,42 @@ class OpenContrailDrivers(driver_base.OpenContrailDriversBase):
                   {'url': url, 'headers': headers, 'payload': data})
 
         # Attempt to post to Api-Server
-        if self._apiinsecure:
-            response = requests.post(url, data=data,
-                                     headers=headers, verify=False)
-        elif not self._apiinsecure and self._use_api_certs:
-            response = requests.post(url, data=data,
-                                     headers=headers,
-                                     verify=self._apicertbundle)
-        else:
-            response = requests.post(url, data=data, headers=headers)
-        if (response.status_code == requests.codes.unauthorized):
-            # Get token from keystone and save it for next request
-            if self._ksinsecure:
-                response = (
-                    requests.post(self._keystone_url,
-                                  data=self._authn_body,
-                                  headers={'Content-type': 'application/json'},
-                                  verify=False))
-            elif not self._ksinsecure and self._use_ks_certs:
-                response = (
-                    requests.post(self._keystone_url,
-                                  data=self._authn_body,
-                                  headers={'Content-type': 'application/json'},
-                                  verify=self._kscertbundle))
-            else:
-                response = (
-                    requests.post(self._keystone_url,
-                                  data=self._authn_body,
-                                  headers={'Content-type':
-                                           'application/json'}))
-            if (response.status_code == requests.codes.ok):
-                # plan is to re-issue original request with new token
-                auth_headers = headers or {}
-                authn_content = json.loads(response.text)
-                self._authn_token = authn_content['access']['token']['id']
-                auth_headers['X-AUTH-TOKEN'] = self._authn_token
-                response = self._request_api_server(url, data, auth_headers)
+        session = session_pool.get_session()
+        # Streamed body is read by the caller while it is received
+        kwargs = {'stream': True} if stream else {}
+        with profiler.Trace('contrail_api',
+                            info={'method': 'POST', 'url': url}):
+            headers = add_trace_headers(headers)
+            if self._apiinsecure:
+                response = session.post(url, data=data,
+                                        headers=headers, verify=False,
+                                        **kwargs)
+            elif not self._apiinsecure and self._use_api_certs:
+                response = session.post(url, data=data,
+                                        headers=headers,
+                                        verify=self._apicertbundle,
+                                        **kwargs)
             else:
-                raise RuntimeError('Authentication Failure')
+                response = session.post(url, data=data, headers=headers,
+                                        **kwargs)
+        if (response.status_code == requests.codes.unauthorized):
+            # Get token from keystone, unless another request already did,
+            # and re-issue original request with it. Connection of streamed
+            # response is released only when its body is read or closed.
+            if stream:
+                response.close()
+            auth_headers = headers or {}
+            auth_headers['X-AUTH-TOKEN'] = token_manager.refresh_token(
+                self._fetch_auth_token, auth_headers.get('X-AUTH-TOKEN'))
+            response = self._request_api_server(url, data, auth_headers,
+                                                stream)
+            response.retries = getattr(response, 'retries', 0) + 1
 
         LOG.debug('Api-Server response:\n'
                   'Status: %(status)s\n'
                   'Payload: %(payload)s\n',
                   {'status': response.status_code,
-                   'payload': response.content})
+                   'payload': '<streamed>' if stream else response.content})
         if response.status_code != requests.codes.ok:
             LOG.error('Api-Server request for %(url)s '
                       'failed with status %(status)s',
@@ -166,7 +242,42 @@ class OpenContrailDrivers(driver_base.OpenContrailDriversBase):
 
         return response
 
-    def _request_api_server_authn(self, url, data=None, headers=None):
+    @property
+    def _authn_token(self):
+        return token_manager.get_token(self._fetch_auth_token)
+
+    def _fetch_auth_token(self):
+        """Get token from keystone.
+
+        :returns: token and its expiration time
+        """
+        session = session_pool.get_session()
+        headers = {'Content-type': 'application/json'}
+        with profiler.Trace('keystone',
+                            info={'method': 'POST',
+                                  'url': self._keystone_url}):
+            headers = add_trace_headers(headers)
+            if self._ksinsecure:
+                response = session.post(self._keystone_url,
+                                        data=self._authn_body,
+                                        headers=headers, verify=False)
+            elif self._use_ks_certs:
+                response = session.post(self._keystone_url,
+                                        data=self._authn_body,
+                                        headers=headers,
+                                        verify=self._kscertbundle)
+            else:
+                response = session.post(self._keystone_url,
+                                        data=self._authn_body,
+                                        headers=headers)
+
+        if response.status_code != requests.codes.ok:
+            raise RuntimeError('Authentication Failure')
+        token = json.loads(response.text)['access']['token']
+        return token['id'], token.get('expires')
+
+    def _request_api_server_authn(self, url, data=None, headers=None,
+                                  stream=False):
         # forward user token to API server for RBAC
         # token saved earlier in the pipeline
         try:
@@ -177,10 +288,11 @@ class OpenContrailDrivers(driver_base.OpenContrailDriversBase):
         authn_headers = headers or {}
         if auth_token or self._authn_token:
             authn_headers['X-AUTH-TOKEN'] = auth_token or self._authn_token
-        response = self._request_api_server(url, data, headers=authn_headers)
+        response = self._request_api_server(url, data, headers=authn_headers,
+                                            stream=stream)
         return response
 
-    def _relay_request(self, url_path, data=None):
+    def _relay_request(self, url_path, data=None, stream=False):
         """Send received request to api server."""
 
         url = "%s://%s:%s%s" % (self._apiserverconnect,
@@ -188,29 +300,80 @@ class OpenContrailDrivers(driver_base.OpenContrailDriversBase):
                                 cfg.CONF.APISERVER.api_server_port,
                                 url_path)
 
+        data, headers = compress_request(
+            data, {'Content-type': 'application/json'})
         return self._request_api_server_authn(
-            url, data=data, headers={'Content-type': 'application/json'})
+            url, data=data, headers=headers, stream=stream)
+
+    def _request_backend(self, context, data_dict, obj_name, action,
+                         stream=False):
+        """Send request to the Neutron relay of the API server.
 
-    def _request_backend(self, context, data_dict, obj_name, action):
+        With ``stream``, a successful response is a list, which is returned
+        as a generator of its items decoded while the body is received.
+        """
         context_dict = self._encode_context(context, action, obj_name)
-        data = json.dumps({'context': context_dict, 'data': data_dict})
+        data = json_codec.dumps({'context': context_dict, 'data': data_dict})
 
         url_path = "%s/%s" % (self.PLUGIN_URL_PREFIX, obj_name)
+        started_at = timeutils.now()
         try:
-            response = self._relay_request(url_path, data=data)
+            response = self._relay_request(url_path, data=data,
+                                           stream=stream)
         except requests.exceptions.ConnectionError as exc:
             # Catch connection error because SDN may not be ready
             # to receive messages. This must not crash OpenStack.
             # Common scenario is when OpenStack is up and running first
             # and SDN comes up and synchronize data later.
             LOG.error("Can't connect to remote host:\n{}".format(exc))
+            self._record_request(obj_name, action, started_at, data)
             return requests.codes.unavailable, {'message': str(exc)}
+        if stream and response.status_code == requests.codes.ok:
+            self._record_request(obj_name, action, started_at, data,
+                                 response, streamed=True)
+            return response.status_code, self._iter_response(response)
+        self._record_request(obj_name, action, started_at, data, response)
 
         try:
-            return response.status_code, response.json()
-        except JSONDecodeError:
+            return response.status_code, json_codec.loads(response.content)
+        except ValueError:
             return response.status_code, {'message': response.content}
 
+    @staticmethod
+    def _iter_response(response):
+        try:
+            for item in json_stream.iter_list(
+                    response.iter_content(json_stream.CHUNK_SIZE)):
+                yield item
+        finally:
+            response.close()
+
+    @staticmethod
+    def _record_request(obj_type, operation, started_at, data,
+                        response=None, streamed=False):
+        """Record request in metrics, when enabled.
+
+        Without ``response`` the request is recorded as failed to reach
+        the API server. Size of a ``streamed`` response is taken from its
+        headers, as its body is not read yet.
+        """
+        if metrics.get_metrics() is None:
+            return
+        duration = timeutils.now() - started_at
+        if response is None:
+            metrics.record(obj_type, operation, duration,
+                           request_bytes=len(data or ''))
+            return
+        if streamed:
+            response_bytes = int(response.headers.get('Content-Length') or 0)
+        else:
+            response_bytes = len(response.content or '')
+        metrics.record(obj_type, operation, duration,
+                       request_bytes=len(data or ''),
+                       response_bytes=response_bytes,
+                       status=response.status_code,
+                       retries=getattr(response, 'retries', 0))
+
     def _encode_context(self, context, operation, apitype):
         cdict = {'user_id': getattr(context, 'user_id', ''),
                  'is_admin': getattr(context, 'is_admin', False),
@@ -241,7 +404,9 @@ class OpenContrailDrivers(driver_base.OpenContrailDriversBase):
         return resource_dict
 
     def _prune(self, resource_dict, fields):
-        if fields:
+        # API server already returns only requested fields of most
+        # resources, so a pruned copy is made only for the other ones
+        if fields and not fields.issuperset(resource_dict):
             return dict(((key, item) for key, item in resource_dict.items()
                          if key in fields))
         return resource_dict
@@ -249,6 +414,7 @@ class OpenContrailDrivers(driver_base.OpenContrailDriversBase):
     def _transform_response(self, status_code, info=None, obj_name=None,
                             fields=None):
         if status_code == requests.codes.ok:
+            fields = frozenset(fields) if fields else None
             if not isinstance(info, list):
                 return self._prune(info, fields)
             else:
@@ -268,8 +434,11 @@ class OpenContrailDrivers(driver_base.OpenContrailDriversBase):
                 del res_data[res_type][key]
 
         res_dict = self._encode_resource(resource=res_data[res_type])
-        status_code, res_info = self._request_backend(context, res_dict,
-                                                      res_type, 'CREATE')
+        try:
+            status_code, res_info = self._request_backend(context, res_dict,
+                                                          res_type, 'CREATE')
+        finally:
+            self._invalidate_cached_resources(res_type)
         if status_code != requests.codes.ok:
             LOG.error("Backend request (CREATE %s <%s>) failed %d: %s" %
                       (res_type, res_data, status_code, res_info))
@@ -286,6 +455,15 @@ class OpenContrailDrivers(driver_base.OpenContrailDriversBase):
         This method gets a resource from the contrail api server
         """
 
+        resource_cache = get_resource_cache()
+        if resource_cache is not None:
+            cache_key = self._get_cache_key(res_type, context, id, fields)
+            res_dicts = resource_cache.get(cache_key)
+            if res_dicts is not None:
+                LOG.debug("get_%(res_type)s() from cache: %(res_dicts)s",
+                          {'res_type': res_type, 'res_dicts': res_dicts})
+                return res_dicts
+
         res_dict = self._encode_resource(resource_id=id, fields=fields)
         status_code, res_info = self._request_backend(context, res_dict,
                                                       res_type, 'READ')
@@ -294,8 +472,29 @@ class OpenContrailDrivers(driver_base.OpenContrailDriversBase):
         LOG.debug("get_%(res_type)s(): %(res_dicts)s",
                   {'res_type': res_type, 'res_dicts': res_dicts})
 
+        if resource_cache is not None:
+            resource_cache.set(cache_key, res_dicts)
         return res_dicts
 
+    @staticmethod
+    def _get_cache_key(res_type, context, id, fields):
+        # API server filters resources by the requester, so the same
+        # resource may look different for other users
+        return (res_type, id, tuple(sorted(fields)) if fields else None,
+                getattr(context, 'tenant_id', None),
+                getattr(context, 'user_id', None),
+                getattr(context, 'is_admin', False))
+
+    def _invalidate_cached_resources(self, res_type, id=None):
+        """Drop cached copies of a resource and of resources related to it."""
+        resource_cache = get_resource_cache()
+        if resource_cache is None:
+            return
+        related = _RELATED_RESOURCES.get(res_type, ())
+        resource_cache.invalidate(
+            lambda key: (key[0] == res_type and key[1] == id)
+            or key[0] in related)
+
     def _update_resource(self, res_type, context, id, res_data):
         """Update a resource in API server.
 
@@ -304,8 +503,11 @@ class OpenContrailDrivers(driver_base.OpenContrailDriversBase):
 
         res_dict = self._encode_resource(resource_id=id,
                                          resource=res_data[res_type])
-        status_code, res_info = self._request_backend(context, res_dict,
-                                                      res_type, 'UPDATE')
+        try:
+            status_code, res_info = self._request_backend(context, res_dict,
+                                                          res_type, 'UPDATE')
+        finally:
+            self._invalidate_cached_resources(res_type, id)
         res_dicts = self._transform_response(status_code, info=res_info,
                                              obj_name=res_type)
         LOG.debug("update_%(res_type)s(): %(res_dicts)s",
@@ -322,18 +524,28 @@ class OpenContrailDrivers(driver_base.OpenContrailDriversBase):
         res_dict = self._encode_resource(resource_id=id)
         LOG.debug("delete_%(res_type)s(): %(id)s",
                   {'res_type': res_type, 'id': id})
-        status_code, res_info = self._request_backend(context, res_dict,
-                                                      res_type, 'DELETE')
+        try:
+            status_code, res_info = self._request_backend(context, res_dict,
+                                                          res_type, 'DELETE')
+        finally:
+            self._invalidate_cached_resources(res_type, id)
         if status_code != requests.codes.ok:
             driver_base._raise_contrail_error(info=res_info,
                                               obj_name=res_type)
 
-    def _list_resource(self, res_type, context, filters, fields):
-        res_dict = self._encode_resource(filters=filters, fields=fields)
-        status_code, res_info = self._request_backend(context, res_dict,
-                                                      res_type, 'READALL')
-        res_dicts = self._transform_response(status_code, info=res_info,
-                                             fields=fields, obj_name=res_type)
+    def _list_resource(self, res_type, context, filters, fields, sorts=None,
+                       limit=None, marker=None, page_reverse=False):
+        if (cfg.CONF.APISERVER.list_page_size or sorts or limit or
+                marker):
+            res_dicts = list(self._iter_resource(
+                res_type, context, filters, fields, sorts=sorts, limit=limit,
+                marker=marker, page_reverse=page_reverse))
+        else:
+            res_dict = self._encode_resource(filters=filters, fields=fields)
+            status_code, res_info = self._request_backend(
+                context, res_dict, res_type, 'READALL')
+            res_dicts = self._transform_response(
+                status_code, info=res_info, fields=fields, obj_name=res_type)
         LOG.debug(
             "get_%(res_type)s(): filters: %(filters)r data: %(res_dicts)r",
             {'res_type': res_type, 'filters': filters,
@@ -341,6 +553,85 @@ class OpenContrailDrivers(driver_base.OpenContrailDriversBase):
 
         return res_dicts
 
+    def _iter_resource(self, res_type, context, filters, fields, sorts=None,
+                       limit=None, marker=None, page_reverse=False):
+        """Yield resources read from API server in pages.
+
+        Each page holds at most [APISERVER] list_page_size resources and
+        is decoded while it is received. The next page is requested after
+        the last resource of the previous one, so resources are always
+        sorted by id, after ``sorts``. A relay which does not support
+        pagination returns all resources in the first page. One which
+        ignores the marker returns a page seen before, which ends listing.
+        """
+        page_size = cfg.CONF.APISERVER.list_page_size or None
+        sorts = list(sorts or [])
+        if 'id' not in [key for key, _direction in sorts]:
+            sorts.append(('id', True))
+        request_fields = fields
+        if fields and 'id' not in fields:
+            # Id of the last resource is the marker of the next page
+            request_fields = list(fields) + ['id']
+        prune_fields = frozenset(fields) if fields else None
+        remaining = limit or None
+        # Order of ids across pages is known only when sorted by id alone
+        ascending = None
+        if len(sorts) == 1:
+            ascending = bool(sorts[0][1]) != bool(page_reverse)
+        first_id = None
+        paged = False
+
+        while True:
+            page_limit = page_size
+            if remaining is not None:
+                page_limit = min(page_size or remaining, remaining)
+            res_dict = self._encode_resource(filters=filters,
+                                             fields=request_fields)
+            res_dict.update(sorts=sorts, limit=page_limit, marker=marker,
+                            page_reverse=page_reverse)
+            status_code, res_info = self._request_backend(
+                context, res_dict, res_type, 'READALL', stream=True)
+            if status_code != requests.codes.ok:
+                driver_base._raise_contrail_error(res_info, res_type)
+
+            previous_marker = marker
+            count = 0
+            try:
+                for resource in res_info:
+                    if not count:
+                        if paged and self._is_page_repeated(
+                                resource['id'], previous_marker, first_id,
+                                ascending):
+                            LOG.warning("API server ignores marker of "
+                                        "%s list, listing stopped",
+                                        res_type)
+                            return
+                        first_id = resource['id']
+                    count += 1
+                    marker = resource['id']
+                    yield self._prune(resource, prune_fields)
+                    if remaining is not None:
+                        remaining -= 1
+                        if not remaining:
+                            return
+            finally:
+                res_info.close()
+            if (page_limit is None or count != page_limit or
+                    marker == previous_marker):
+                return
+            paged = True
+
+    @staticmethod
+    def _is_page_repeated(page_first_id, previous_marker, previous_first_id,
+                          ascending):
+        if page_first_id in (previous_marker, previous_first_id):
+            return True
+        if ascending is None:
+            return False
+        if ascending:
+            return page_first_id < previous_marker
+        return page_first_id > previous_marker
+
     def _count_resource(self, res_type, context, filters):
         res_dict = self._encode_resource(filters=filters)
         status_code, res_count = self._request_backend(context, res_dict,
@@ -363,8 +654,11 @@ class OpenContrailDrivers(driver_base.OpenContrailDriversBase):
 
         res_dict = self._encode_resource(resource_id=router_id,
                                          resource=interface_info)
-        status_code, res_info = self._request_backend(context, res_dict,
-                                                      'router', 'ADDINTERFACE')
+        try:
+            status_code, res_info = self._request_backend(
+                context, res_dict, 'router', 'ADDINTERFACE')
+        finally:
+            self._invalidate_cached_resources('router', router_id)
         if status_code != requests.codes.ok:
             driver_base._raise_contrail_error(info=res_info,
                                               obj_name='add_router_interface')
@@ -379,8 +673,11 @@ class OpenContrailDrivers(driver_base.OpenContrailDriversBase):
 
         res_dict = self._encode_resource(resource_id=router_id,
                                          resource=interface_info)
-        status_code, res_info = self._request_backend(context, res_dict,
-                                                      'router', 'DELINTERFACE')
+        try:
+            status_code, res_info = self._request_backend(
+                context, res_dict, 'router', 'DELINTERFACE')
+        finally:
+            self._invalidate_cached_resources('router', router_id)
         if status_code != requests.codes.ok:
             obj_name = 'remove_router_interface'
             driver_base._raise_contrail_error(info=res_info,
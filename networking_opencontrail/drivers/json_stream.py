@@ -0,0 +1,106 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""Incremental decoding of JSON lists.
+
+A list of resources read from the API server is decoded item by item, as
+chunks of the response body arrive, so that the whole body and the whole
+decoded list are never held in memory at once::
+
+    for port in json_stream.iter_list(response.iter_content(CHUNK_SIZE)):
+        ...
+"""
+
+import codecs
+import json
+
+# Size in bytes of chunks of response body read at once
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = ' \t\n\r'
+
+
+class _Reader(object):
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = u''
+        self.pos = 0
+        self.exhausted = False
+
+    def read_more(self):
+        """Append next chunk to the buffer, return False at end of body."""
+        while not self.exhausted:
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                self.exhausted = True
+                chunk = self._decoder.decode(b'', final=True)
+            else:
+                chunk = self._decoder.decode(chunk)
+            if chunk:
+                # Drop consumed text, so that the buffer stays small
+                self.buffer = self.buffer[self.pos:] + chunk
+                self.pos = 0
+                return True
+        return False
+
+    def peek(self):
+        """Return next non-whitespace character, or None at end of body."""
+        while True:
+            while (self.pos < len(self.buffer) and
+                   self.buffer[self.pos] in _WHITESPACE):
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.read_more():
+                return None
+
+    def expect(self, characters):
+        character = self.peek()
+        if character is None or character not in characters:
+            raise ValueError("Expected one of %r at offset %d of JSON list, "
+                             "found %r" % (characters, self.pos, character))
+        self.pos += 1
+        return character
+
+
+def iter_list(chunks):
+    """Yield items of a JSON list encoded in UTF-8 ``chunks`` of bytes.
+
+    :raises ValueError: when the body is not a valid JSON list
+    """
+    decoder = json.JSONDecoder()
+    reader = _Reader(chunks)
+    reader.expect('[')
+    if reader.peek() == ']':
+        return
+    while True:
+        reader.peek()
+        while True:
+            try:
+                item, end = decoder.raw_decode(reader.buffer, reader.pos)
+            except ValueError:
+                # Item is split between chunks
+                if not reader.read_more():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in next chunk
+            if end < len(reader.buffer) or not reader.read_more():
+                break
+        reader.pos = end
+        yield item
+        if reader.expect(',]') == ']':
+            return
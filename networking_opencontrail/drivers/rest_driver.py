@@ -13,53 +13,41 @@
 #    under the License.
 #
 
-import json
+from networking_opencontrail.drivers.drv_opencontrail import\
+    add_trace_headers
+from networking_opencontrail.drivers.drv_opencontrail import\
+    compress_request
 from networking_opencontrail.drivers.drv_opencontrail import\
     OpenContrailDrivers
+from networking_opencontrail.drivers import json_codec
+from networking_opencontrail.drivers import session_pool
+from networking_opencontrail.drivers import token_manager
 from oslo_config import cfg
+from oslo_utils import timeutils
+from osprofiler import profiler
 import requests
+import six
+
+SUPPORTED_REQUEST_TYPES = ('GET', 'POST', 'PUT', 'DELETE')
 
 
 class ContrailRestApiDriver(OpenContrailDrivers):
     def __init__(self):
         super(ContrailRestApiDriver, self).__init__()
 
-    def update_auth_token(self):
-        headers = {'Content-type': 'application/json'}
-
-        if self._ksinsecure:
-            response = (
-                requests.post(self._keystone_url,
-                              data=self._authn_body,
-                              headers=headers,
-                              verify=False))
-        elif self._use_ks_certs:
-            response = (
-                requests.post(self._keystone_url,
-                              data=self._authn_body,
-                              headers=headers,
-                              verify=self._kscertbundle))
-        else:
-            response = (
-                requests.post(self._keystone_url,
-                              data=self._authn_body,
-                              headers=headers))
-
-        if response.status_code == requests.codes.ok:
-            authn_content = json.loads(response.text)
-            self._authn_token = authn_content['access']['token']['id']
-        else:
-            raise RuntimeError('Authentication Failure')
+    def update_auth_token(self, stale_token=None):
+        token_manager.refresh_token(self._fetch_auth_token, stale_token)
 
     def set_auth_token(self, headers=None, update_token=False):
         if headers is None:
             headers = {}
 
         if update_token:
-            self.update_auth_token()
+            self.update_auth_token(headers.get('X-AUTH-TOKEN'))
 
-        if self._authn_token:
-            headers['X-AUTH-TOKEN'] = self._authn_token
+        authn_token = self._authn_token
+        if authn_token:
+            headers['X-AUTH-TOKEN'] = authn_token
 
         return headers
 
@@ -76,9 +64,14 @@ class ContrailRestApiDriver(OpenContrailDrivers):
         url = self.get_contrail_url(resource)
         headers = self.set_auth_token(headers, update_tokens)
         headers['Content-type'] = 'application/json'
+        body = data
+        if body is not None and not isinstance(body, (six.binary_type,
+                                                      six.text_type)):
+            body = json_codec.dumps(body)
+        body, headers = compress_request(body, headers)
         request = {
             'headers': headers,
-            'data': data,
+            'data': body,
             'params': params,
         }
 
@@ -89,16 +82,19 @@ class ContrailRestApiDriver(OpenContrailDrivers):
             request['verify'] = self._apicertbundle
 
         # Perform request
-        if type == 'GET':
-            response = requests.get(url, **request)
-        elif type == 'POST':
-            response = requests.post(url, **request)
-        elif type == 'PUT':
-            response = requests.put(url, **request)
-        elif type == 'DELETE':
-            response = requests.delete(url, **request)
-        else:
+        if type not in SUPPORTED_REQUEST_TYPES:
             raise RuntimeError('Unknown request type')
+        started_at = timeutils.now()
+        try:
+            with profiler.Trace('contrail_api',
+                                info={'method': type, 'url': url}):
+                request['headers'] = add_trace_headers(headers)
+                response = session_pool.get_session().request(type, url,
+                                                              **request)
+        except requests.exceptions.ConnectionError:
+            self._record_request(resource.split('/')[0], type, started_at,
+                                 None)
+            raise
 
         # Parse response
         if (response.status_code == requests.codes.unauthorized and
@@ -107,8 +103,13 @@ class ContrailRestApiDriver(OpenContrailDrivers):
                                          headers=headers, params=params,
                                          update_tokens=True)
 
+        # A request re-sent with a new token is recorded once, as retried
+        response.retries = 1 if update_tokens else 0
+        self._record_request(resource.split('/')[0], type, started_at, body,
+                             response)
+
         try:
-            content = json.loads(response.text)
+            content = json_codec.loads(response.content)
             return response.status_code, content
         except ValueError:
             return response.status_code, {'message': response.content}
@@ -0,0 +1,190 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import os
+import threading
+
+import requests
+from requests import adapters
+
+from oslo_config import cfg
+from oslo_log import log as logging
+from six.moves.urllib import parse
+
+from networking_opencontrail.drivers import circuit_breaker
+
+LOG = logging.getLogger(__name__)
+
+# Responses of a proxy in front of an unavailable API server
+UNAVAILABLE_STATUSES = frozenset([502, 503, 504])
+
+
+class HTTPAdapter(adapters.HTTPAdapter):
+    """Adapter applying connect timeout and circuit breakers.
+
+    Each endpoint (scheme, host and port) has its own circuit breaker, so
+    that a single unavailable API server or Keystone does not stop
+    requests to the other ones.
+    """
+
+    def __init__(self, connect_timeout=None, failure_threshold=0,
+                 reset_timeout=0, **kwargs):
+        super(HTTPAdapter, self).__init__(**kwargs)
+        self.connect_timeout = connect_timeout or None
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers = {}
+        self._breakers_lock = threading.Lock()
+
+    def send(self, request, timeout=None, **kwargs):
+        if timeout is None and self.connect_timeout:
+            timeout = (self.connect_timeout, None)
+        if not self.failure_threshold:
+            return super(HTTPAdapter, self).send(request, timeout=timeout,
+                                                 **kwargs)
+
+        breaker = self.get_breaker(request.url)
+        breaker.before_request()
+        recorded = False
+        try:
+            response = super(HTTPAdapter, self).send(request,
+                                                     timeout=timeout,
+                                                     **kwargs)
+            if response.status_code in UNAVAILABLE_STATUSES:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            recorded = True
+        except requests.exceptions.RequestException:
+            breaker.record_failure()
+            recorded = True
+            raise
+        finally:
+            if not recorded:
+                # Other errors, e.g. eventlet.Timeout, must not keep
+                # the probe of a half-open circuit taken forever
+                breaker.release()
+        return response
+
+    def get_breaker(self, url):
+        parsed = parse.urlsplit(url)
+        endpoint = '%s://%s' % (parsed.scheme, parsed.netloc)
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            with self._breakers_lock:
+                breaker = self.breakers.get(endpoint)
+                if breaker is None:
+                    breaker = circuit_breaker.CircuitBreaker(
+                        endpoint, self.failure_threshold, self.reset_timeout)
+                    self.breakers[endpoint] = breaker
+        return breaker
+
+
+class SessionPool(object):
+    """Pool of persistent HTTP connections shared by a whole process.
+
+    All drivers talking to the Contrail API server (and to Keystone on its
+    behalf) send requests through one keep-alive session, so a burst of
+    resource operations reuses established TCP/TLS connections instead of
+    doing a handshake per request. The session is created lazily and
+    recreated after fork, so that API workers never share sockets inherited
+    from the parent process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session = None
+        self._adapter = None
+        self._pid = None
+
+    def get_session(self):
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    self._session, self._adapter = self._make_session()
+                    self._pid = os.getpid()
+        return self._session
+
+    def get_stats(self):
+        """Return usage of connection pools, keyed by remote host URL.
+
+        Hosts to which requests were sent also report ``circuit``, state
+        of their circuit breaker.
+        """
+        stats = {}
+        if self._adapter is None or self._pid != os.getpid():
+            return stats
+
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            url = "%s://%s:%s" % (pool.scheme, pool.host, pool.port)
+            idle = [conn for conn in list(pool.pool.queue) if conn]
+            stats[url] = {'connections_created': pool.num_connections,
+                          'requests': pool.num_requests,
+                          'idle_connections': len(idle),
+                          'maxsize': pool.pool.maxsize}
+        for url, breaker in list(self._adapter.breakers.items()):
+            stats.setdefault(url, {})['circuit'] = breaker.state
+        return stats
+
+    def reset(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+            self._adapter = None
+            self._pid = None
+
+    @staticmethod
+    def _make_session():
+        pool_connections = cfg.CONF.APISERVER.http_pool_connections
+        pool_maxsize = cfg.CONF.APISERVER.http_pool_maxsize
+        pool_block = cfg.CONF.APISERVER.http_pool_block
+        LOG.debug("Creating HTTP session pool: %(pools)s pools, "
+                  "%(maxsize)s connections per host, blocking: %(block)s",
+                  {'pools': pool_connections, 'maxsize': pool_maxsize,
+                   'block': pool_block})
+
+        adapter = HTTPAdapter(
+            connect_timeout=cfg.CONF.APISERVER.connect_timeout,
+            failure_threshold=cfg.CONF.APISERVER.circuit_breaker_threshold,
+            reset_timeout=cfg.CONF.APISERVER.circuit_breaker_reset_timeout,
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+            pool_block=pool_block)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session, adapter
+
+
+_POOL = SessionPool()
+
+
+def get_session():
+    """Return keep-alive session of the current process."""
+    return _POOL.get_session()
+
+
+def get_pool_stats():
+    """Return connection pool statistics of the current process."""
+    return _POOL.get_stats()
+
+
+def reset():
+    """Drop the current session and close its pooled connections."""
+    _POOL.reset()
@@ -0,0 +1,131 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import threading
+
+import eventlet
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_utils import timeutils
+
+LOG = logging.getLogger(__name__)
+
+
+class TokenManager(object):
+    """Keystone token shared by all drivers of a process.
+
+    A token is fetched by a callable returning ``(token, expires)``, where
+    ``expires`` is the ISO 8601 expiration time reported by Keystone, or
+    None. A token close to its expiration is refreshed in background.
+    When several requests are rejected with the same token, only the first
+    of them fetches a new one and the others reuse it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = None
+        self._refreshing = False
+
+    def get_token(self, fetch=None):
+        if fetch is not None and self._needs_refresh():
+            self._start_background_refresh(fetch)
+        return self._token
+
+    def set_initial_token(self, token):
+        """Use a token from configuration until the first refresh."""
+        with self._lock:
+            if self._token is None:
+                self._token = token
+
+    def refresh(self, fetch, stale_token=None):
+        """Replace ``stale_token``, rejected by the API server, by a new one.
+
+        If the current token differs from ``stale_token``, it has already
+        been refreshed and is returned without calling ``fetch``.
+        """
+        with self._lock:
+            if self._token is not None and self._token != stale_token:
+                return self._token
+            token, expires = fetch()
+            self._token = token
+            self._expires_at = self._get_deadline(expires)
+            LOG.debug("Keystone token refreshed, expires at %s", expires)
+            return token
+
+    def reset(self):
+        with self._lock:
+            self._token = None
+            self._expires_at = None
+            self._refreshing = False
+
+    def _needs_refresh(self):
+        if self._expires_at is None or self._refreshing:
+            return False
+        margin = cfg.CONF.APISERVER.auth_token_refresh_margin
+        return timeutils.now() >= self._expires_at - margin
+
+    def _start_background_refresh(self, fetch):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        eventlet.spawn_n(self._refresh_in_background, fetch, self._token)
+
+    def _refresh_in_background(self, fetch, stale_token):
+        try:
+            self.refresh(fetch, stale_token)
+        except Exception:
+            LOG.exception("Refresh of Keystone token failed, it will be "
+                          "refreshed when rejected by the API server")
+            # Do not retry until the token is refreshed on rejection
+            self._expires_at = None
+        finally:
+            self._refreshing = False
+
+    @staticmethod
+    def _get_deadline(expires):
+        """Convert expiration time to a value comparable with now()."""
+        if not expires:
+            return None
+        try:
+            expires_at = timeutils.normalize_time(
+                timeutils.parse_isotime(expires))
+        except ValueError:
+            LOG.warning("Cannot parse token expiration time %s", expires)
+            return None
+        remaining = timeutils.delta_seconds(timeutils.utcnow(), expires_at)
+        return timeutils.now() + remaining
+
+
+_MANAGER = TokenManager()
+
+
+def get_token(fetch=None):
+    """Return token of the current process, refreshing it if it expires."""
+    return _MANAGER.get_token(fetch)
+
+
+def set_initial_token(token):
+    _MANAGER.set_initial_token(token)
+
+
+def refresh_token(fetch, stale_token=None):
+    """Return a token to be used instead of the rejected ``stale_token``."""
+    return _MANAGER.refresh(fetch, stale_token)
+
+
+def reset():
+    _MANAGER.reset()
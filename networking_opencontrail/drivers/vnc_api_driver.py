@@ -60,6 +60,19 @@ class VncApiClient(object):
 
     def __init__(self):
         self.vnc_lib = None
+        self._change_listeners = []
+
+    def add_change_listener(self, listener):
+        """Call ``listener(obj_type, operation, obj)`` after objects change.
+
+        Listeners are notified of changes made through this client, e.g.
+        to update what they cached. ``obj`` is the changed object.
+        """
+        self._change_listeners.append(listener)
+
+    def _notify_change(self, obj_type, operation, obj):
+        for listener in self._change_listeners:
+            listener(obj_type, operation, obj)
 
     def read_pi_from_switch(self, switch_name, pi_name):
         pi_fq_name = [self.DEFAULT_GLOBAL_CONF, switch_name, pi_name]
@@ -111,6 +124,12 @@ class VncApiClient(object):
         return self._get_object("virtual_router",
                                 uuid=uuid, fq_name=fq_name)
 
+    def list_nodes(self):
+        return self._list_objects("node")
+
+    def list_ports(self, fields=None):
+        return self._list_objects("port", fields=fields)
+
     @vnc_connect
     def create_virtual_machine_interface(self, vmi):
         try:
@@ -131,6 +150,7 @@ class VncApiClient(object):
             self.vnc_lib.virtual_port_group_update(vpg)
         except vnc_api.NoIdError:
             LOG.warning("Cannot update VPG %s: not exists" % vpg.name)
+        self._notify_change("virtual_port_group", "update", vpg)
 
     @vnc_connect
     def _get_object(self, obj_name, uuid=None, fq_name=None):
@@ -141,6 +161,11 @@ class VncApiClient(object):
         except vnc_api.NoIdError:
             return None
 
+    @vnc_connect
+    def _list_objects(self, obj_type, fields=None):
+        return self.vnc_lib.resource_list(obj_type, detail=True,
+                                          fields=fields)
+
     @classmethod
     def make_virtual_machine_interface(cls, name, network, properties,
                                        bindings, project):
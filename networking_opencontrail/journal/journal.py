@@ -0,0 +1,177 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import os
+import threading
+
+from neutron_lib import context as n_context
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from networking_opencontrail.db import journal_db
+from networking_opencontrail.db import models
+
+LOG = logging.getLogger(__name__)
+
+# Number of the oldest unfinished entries examined in one scan
+UNFINISHED_ROWS_WINDOW = 500
+
+
+def get_dependencies(object_type, data):
+    """Return uuids of resources which have to be synchronized earlier.
+
+    Subnet depends on its network, port depends on its network and subnets.
+    """
+    resource = data.get(object_type) or {}
+    dependencies = set()
+    if object_type in ('subnet', 'port'):
+        dependencies.add(resource.get('network_id'))
+    if object_type == 'port':
+        dependencies.update(fixed_ip.get('subnet_id')
+                            for fixed_ip in resource.get('fixed_ips') or [])
+    dependencies.discard(None)
+    return dependencies
+
+
+class JournalThread(object):
+    """Journal of operations to be synchronized with Tungsten Fabric.
+
+    Operations are recorded by precommit in the Neutron database, within
+    the transaction of the change, and a background thread of each worker
+    replays them against the Contrail API, on behalf of the tenant and
+    user of the request which recorded them. Entries
+    for the same resource are processed in order, and an entry waits for
+    older entries of resources it depends on (network before subnet before
+    port, and the opposite for deletion). Failed entries are retried
+    up to [JOURNAL] max_retries times.
+
+    :param sync_handler: callable(context, object_type, operation, data)
+        performing the operation in Tungsten Fabric
+    """
+
+    def __init__(self, sync_handler):
+        self._sync_handler = sync_handler
+        self._sync_event = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def record(self, context, object_type, object_uuid, operation, data):
+        """Record entry, in the transaction of ``context`` if one is open.
+
+        The entry is synchronized only after :meth:`notify` is called or
+        the next scan, so that it is not read before being committed.
+        """
+        journal_db.create_pending_row(context, object_type, object_uuid,
+                                      operation, data)
+        LOG.debug("Recorded journal entry: %(operation)s %(type)s %(id)s",
+                  {'operation': operation, 'type': object_type,
+                   'id': object_uuid})
+
+    def notify(self):
+        """Wake the thread of this process to synchronize new entries."""
+        self.start()
+        self.set_sync_event()
+
+    def start(self):
+        """Start journal thread, once per process."""
+        if self._is_running():
+            return
+        with self._lock:
+            if self._is_running():
+                return
+            self._thread = threading.Thread(target=self._run,
+                                            name='opencontrail-journal')
+            self._thread.daemon = True
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def set_sync_event(self):
+        self._sync_event.set()
+
+    def _is_running(self):
+        return self._thread is not None and self._pid == os.getpid()
+
+    def _run(self):
+        while True:
+            self._sync_event.wait(cfg.CONF.JOURNAL.sync_interval)
+            self._sync_event.clear()
+            try:
+                self.sync_pending_entries()
+            except Exception:
+                LOG.exception("Synchronization of journal entries failed")
+
+    def sync_pending_entries(self):
+        context = n_context.get_admin_context()
+        journal_db.reset_stale_processing_rows(
+            context, cfg.CONF.JOURNAL.processing_timeout)
+
+        # Entries failed in this pass wait for the next one to be retried
+        retried = set()
+        while True:
+            rows = journal_db.get_unfinished_rows(context,
+                                                  UNFINISHED_ROWS_WINDOW)
+            synced = self._sync_rows(context, rows, retried)
+            # Entries beyond the window are read once older ones are synced
+            if not synced or len(rows) < UNFINISHED_ROWS_WINDOW:
+                return
+
+    def _sync_rows(self, context, rows, retried):
+        """Synchronize entries of ``rows`` in order.
+
+        :returns: number of synchronized entries
+        """
+        synced = 0
+        # Unfinished entries, which block entries depending on them
+        older = []
+        for row in rows:
+            data = journal_db.get_row_data(row)
+            dependencies = get_dependencies(row.object_type, data)
+            if (row.state == models.PENDING
+                    and row.seqnum not in retried
+                    and not self._is_blocked(row, dependencies, older)
+                    and journal_db.lock_pending_row(context, row)):
+                if self._sync_entry(context, row, data):
+                    synced += 1
+                    continue
+                retried.add(row.seqnum)
+            older.append((row.object_uuid, dependencies))
+        return synced
+
+    @staticmethod
+    def _is_blocked(row, dependencies, older):
+        for object_uuid, older_dependencies in older:
+            if (object_uuid == row.object_uuid
+                    or object_uuid in dependencies
+                    or row.object_uuid in older_dependencies):
+                return True
+        return False
+
+    def _sync_entry(self, context, row, data):
+        try:
+            self._sync_handler(journal_db.get_row_context(row),
+                               row.object_type, row.operation, data)
+        except Exception:
+            state = journal_db.update_row_after_failure(
+                context, row, cfg.CONF.JOURNAL.max_retries)
+            LOG.exception("Journal entry %(seqnum)s (%(operation)s "
+                          "%(type)s %(id)s) failed, moved to %(state)s",
+                          {'seqnum': row.seqnum, 'operation': row.operation,
+                           'type': row.object_type, 'id': row.object_uuid,
+                           'state': state})
+            return False
+
+        journal_db.delete_row(context, row)
+        return True
@@ -24,6 +24,7 @@ from neutron_lib.plugins import constants as plugin_const
 from oslo_log import helpers as log_helpers
 from oslo_log import log as logging
 from oslo_utils import excutils
+from osprofiler import profiler
 
 import networking_opencontrail.drivers.drv_opencontrail as driver
 import networking_opencontrail.l3.snat_synchronizer as snat_sync
@@ -55,6 +56,7 @@ class OpenContrailRouterHandler(extraroute_db.ExtraRoute_db_mixin,
         return ("L3 Router Service Plugin for basic L3 forwarding "
                 "using OpenContrail.")
 
+    @profiler.trace('l3_opencontrail', hide_args=True)
     @log_helpers.log_method_call
     def create_router(self, context, router):
         """Create Router callback handler for OpenContrail networking.
@@ -93,6 +95,7 @@ class OpenContrailRouterHandler(extraroute_db.ExtraRoute_db_mixin,
 
         return created_router
 
+    @profiler.trace('l3_opencontrail', hide_args=True)
     @log_helpers.log_method_call
     def delete_router(self, context, router_id):
         """Delete Router callback handler for OpenContrail networking.
@@ -111,6 +114,7 @@ class OpenContrailRouterHandler(extraroute_db.ExtraRoute_db_mixin,
                 LOG.error("Failed to delete router %(id)s: %(err)s",
                           {"id": router_id, "err": e})
 
+    @profiler.trace('l3_opencontrail', hide_args=True)
     @log_helpers.log_method_call
     def update_router(self, context, router_id, router):
         """Update Router callback handler for OpenContrail networking.
@@ -155,6 +159,7 @@ class OpenContrailRouterHandler(extraroute_db.ExtraRoute_db_mixin,
 
         return router_dict
 
+    @profiler.trace('l3_opencontrail', hide_args=True)
     @log_helpers.log_method_call
     def add_router_interface(self, context, router_id, interface_info):
         """Add Router Interface callback handler for OpenContrail.
@@ -185,6 +190,7 @@ class OpenContrailRouterHandler(extraroute_db.ExtraRoute_db_mixin,
 
         return new_router
 
+    @profiler.trace('l3_opencontrail', hide_args=True)
     @log_helpers.log_method_call
     def remove_router_interface(self, context, router_id, interface_info):
         """Remove router interface callback handler for OpenContrail.
@@ -206,6 +212,7 @@ class OpenContrailRouterHandler(extraroute_db.ExtraRoute_db_mixin,
 
         return new_router
 
+    @profiler.trace('l3_opencontrail', hide_args=True)
     @log_helpers.log_method_call
     def create_floatingip(self, context, floatingip,
                           initial_status=const.FLOATINGIP_STATUS_ACTIVE):
@@ -237,6 +244,7 @@ class OpenContrailRouterHandler(extraroute_db.ExtraRoute_db_mixin,
                     context, fip_dict['id'])
             raise
 
+    @profiler.trace('l3_opencontrail', hide_args=True)
     @log_helpers.log_method_call
     def update_floatingip(self, context, floatingip_id, floatingip):
         session = db_api.get_writer_session()
@@ -291,6 +299,7 @@ class OpenContrailRouterHandler(extraroute_db.ExtraRoute_db_mixin,
                     raise
             raise
 
+    @profiler.trace('l3_opencontrail', hide_args=True)
     @log_helpers.log_method_call
     def delete_floatingip(self, context, floatingip_id):
         session = db_api.get_writer_session()
@@ -327,6 +336,7 @@ class OpenContrailRouterHandler(extraroute_db.ExtraRoute_db_mixin,
 
             raise
 
+    @profiler.trace('l3_opencontrail', hide_args=True)
     @log_helpers.log_method_call
     def disassociate_floatingips(self, context, port_id, do_notify=True):
         session = db_api.get_writer_session()
@@ -13,22 +13,78 @@
 #    under the License.
 #
 
+import functools
+import threading
+
+import eventlet
 from requests import codes as http_status
 
 from neutron_lib.plugins import directory
-from retrying import retry
-
+from oslo_config import cfg
+from oslo_log import log as logging
+from osprofiler import profiler
+from retrying import Retrying
+
+from networking_opencontrail.common import constants
+from networking_opencontrail.common import utils
+from networking_opencontrail.drivers import concurrent_requests
 import networking_opencontrail.drivers.rest_driver as rest_driver
 
-TF_SNAT_DEVICE_OWNER = 'tf-compatibility:snat'
+LOG = logging.getLogger(__name__)
+
+TF_SNAT_DEVICE_OWNER = constants.TF_SNAT_DEVICE_OWNER
+# Attributes of SNAT interfaces used by the synchronizer
+SNAT_INTERFACE_FIELDS = ['id', 'fixed_ips']
+
+# Maximum number of uuids in a single list request, it keeps URL short
+LIST_CHUNK_SIZE = 50
 
 
 class SnatSynchronizer(object):
     def __init__(self):
+        utils.register_vnc_api_options()
         self.tf_helper = TFHelper()
         self.neutron_helper = NeutronHelper()
+        self._lock = threading.Lock()
+        # Latest state of routers to be synchronized in background
+        self._queued_syncs = {}
+        # Routers being synchronized in background
+        self._active_syncs = set()
 
+    @profiler.trace('snat_sync', hide_args=True)
     def sync_snat_interfaces(self, context, router_id, router=None):
+        if cfg.CONF.APISERVER.snat_sync_async:
+            self._sync_in_background(context, router_id, router)
+        else:
+            self._sync_snat_interfaces(context, router_id, router)
+
+    def _sync_in_background(self, context, router_id, router):
+        # The request context is not usable once the request is finished
+        background_context = utils.detach_context(context)
+        with self._lock:
+            self._queued_syncs[router_id] = (background_context, router)
+            if router_id in self._active_syncs:
+                return
+            self._active_syncs.add(router_id)
+        eventlet.spawn_n(self._run_background_syncs, router_id)
+
+    def _run_background_syncs(self, router_id):
+        # Synchronizations of a router are serialized and those requested
+        # meanwhile are merged, so that SNAT interfaces are not duplicated
+        while True:
+            with self._lock:
+                queued = self._queued_syncs.pop(router_id, None)
+                if queued is None:
+                    self._active_syncs.discard(router_id)
+                    return
+            context, router = queued
+            try:
+                self._sync_snat_interfaces(context, router_id, router)
+            except Exception:
+                LOG.exception("Synchronization of SNAT interfaces of "
+                              "router %s failed", router_id)
+
+    def _sync_snat_interfaces(self, context, router_id, router=None):
         new_snat_ips = self._get_tf_snat_ips(router_id, router)
 
         neutron_interfaces = self.neutron_helper.get_snat_interfaces(context,
@@ -56,7 +112,8 @@ class NeutronHelper(object):
     def get_snat_interfaces(self, context, router_id):
         ports = self._core_plugin.get_ports(
             context, filters={'device_id': [router_id],
-                              'device_owner': [TF_SNAT_DEVICE_OWNER]})
+                              'device_owner': [TF_SNAT_DEVICE_OWNER]},
+            fields=SNAT_INTERFACE_FIELDS)
         return ports
 
     def create_snat_interface(self, context, external_gateway_info,
@@ -89,22 +146,26 @@ class TFHelper(object):
             return []
 
         instance_ip_uuids = set(self._get_snat_ip_refs(router))
-        snat_ips = set(self._get_instance_ip(iip_id)['instance_ip_address']
-                       for iip_id in instance_ip_uuids)
+        snat_ips = set(iip['instance_ip_address'] for iip in
+                       self._list_resources('instance-ip', instance_ip_uuids))
 
         return list(snat_ips)
 
     def _get_snat_ip_refs(self, router):
+        # TF creates snat async, so it is polled with exponential back-off.
+        # Key error usually means that snat interface is not ready yet
+        conf = cfg.CONF.APISERVER
+        retrying = Retrying(
+            retry_on_exception=lambda exc: isinstance(exc, KeyError),
+            stop_max_attempt_number=conf.snat_retry_attempts,
+            # n-th retry waits multiplier * 2 ** n ms
+            wait_exponential_multiplier=conf.snat_retry_initial_delay * 500,
+            wait_exponential_max=conf.snat_retry_max_delay * 1000)
         try:
-            return self._get_snat_ip_refs_retry(router)
+            return retrying.call(self._get_snat_ip_refs_retry, router)
         except KeyError:
             return []
 
-    # TF creates snat async, so max. 3 retry to try get it
-    # Key error usually means that snat interface is not ready yet
-    @retry(retry_on_exception=lambda exc: isinstance(exc, KeyError),
-           stop_max_attempt_number=3,
-           wait_fixed=1000)
     def _get_snat_ip_refs_retry(self, router):
         for service_ref in router['service_instance_refs']:
             if self._not_a_snat_service(service_ref):
@@ -118,33 +179,61 @@ class TFHelper(object):
         # Since ServiceInstance.right_ip_address is deprecated, we need
         # to get the value manually by traversing TF's data structures.
         ip_refs = []
-        for vm in self._get_vms_from_service_instances_back_refs(service):
-            for vmi in self._get_vmis_from_virtual_machines_back_refs(vm):
-                if self._service_interface_is_of_right_type(vmi):
-                    ip_refs.extend(vmi['instance_ip_back_refs'])
+        vms = self._get_vms_from_service_instances_back_refs(service)
+        for vmi in self._get_vmis_from_virtual_machines_back_refs(vms):
+            if self._service_interface_is_of_right_type(vmi):
+                ip_refs.extend(vmi['instance_ip_back_refs'])
         return ip_refs
 
     def _get_vms_from_service_instances_back_refs(self, service_instance):
         return self._get_resources_by_objects_refs(
-            'virtual-machine', service_instance,
-            'virtual_machine_back_refs')
+            'virtual-machine', [service_instance],
+            'virtual_machine_back_refs',
+            fields=['virtual_machine_interface_back_refs'])
 
-    def _get_vmis_from_virtual_machines_back_refs(self, virtual_machine):
+    def _get_vmis_from_virtual_machines_back_refs(self, virtual_machines):
         return self._get_resources_by_objects_refs(
-            'virtual-machine-interface', virtual_machine,
-            'virtual_machine_interface_back_refs')
-
-    def _get_resources_by_objects_refs(self, resource_type, obj, ref_type):
-        resources = [self._get_resource(resource_type, ref['uuid'])
-                     for ref in obj[ref_type]]
-        return [res for res in resources if res is not None]
+            'virtual-machine-interface', virtual_machines,
+            'virtual_machine_interface_back_refs',
+            fields=['instance_ip_back_refs'])
+
+    def _get_resources_by_objects_refs(self, resource_type, objs, ref_type,
+                                       fields=None):
+        uuids = set()
+        for obj in objs:
+            uuids.update(ref['uuid'] for ref in obj[ref_type])
+        return self._list_resources(resource_type, uuids, fields)
+
+    def _list_resources(self, res_type, uuids, fields=None):
+        """Get resources of one type with as few requests as possible.
+
+        Resources are listed by uuids in chunks of LIST_CHUNK_SIZE,
+        and the chunks are requested concurrently.
+        """
+        uuids = sorted(uuids)
+        chunks = [uuids[i:i + LIST_CHUNK_SIZE]
+                  for i in range(0, len(uuids), LIST_CHUNK_SIZE)]
+        chunks_resources = concurrent_requests.gather(*[
+            functools.partial(self._list_resources_chunk, res_type, chunk,
+                              fields=fields)
+            for chunk in chunks])
+        return [resource for chunk_resources in chunks_resources
+                for resource in chunk_resources]
+
+    def _list_resources_chunk(self, res_type, uuids, fields=None):
+        query = {'obj_uuids': ','.join(uuids), 'detail': True}
+        if fields:
+            # Back references are listed only when asked for explicitly
+            query['fields'] = ','.join(fields)
+        status_code, response = self.rest_driver.list_resource(res_type,
+                                                               query)
+        if status_code != http_status.ok:
+            return []
+        return [item[res_type] for item in response['%ss' % res_type]]
 
     def _get_service_instance(self, service_id):
         return self._get_resource('service-instance', service_id)
 
-    def _get_instance_ip(self, iip_id):
-        return self._get_resource('instance-ip', iip_id)
-
     def _get_router(self, router_id):
         return self._get_resource('logical-router', router_id)
 
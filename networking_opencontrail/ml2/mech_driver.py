@@ -13,33 +13,42 @@
 #    under the License.
 #
 
+from neutron_lib.callbacks import events
+from neutron_lib.callbacks import registry
+from neutron_lib.callbacks import resources
+from oslo_config import cfg
 from oslo_log import log as logging
+from osprofiler import profiler
 
 import networking_opencontrail.drivers.drv_opencontrail as drv
 from neutron_lib.plugins.ml2 import api
 
+from networking_opencontrail.common import cache
+from networking_opencontrail.common import coalescer
+from networking_opencontrail.common import constants
+from networking_opencontrail.common import utils
 from networking_opencontrail.dm import dm_integrator
 from networking_opencontrail.drivers.vnc_api_driver import VncApiClient
-from networking_opencontrail.l3 import snat_synchronizer
+from networking_opencontrail.journal import journal
 from networking_opencontrail.ml2 import opencontrail_sg_callback
 from networking_opencontrail.ml2 import subnet_dns_integrator
+from networking_opencontrail.sync import full_sync
 
 LOG = logging.getLogger(__name__)
-OMIT_DEVICES_TYPES = [
-    "network:floatingip",
-    snat_synchronizer.TF_SNAT_DEVICE_OWNER,
-    subnet_dns_integrator.TF_DNS_DEVICE_OWNER,
-]
+OMIT_DEVICES_TYPES = constants.OMITTED_DEVICE_OWNERS
+# Maximum number of hosts remembered as running vRouter or not
+VROUTER_CACHE_SIZE = 10000
 
 
+@profiler.trace_cls('ml2_opencontrail', hide_args=True)
 class OpenContrailMechDriver(api.MechanismDriver):
     """Main ML2 Mechanism driver from OpenContrail.
 
     This driver deals with all resources managed through ML2
     Plugin. Additionally, it manages the Security Groups
-    Note: All the xxx_precommit() calls are ignored at the
-    moment as there is no relevance for them in the OpenContrial
-    SDN controller.
+    Note: xxx_precommit() calls only record operations in the journal,
+    when it is enabled, as there is no other relevance for them in the
+    OpenContrail SDN controller.
     """
 
     def initialize(self):
@@ -51,115 +60,166 @@ class OpenContrailMechDriver(api.MechanismDriver):
         self.dm_integrator = dm_integrator.DeviceManagerIntegrator()
         self.dm_integrator.initialize()
         self.tf_client = VncApiClient()
+        self.vrouter_cache = cache.LRUCache(VROUTER_CACHE_SIZE, 0)
+        utils.register_vnc_api_options()
+        self.journal = None
+        if cfg.CONF.JOURNAL.enabled:
+            self.journal = journal.JournalThread(self._sync_journal_entry)
+            # Threads do not survive fork, each worker starts its own
+            registry.subscribe(self._start_journal, resources.PROCESS,
+                               events.AFTER_INIT)
+        self.port_update_coalescer = None
+        window = cfg.CONF.APISERVER.port_update_coalescing_window
+        if window > 0 and not self.journal:
+            self.port_update_coalescer = coalescer.Coalescer(
+                window, self._flush_port_update,
+                merge=self._merge_port_updates)
+        self.port_create_batcher = None
+        # Keys of batches by ids of ports waiting in them
+        self._batched_ports = {}
+        window = cfg.CONF.APISERVER.port_create_batch_window
+        if window > 0 and not self.journal:
+            self.port_create_batcher = coalescer.Coalescer(
+                window, self._flush_port_creates,
+                merge=lambda pending, new: pending + new)
         LOG.info("Initialization of networking-opencontrail plugin: COMPLETE")
 
+    def get_workers(self):
+        interval = cfg.CONF.FULL_SYNC.interval
+        if interval:
+            return [full_sync.FullSyncWorker(interval)]
+        return []
+
     def create_network_precommit(self, context):
-        pass
+        network = context.current
+        self._record_journal_entry(context, 'network', network['id'], 'create',
+                                   {'network': network})
 
     def create_network_postcommit(self, context):
         """Create a network in OpenContrail."""
-        network = {'network': context.current}
-        try:
-            self.drv.create_network(context._plugin_context, network)
-        except Exception:
-            LOG.exception("Create Network Failed")
+        network = context.current
+        self._sync_resource(context._plugin_context, 'network', network['id'],
+                            'create', {'network': network},
+                            "Create Network Failed")
 
     def delete_network_precommit(self, context):
-        pass
+        network = context.current
+        self._record_journal_entry(context, 'network', network['id'], 'delete',
+                                   {'network': network})
 
     def delete_network_postcommit(self, context):
         """Delete a network from OpenContrail."""
         network = context.current
-        try:
-            self.drv.delete_network(context._plugin_context, network['id'])
-        except Exception:
-            LOG.exception("Delete Network Failed")
+        self._sync_resource(context._plugin_context, 'network', network['id'],
+                            'delete', {'network': network},
+                            "Delete Network Failed")
 
     def update_network_precommit(self, context):
-        pass
+        network = context.current
+        self._record_journal_entry(context, 'network', network['id'], 'update',
+                                   {'network': network})
 
     def update_network_postcommit(self, context):
         """Update an existing network in OpenContrail."""
-        network = {'network': context.current}
-        try:
-            self.drv.update_network(context._plugin_context,
-                                    network['network']['id'], network)
-        except Exception:
-            LOG.exception("Update Network Failed")
+        network = context.current
+        self._sync_resource(context._plugin_context, 'network', network['id'],
+                            'update', {'network': network},
+                            "Update Network Failed")
 
     def create_subnet_precommit(self, context):
-        pass
+        subnet = context.current
+        self._record_journal_entry(context, 'subnet', subnet['id'], 'create',
+                                   {'subnet': subnet})
 
     def create_subnet_postcommit(self, context):
         """Create a subnet in OpenContrail."""
-        subnet = {'subnet': context.current}
-        try:
-            ret_subnet = self.drv.create_subnet(context._plugin_context,
-                                                subnet)
-            self.subnet_handler.add_dns_port_for_subnet(
-                context._plugin_context, ret_subnet)
-        except Exception:
-            LOG.exception("Create Subnet Failed")
+        subnet = context.current
+        self._sync_resource(context._plugin_context, 'subnet', subnet['id'],
+                            'create', {'subnet': subnet},
+                            "Create Subnet Failed")
 
     def delete_subnet_precommit(self, context):
-        pass
+        subnet = context.current
+        self._record_journal_entry(context, 'subnet', subnet['id'], 'delete',
+                                   {'subnet': subnet})
 
     def delete_subnet_postcommit(self, context):
         """Delete a subnet from OpenContrail."""
         subnet = context.current
-        try:
-            self.drv.delete_subnet(context._plugin_context, subnet['id'])
-        except Exception:
-            LOG.exception("Delete Subnet Failed")
+        self._sync_resource(context._plugin_context, 'subnet', subnet['id'],
+                            'delete', {'subnet': subnet},
+                            "Delete Subnet Failed")
 
     def update_subnet_precommit(self, context):
-        pass
+        subnet = context.current
+        self._record_journal_entry(context, 'subnet', subnet['id'], 'update',
+                                   {'subnet': subnet})
 
     def update_subnet_postcommit(self, context):
         """Update a subnet in OpenContrail."""
-        subnet = {'subnet': context.current}
-        try:
-            self.drv.update_subnet(context._plugin_context,
-                                   subnet['subnet']['id'], subnet)
-        except Exception:
-            LOG.exception("Update Subnet Failed")
+        subnet = context.current
+        self._sync_resource(context._plugin_context, 'subnet', subnet['id'],
+                            'update', {'subnet': subnet},
+                            "Update Subnet Failed")
 
     def create_port_precommit(self, context):
-        pass
+        port = dict(context.current)
+        if self._is_callback_to_omit(port['device_owner']):
+            return
+        self._record_journal_entry(context, 'port', port['id'], 'create',
+                                   {'port': port})
 
     def create_port_postcommit(self, context):
         """Create a port in OpenContrail."""
-        port = {'port': dict(context.current)}
+        port = dict(context.current)
 
-        if self._is_callback_to_omit(port['port']['device_owner']):
+        if self._is_callback_to_omit(port['device_owner']):
             return
 
-        try:
-            self.drv.create_port(context._plugin_context, port)
-        except Exception:
-            LOG.exception("Create Port Failed")
+        if self.port_create_batcher:
+            # Batch may be created after the request is finished
+            plugin_context = utils.detach_context(context._plugin_context)
+            self._batched_ports[port['id']] = plugin_context.request_id
+            self.port_create_batcher.submit(plugin_context.request_id,
+                                            [(plugin_context, port)])
+            return
+
+        self._sync_resource(context._plugin_context, 'port', port['id'],
+                            'create', {'port': port}, "Create Port Failed")
 
     def update_port_precommit(self, context):
-        pass
+        port = dict(context.current)
+        if self._is_callback_to_omit(port['device_owner']):
+            return
+        self._record_journal_entry(context, 'port', port['id'], 'update',
+                                   {'port': port,
+                                    'original': context.original})
 
     def update_port_postcommit(self, context):
         """Update a port in OpenContrail."""
-        port = {'port': dict(context.current)}
+        port = dict(context.current)
 
-        if self._is_callback_to_omit(port['port']['device_owner']):
+        if self._is_callback_to_omit(port['device_owner']):
             return
 
-        try:
-            self.drv.update_port(context._plugin_context,
-                                 port['port']['id'], port)
-            if self.dm_integrator.enabled:
-                self.dm_integrator.sync_vlan_tagging_for_port(
-                    context._plugin_context, context.current, context.original)
-        except Exception:
-            LOG.exception("Update port Failed")
+        self._flush_port_create_in_progress(port['id'])
+        if self.port_update_coalescer:
+            # Coalesced update is sent after the request is finished
+            self.port_update_coalescer.submit(
+                port['id'],
+                (utils.detach_context(context._plugin_context), port,
+                 context.original))
+            return
+
+        self._flush_port_update(
+            port['id'], (context._plugin_context, port, context.original))
 
     def delete_port_precommit(self, context):
-        pass
+        port = context.current
+        if self._is_callback_to_omit(port['device_owner']):
+            return
+        self._record_journal_entry(context, 'port', port['id'], 'delete',
+                                   {'port': port})
 
     def delete_port_postcommit(self, context):
         """Delete a port from OpenContrail."""
@@ -168,13 +228,112 @@ class OpenContrailMechDriver(api.MechanismDriver):
         if self._is_callback_to_omit(port['device_owner']):
             return
 
+        self._flush_port_create_in_progress(port['id'])
+        if self.port_update_coalescer:
+            # Updates of deleted port are not worth sending
+            self.port_update_coalescer.discard(port['id'])
+
+        self._sync_resource(context._plugin_context, 'port', port['id'],
+                            'delete', {'port': port}, "Delete Port Failed")
+
+    @staticmethod
+    def _merge_port_updates(pending, new):
+        # Send the latest port state, but compare it with the state
+        # from before the first of merged updates
+        plugin_context, port, _ = new
+        return plugin_context, port, pending[2]
+
+    def _flush_port_update(self, port_id, update):
+        plugin_context, port, original = update
+        self._sync_resource(plugin_context, 'port', port_id, 'update',
+                            {'port': port, 'original': original},
+                            "Update port Failed")
+
+    def _flush_port_creates(self, request_id, batch):
+        plugin_context = batch[0][0]
+        ports = [port for _, port in batch]
+        for port in ports:
+            self._batched_ports.pop(port['id'], None)
+        results = self.drv.create_ports(
+            plugin_context, [{'port': port} for port in ports])
+        for port, result in zip(ports, results):
+            if isinstance(result, Exception):
+                LOG.error("Create Port Failed: %(id)s: %(error)s",
+                          {'id': port['id'], 'error': result})
+
+    def _flush_port_create_in_progress(self, port_id):
+        # Batched port has to exist before it is updated or bound, ports
+        # of other requests are left in their batches
+        request_id = self._batched_ports.get(port_id)
+        if request_id is not None:
+            self.port_create_batcher.flush(request_id)
+
+    def _start_journal(self, resource, event, trigger, payload=None):
+        self.journal.start()
+
+    def _record_journal_entry(self, context, object_type, object_uuid,
+                              operation, data):
+        """Record operation in the transaction of a precommit call.
+
+        Errors are raised, so that the Neutron change is rolled back.
+        """
+        if self.journal:
+            self.journal.record(context._plugin_context, object_type,
+                                object_uuid, operation, data)
+
+    def _sync_resource(self, plugin_context, object_type, object_uuid,
+                       operation, data, error_message):
+        """Propagate operation to OpenContrail, directly or via journal."""
+        if self.journal:
+            # Entry is recorded by precommit, once the change is committed
+            # the journal thread may synchronize it
+            self.journal.notify()
+            return
+
         try:
-            self.drv.delete_port(context._plugin_context, port['id'])
-            if self.dm_integrator.enabled:
-                self.dm_integrator.delete_vlan_tagging_for_port(
-                    context._plugin_context, port)
+            self._sync_journal_entry(plugin_context, object_type, operation,
+                                     data)
         except Exception:
-            LOG.exception("Delete Port Failed")
+            LOG.exception(error_message)
+
+    def _sync_journal_entry(self, context, object_type, operation, data):
+        handler = getattr(self, '_%s_%s' % (operation, object_type))
+        handler(context, **data)
+
+    def _create_network(self, context, network):
+        self.drv.create_network(context, {'network': network})
+
+    def _update_network(self, context, network):
+        self.drv.update_network(context, network['id'],
+                                {'network': network})
+
+    def _delete_network(self, context, network):
+        self.drv.delete_network(context, network['id'])
+
+    def _create_subnet(self, context, subnet):
+        ret_subnet = self.drv.create_subnet(context, {'subnet': subnet})
+        self.subnet_handler.add_dns_port_for_subnet(context, ret_subnet)
+
+    def _update_subnet(self, context, subnet):
+        self.drv.update_subnet(context, subnet['id'], {'subnet': subnet})
+
+    def _delete_subnet(self, context, subnet):
+        self.drv.delete_subnet(context, subnet['id'])
+
+    def _create_port(self, context, port):
+        self.drv.create_port(context, {'port': port})
+
+    def _update_port(self, context, port, original):
+        self.drv.update_port(context, port['id'], {'port': dict(port)},
+                             original=original)
+        if self.dm_integrator.enabled:
+            self.dm_integrator.sync_vlan_tagging_for_port(
+                context, port, original)
+
+    def _delete_port(self, context, port):
+        self.drv.delete_port(context, port['id'])
+        if self.dm_integrator.enabled:
+            self.dm_integrator.delete_vlan_tagging_for_port(context, port)
 
     def bind_port(self, context):
         """Bind port in OpenContrail."""
@@ -185,22 +344,42 @@ class OpenContrailMechDriver(api.MechanismDriver):
                     port=context.current['id'],
                     network=context.network.current['id']))
 
+            self._flush_port_create_in_progress(context.current['id'])
             host_id = context._port['binding:host_id']
-            fq_name = [
-                self.tf_client.DEFAULT_GLOBAL_CONF,
-                host_id]
-            vrouter = self.tf_client.get_virtual_router(fq_name=fq_name)
-
-            if vrouter is None:
+            if not self._is_vrouter_host(host_id):
                 LOG.debug(
                     "Refusing to bind port for {host}. "
                     "Not managed by TF.".format(host=host_id))
                 return
 
+            if self.journal:
+                # Port is created in Tungsten Fabric by the journal, so its
+                # binding host is sent by the journal too, from the entry
+                # recorded by update_port_precommit when ML2 commits it
+                self.drv.set_port_binding(context)
+                return
+
             self.drv.bind_port(context)
         except Exception:
             LOG.exception("Bind Port Failed")
 
+    def _is_vrouter_host(self, host_id):
+        """Check if host runs vRouter, remembering the answer for a while."""
+        is_vrouter_host = self.vrouter_cache.get(host_id)
+        if is_vrouter_host is not None:
+            return is_vrouter_host
+
+        fq_name = [self.tf_client.DEFAULT_GLOBAL_CONF, host_id]
+        vrouter = self.tf_client.get_virtual_router(fq_name=fq_name)
+        is_vrouter_host = vrouter is not None
+        if is_vrouter_host:
+            ttl = cfg.CONF.APISERVER.vrouter_cache_ttl
+        else:
+            ttl = cfg.CONF.APISERVER.vrouter_negative_cache_ttl
+        if ttl > 0:
+            self.vrouter_cache.set(host_id, is_vrouter_host, ttl=ttl)
+        return is_vrouter_host
+
     def create_security_group(self, context, sg):
         """Create a Security Group in OpenContrail."""
         # vnc_openstack does not allow to create default security group
@@ -20,9 +20,13 @@ from neutron_lib.plugins import directory
 from oslo_log import log as logging
 from oslo_utils import excutils
 
+from networking_opencontrail.common import constants
+
 LOG = logging.getLogger(__name__)
 
-TF_DNS_DEVICE_OWNER = 'tf-compatibility:dns'
+TF_DNS_DEVICE_OWNER = constants.TF_DNS_DEVICE_OWNER
+# Attributes of DNS ports used by the integrator
+DNS_PORT_FIELDS = ['id', 'fixed_ips']
 
 
 class SubnetDNSCompatibilityIntegrator(object):
@@ -30,12 +34,14 @@ class SubnetDNSCompatibilityIntegrator(object):
 
     It ensures that IP of the Tungsten Fabric's DNS server is correctly
     allocated and represented in Neutron as a Port. At initializing class,
-    it registers callbacks for subnet updates.
+    it registers callbacks for subnet updates, unless ``subscribe`` is
+    False.
     """
 
-    def __init__(self, tf_driver):
+    def __init__(self, tf_driver, subscribe=True):
         self.tf_driver = tf_driver
-        self.subscribe()
+        if subscribe:
+            self.subscribe()
 
     def before_delete_subnet(self, resource, event, trigger, payload):
         subnet_id = payload.resource_id
@@ -78,7 +84,7 @@ class SubnetDNSCompatibilityIntegrator(object):
         network_id = payload.resource_id
         context = payload.context
         subnets = self._core_plugin.get_subnets(
-            context, filters={'network_id': [network_id]})
+            context, filters={'network_id': [network_id]}, fields=['id'])
 
         for subnet in subnets:
             try:
@@ -139,14 +145,16 @@ class SubnetDNSCompatibilityIntegrator(object):
         ports = self._core_plugin.get_ports(
             context,
             filters={'device_id': [subnet_id],
-                     'device_owner': [TF_DNS_DEVICE_OWNER]})
+                     'device_owner': [TF_DNS_DEVICE_OWNER]},
+            fields=DNS_PORT_FIELDS)
         return ports
 
     def _get_tf_dns_for_network_in_neutron(self, context, network_id):
         ports = self._core_plugin.get_ports(
             context,
             filters={'network_id': [network_id],
-                     'device_owner': [TF_DNS_DEVICE_OWNER]})
+                     'device_owner': [TF_DNS_DEVICE_OWNER]},
+            fields=DNS_PORT_FIELDS)
         return ports
 
     def _delete_ports_in_neutron(self, context, ports):
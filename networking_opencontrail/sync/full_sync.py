@@ -0,0 +1,348 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""Full synchronization of Neutron resources with Tungsten Fabric.
+
+Failed postcommit operations are only logged, so Neutron and Tungsten
+Fabric may drift apart. :class:`FullSync` lists resources of both sides,
+compares digests of their synchronized attributes and creates, updates
+and optionally deletes resources in Tungsten Fabric, so that they match
+Neutron. It is run with the ``neutron-opencontrail-full-sync`` command,
+or periodically by a Neutron worker when [FULL_SYNC] interval is set::
+
+    neutron-opencontrail-full-sync --config-file /etc/neutron/neutron.conf \
+        --config-file /etc/neutron/plugins/ml2/ml2_conf_opencontrail.ini
+"""
+
+from __future__ import print_function
+
+import collections
+import functools
+import hashlib
+import sys
+
+import eventlet
+from neutron.common import config as common_config
+from neutron import manager
+from neutron_lib import context as n_context
+from neutron_lib.plugins import constants as plugin_constants
+from neutron_lib.plugins import directory
+from neutron_lib import worker
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+from oslo_utils import timeutils
+
+from networking_opencontrail.common import constants
+from networking_opencontrail.common import utils
+from networking_opencontrail.drivers import concurrent_requests
+import networking_opencontrail.drivers.drv_opencontrail as drv
+from networking_opencontrail.ml2 import subnet_dns_integrator
+
+LOG = logging.getLogger(__name__)
+
+# Compared attributes of synchronized resources, in order of creation
+SYNCED_FIELDS = collections.OrderedDict([
+    ('network', ('name', 'admin_state_up', 'shared')),
+    ('subnet', ('name', 'network_id', 'cidr', 'gateway_ip', 'enable_dhcp')),
+    ('security_group', ('name', 'description')),
+    ('port', ('name', 'network_id', 'mac_address', 'fixed_ips',
+              'device_id', 'device_owner', 'admin_state_up')),
+    ('router', ('name', 'admin_state_up')),
+    ('floatingip', ('floating_network_id', 'floating_ip_address',
+                    'port_id', 'fixed_ip_address')),
+])
+# Resources served by the L3 service plugin in Neutron
+L3_RESOURCES = ('router', 'floatingip')
+
+SyncDiff = collections.namedtuple('SyncDiff', ['create', 'update', 'delete'])
+
+
+def make_contrail_security_group(sg):
+    """Return security group as created in Tungsten Fabric."""
+    # vnc_openstack does not allow to create default security group
+    if sg.get('name') == 'default':
+        sg = dict(sg, name='default-openstack',
+                  description='default-openstack security group')
+    return sg
+
+
+def get_digest(res_type, resource):
+    """Return digest of synchronized attributes of the resource."""
+    if res_type == 'security_group':
+        resource = make_contrail_security_group(resource)
+    values = {}
+    for field in SYNCED_FIELDS[res_type]:
+        value = resource.get(field)
+        if field == 'fixed_ips':
+            value = sorted(ip['ip_address'] for ip in value or [])
+        # Unset attributes are None on one side and empty on the other
+        values[field] = value if value is not None else ''
+    return hashlib.sha1(jsonutils.dump_as_bytes(
+        values, sort_keys=True)).hexdigest()
+
+
+def compute_diff(neutron_digests, contrail_digests):
+    """Return ids of resources to create, update and delete in TF."""
+    create = sorted(res_id for res_id in neutron_digests
+                    if res_id not in contrail_digests)
+    update = sorted(res_id for res_id, digest in neutron_digests.items()
+                    if res_id in contrail_digests and
+                    contrail_digests[res_id] != digest)
+    delete = sorted(res_id for res_id in contrail_digests
+                    if res_id not in neutron_digests)
+    return SyncDiff(create, update, delete)
+
+
+class FullSync(object):
+    """Make resources in Tungsten Fabric match resources in Neutron.
+
+    Only digests of resources are kept in memory. Resources are read in
+    full only when they have to be created or updated. Changes are sent
+    concurrently, at most [APISERVER] max_concurrent_requests at a time,
+    parents before children. Resources found only in Tungsten Fabric are
+    reported, and deleted only with ``delete_extra``.
+    """
+
+    def __init__(self, driver=None, delete_extra=None, dry_run=False):
+        utils.register_vnc_api_options()
+        conf = cfg.CONF.FULL_SYNC
+        self.driver = driver or drv.OpenContrailDrivers()
+        self.delete_extra = (conf.delete_extra if delete_extra is None
+                             else delete_extra)
+        self.dry_run = dry_run
+        self.page_size = conf.page_size
+        # Only its helpers are used, the mechanism driver subscribes it
+        self.subnet_handler = (
+            subnet_dns_integrator.SubnetDNSCompatibilityIntegrator(
+                self.driver, subscribe=False))
+        self.context = n_context.get_admin_context()
+        self.timings = collections.OrderedDict()
+        self.stats = collections.OrderedDict()
+
+    def run(self):
+        """Synchronize resources and return statistics and phase timings."""
+        self.timings.clear()
+        self.stats.clear()
+        diffs = collections.OrderedDict()
+        for res_type in self._get_resource_types():
+            neutron_digests = self._timed('list %s in neutron' % res_type,
+                                          self._list_neutron, res_type)
+            contrail_digests = self._timed('list %s in contrail' % res_type,
+                                           self._list_contrail, res_type)
+            diff = self._timed('diff %s' % res_type, compute_diff,
+                               neutron_digests, contrail_digests)
+            diffs[res_type] = diff
+            self.stats[res_type] = {
+                'neutron': len(neutron_digests),
+                'contrail': len(contrail_digests),
+                'missing': len(diff.create),
+                'outdated': len(diff.update),
+                'extra': len(diff.delete),
+                'created': 0,
+                'updated': 0,
+                'deleted': 0,
+                'failed': 0,
+            }
+
+        if not self.dry_run:
+            for res_type, diff in diffs.items():
+                self._timed('create %s' % res_type, self._apply, res_type,
+                            'create', diff.create)
+                self._timed('update %s' % res_type, self._apply, res_type,
+                            'update', diff.update)
+            if self.delete_extra:
+                # Children before parents
+                for res_type, diff in reversed(list(diffs.items())):
+                    self._timed('delete %s' % res_type, self._apply,
+                                res_type, 'delete', diff.delete)
+
+        LOG.info("Full synchronization finished: %s", dict(self.stats))
+        return {'resources': self.stats, 'timings': self.timings}
+
+    def _timed(self, phase, func, *args):
+        with timeutils.StopWatch() as watch:
+            result = func(*args)
+        self.timings[phase] = watch.elapsed()
+        return result
+
+    def _get_resource_types(self):
+        if directory.get_plugin(plugin_constants.L3) is None:
+            return [res_type for res_type in SYNCED_FIELDS
+                    if res_type not in L3_RESOURCES]
+        return list(SYNCED_FIELDS)
+
+    def _get_neutron_plugin(self, res_type):
+        if res_type in L3_RESOURCES:
+            return directory.get_plugin(plugin_constants.L3)
+        return directory.get_plugin()
+
+    def _get_fields(self, res_type):
+        return ['id'] + list(SYNCED_FIELDS[res_type])
+
+    def _list_neutron(self, res_type):
+        list_resources = getattr(self._get_neutron_plugin(res_type),
+                                 'get_%ss' % res_type)
+        digests = {}
+        marker = None
+        while True:
+            page = list_resources(self.context,
+                                  fields=self._get_fields(res_type),
+                                  sorts=[('id', True)],
+                                  limit=self.page_size, marker=marker)
+            self._add_digests(digests, res_type, page)
+            if len(page) < self.page_size:
+                return digests
+            marker = page[-1]['id']
+
+    def _list_contrail(self, res_type):
+        resources = self.driver.iter_resources(
+            res_type, self.context, fields=self._get_fields(res_type))
+        digests = {}
+        self._add_digests(digests, res_type, resources)
+        return digests
+
+    @staticmethod
+    def _add_digests(digests, res_type, resources):
+        for resource in resources:
+            owner = resource.get('device_owner')
+            if (res_type == 'port' and
+                    owner in constants.OMITTED_DEVICE_OWNERS):
+                continue
+            digests[resource['id']] = get_digest(res_type, resource)
+
+    def _apply(self, res_type, operation, res_ids):
+        if not res_ids:
+            return
+        apply_operation = getattr(self, '_%s_resource' % operation)
+        results = concurrent_requests.gather(*[
+            functools.partial(apply_operation, res_type, res_id)
+            for res_id in res_ids], return_exceptions=True)
+        stats = self.stats[res_type]
+        for res_id, result in zip(res_ids, results):
+            if isinstance(result, Exception):
+                stats['failed'] += 1
+                LOG.error("Cannot %(operation)s %(type)s %(id)s in Tungsten "
+                          "Fabric: %(error)s",
+                          {'operation': operation, 'type': res_type,
+                           'id': res_id, 'error': result})
+            else:
+                stats['%sd' % operation] += 1
+
+    def _get_neutron_resource(self, res_type, res_id):
+        resource = getattr(self._get_neutron_plugin(res_type),
+                           'get_%s' % res_type)(self.context, res_id)
+        if res_type == 'security_group':
+            resource = make_contrail_security_group(resource)
+        return resource
+
+    def _create_resource(self, res_type, res_id):
+        resource = self._get_neutron_resource(res_type, res_id)
+        created = getattr(self.driver, 'create_%s' % res_type)(
+            self.context, {res_type: resource})
+        if res_type == 'subnet':
+            # As in postcommit, reserve the DNS server address in Neutron
+            self.subnet_handler.add_dns_port_for_subnet(self.context,
+                                                        created)
+
+    def _update_resource(self, res_type, res_id):
+        resource = self._get_neutron_resource(res_type, res_id)
+        getattr(self.driver, 'update_%s' % res_type)(
+            self.context, res_id, {res_type: resource})
+
+    def _delete_resource(self, res_type, res_id):
+        getattr(self.driver, 'delete_%s' % res_type)(self.context, res_id)
+
+
+class FullSyncWorker(worker.BaseWorker):
+    """Neutron worker running full synchronization periodically.
+
+    Neutron starts it in a process of its own, so that resources are
+    synchronized once per neutron-server, not by each API worker.
+    """
+
+    def __init__(self, interval):
+        super(FullSyncWorker, self).__init__()
+        self.interval = interval
+        self._thread = None
+
+    def start(self):
+        super(FullSyncWorker, self).start()
+        self._thread = eventlet.spawn(self._run)
+
+    def wait(self):
+        if self._thread is not None:
+            self._thread.wait()
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.kill()
+            self._thread = None
+
+    def reset(self):
+        pass
+
+    def _run(self):
+        while True:
+            eventlet.sleep(self.interval)
+            self._sync()
+
+    def _sync(self):
+        try:
+            FullSync().run()
+        except Exception:
+            LOG.exception("Full synchronization with Tungsten Fabric failed")
+
+
+def format_report(report):
+    header = ("%-16s %8s %8s %8s %8s %8s %8s %8s %8s %8s" %
+              ('resource', 'neutron', 'contrail', 'missing', 'outdated',
+               'extra', 'created', 'updated', 'deleted', 'failed'))
+    lines = [header, '-' * len(header)]
+    for res_type, stats in report['resources'].items():
+        lines.append(("%-16s " % res_type) +
+                     "%(neutron)8d %(contrail)8d %(missing)8d "
+                     "%(outdated)8d %(extra)8d %(created)8d %(updated)8d "
+                     "%(deleted)8d %(failed)8d" % stats)
+    lines.append('')
+    for phase, seconds in report['timings'].items():
+        lines.append("%-32s %9.3f s" % (phase, seconds))
+    return '\n'.join(lines)
+
+
+cli_opts = [
+    cfg.BoolOpt('dry-run',
+                default=False,
+                help='Only report differences, do not change Tungsten '
+                'Fabric'),
+    cfg.BoolOpt('delete-extra',
+                help='Delete resources which exist only in Tungsten Fabric, '
+                'overrides [FULL_SYNC] delete_extra'),
+]
+
+
+def main():
+    cfg.CONF.register_cli_opts(cli_opts)
+    common_config.init(sys.argv[1:])
+    common_config.setup_logging()
+    utils.register_vnc_api_options()
+    manager.init()
+
+    sync = FullSync(delete_extra=cfg.CONF.delete_extra,
+                    dry_run=cfg.CONF.dry_run)
+    report = sync.run()
+    print(format_report(report))
+    failed = sum(stats['failed'] for stats in report['resources'].values())
+    return 1 if failed else 0
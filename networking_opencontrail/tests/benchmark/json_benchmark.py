@@ -0,0 +1,124 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""Benchmark of JSON codecs on bodies of requests to the API server.
+
+A list of ports with several fixed IPs and binding profiles, like a
+response to an admin listing ports, is encoded and decoded by each
+installed codec. For each codec the best time of encoding and decoding
+out of ``--repeat`` runs is reported. Example::
+
+    tox -e json-benchmark -- --count 10000
+"""
+
+from __future__ import print_function
+
+import argparse
+import sys
+import time
+import uuid
+
+import six
+
+from networking_opencontrail.drivers import json_codec
+
+TENANT_ID = 'b0f5bd5b0b3e4b0a9c9e4a6d8c1f2e3d'
+
+
+def make_ports(count, fixed_ips=4):
+    """Return ``count`` ports, as listed by the API server."""
+    network_id = str(uuid.uuid4())
+    return [{'id': str(uuid.uuid4()),
+             'name': 'bench-port-%d' % i,
+             'network_id': network_id,
+             'tenant_id': TENANT_ID,
+             'admin_state_up': True,
+             'status': 'ACTIVE',
+             'mac_address': 'fa:16:3e:%02x:%02x:%02x' % (
+                 i // 65536 % 256, i // 256 % 256, i % 256),
+             'fixed_ips': [{'subnet_id': str(uuid.uuid4()),
+                            'ip_address': '10.%d.%d.%d' % (
+                                j, i // 256 % 256, i % 256)}
+                           for j in range(fixed_ips)],
+             'device_id': str(uuid.uuid4()),
+             'device_owner': 'compute:nova',
+             'security_groups': [str(uuid.uuid4())],
+             'binding:host_id': 'compute-%d' % (i % 10),
+             'binding:vif_type': 'vrouter',
+             'binding:vif_details': {'port_filter': True},
+             'binding:profile': {'local_link_information': [
+                 {'switch_info': 'leaf-%d' % (i % 4),
+                  'port_id': 'xe-0/0/%d' % (i % 48),
+                  'switch_id': 'de:ad:be:ef:00:%02x' % (i % 4)}]}}
+            for i in range(count)]
+
+
+def best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    return min(times)
+
+
+def run(count=1000, repeat=5, fixed_ips=4):
+    """Benchmark installed codecs and return their results."""
+    ports = make_ports(count, fixed_ips)
+    results = []
+    for name in sorted(json_codec.CODECS):
+        codec = json_codec.CODECS[name]()
+        body = codec.dumps(ports)
+        if isinstance(body, six.text_type):
+            body = body.encode('utf-8')
+        encode = best_time(lambda: codec.dumps(ports), repeat)
+        decode = best_time(lambda: codec.loads(body), repeat)
+        results.append({
+            'codec': name,
+            'resources': count,
+            'body_kb': len(body) / 1024.0,
+            'encode_ms': encode * 1000,
+            'decode_ms': decode * 1000,
+        })
+    return results
+
+
+def format_results(results):
+    header = ("%-8s %9s %10s %10s %10s" %
+              ('codec', 'resources', 'body KiB', 'encode ms', 'decode ms'))
+    lines = [header, '-' * len(header)]
+    for result in results:
+        lines.append("%(codec)-8s %(resources)9d %(body_kb)10.1f "
+                     "%(encode_ms)10.2f %(decode_ms)10.2f" % result)
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark JSON codecs of networking-opencontrail on '
+                    'a list of ports.')
+    parser.add_argument('--count', type=int, default=1000,
+                        help='Number of ports in the list')
+    parser.add_argument('--fixed-ips', type=int, default=4,
+                        help='Number of fixed IPs of each port')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of runs, the best one is reported')
+    args = parser.parse_args(argv)
+
+    print(format_results(run(args.count, args.repeat, args.fixed_ips)))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,287 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""Benchmark of the ML2 mechanism driver against a fake Contrail API server.
+
+Networks, subnets and ports are created, updated and deleted through
+OpenContrailMechDriver postcommit calls, the way ML2 calls them. For each
+operation the throughput, latency percentiles and number of requests sent
+to the API server are reported. Example::
+
+    tox -e benchmark -- --count 500 --latency 0.005
+
+Options of the plugin, e.g. caching or coalescing, can be set in a file
+passed with --config-file.
+"""
+
+from __future__ import print_function
+
+import argparse
+import math
+import sys
+import threading
+import time
+import uuid
+
+from neutron.conf import common as common_config
+from neutron_lib import context as n_context
+from oslo_config import cfg
+from six.moves import queue
+
+from networking_opencontrail.common import utils
+from networking_opencontrail.drivers import session_pool
+from networking_opencontrail.ml2 import mech_driver
+from networking_opencontrail.tests import fake_contrail_server
+
+TENANT_ID = 'b0f5bd5b0b3e4b0a9c9e4a6d8c1f2e3d'
+PHASES = ('create_network', 'create_subnet', 'create_port', 'update_port',
+          'delete_port', 'delete_subnet', 'delete_network')
+
+
+class _Ml2Context(object):
+    """Minimal ML2 resource context, as passed to postcommit calls."""
+
+    def __init__(self, current, original=None, network=None):
+        self.current = current
+        self.original = original
+        self.network = network
+        self._port = current
+        self._plugin_context = n_context.Context(
+            'benchmark', TENANT_ID, is_admin=True)
+
+
+def percentile(values, percent):
+    """Return ``percent`` percentile of ``values`` (nearest rank)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = int(math.ceil(percent / 100.0 * len(ordered)))
+    return ordered[max(rank, 1) - 1]
+
+
+class Ml2Benchmark(object):
+    def __init__(self, server, count, concurrency=1):
+        self.server = server
+        self.count = count
+        self.concurrency = concurrency
+        self.driver = mech_driver.OpenContrailMechDriver()
+        self.driver.initialize()
+        self.networks = []
+        self.subnets = []
+        self.ports = []
+
+    def run(self):
+        """Run all phases and return their results, in order."""
+        return [self._run_phase(phase) for phase in PHASES]
+
+    def _run_phase(self, phase):
+        items = getattr(self, '_prepare_%s' % phase)()
+        operation = getattr(self, '_%s' % phase)
+        requests_before = self.server.total_requests
+        errors_before = self.server.total_errors
+
+        start = time.time()
+        latencies = self._execute(operation, items)
+        self._flush_pending_operations()
+        duration = time.time() - start
+
+        ops = len(items)
+        return {
+            'operation': phase,
+            'ops': ops,
+            'ops_per_second': ops / duration if duration else 0.0,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'requests_per_op': (
+                float(self.server.total_requests - requests_before) / ops
+                if ops else 0.0),
+            'errors': self.server.total_errors - errors_before,
+        }
+
+    def _execute(self, operation, items):
+        latencies = []
+        work = queue.Queue()
+        for item in items:
+            work.put(item)
+
+        def worker():
+            while True:
+                try:
+                    item = work.get_nowait()
+                except queue.Empty:
+                    return
+                start = time.time()
+                try:
+                    operation(item)
+                except Exception:
+                    # Failed requests are counted by the server
+                    pass
+                latencies.append(time.time() - start)
+
+        threads = [threading.Thread(target=worker)
+                   for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies
+
+    def _flush_pending_operations(self):
+        # Coalesced and batched operations count to the phase they come from
+        for pending in (self.driver.port_update_coalescer,
+                        self.driver.port_create_batcher):
+            if pending:
+                pending.flush_all()
+
+    def _prepare_create_network(self):
+        self.networks = [{'id': str(uuid.uuid4()),
+                          'name': 'bench-net-%d' % i,
+                          'tenant_id': TENANT_ID,
+                          'admin_state_up': True,
+                          'shared': False}
+                         for i in range(self.count)]
+        return self.networks
+
+    def _prepare_create_subnet(self):
+        self.subnets = [{'id': str(uuid.uuid4()),
+                         'name': 'bench-subnet-%d' % i,
+                         'network_id': network['id'],
+                         'tenant_id': TENANT_ID,
+                         'ip_version': 4,
+                         'cidr': '10.%d.%d.0/24' % (i // 256, i % 256),
+                         'gateway_ip': '10.%d.%d.1' % (i // 256, i % 256),
+                         'enable_dhcp': True,
+                         'host_routes': [],
+                         'dns_nameservers': []}
+                        for i, network in enumerate(self.networks)]
+        return self.subnets
+
+    def _prepare_create_port(self):
+        self.ports = [{'id': str(uuid.uuid4()),
+                       'name': 'bench-port-%d' % i,
+                       'network_id': subnet['network_id'],
+                       'tenant_id': TENANT_ID,
+                       'admin_state_up': True,
+                       'mac_address': 'fa:16:3e:%02x:%02x:%02x' % (
+                           i // 65536 % 256, i // 256 % 256, i % 256),
+                       'fixed_ips': [{
+                           'subnet_id': subnet['id'],
+                           'ip_address': subnet['gateway_ip'][:-1] + '10'}],
+                       'device_id': str(uuid.uuid4()),
+                       'device_owner': 'compute:nova',
+                       'binding:host_id': 'compute-%d' % (i % 10)}
+                      for i, subnet in enumerate(self.subnets)]
+        return self.ports
+
+    def _prepare_update_port(self):
+        return self.ports
+
+    def _prepare_delete_port(self):
+        return self.ports
+
+    def _prepare_delete_subnet(self):
+        return self.subnets
+
+    def _prepare_delete_network(self):
+        return self.networks
+
+    def _create_network(self, network):
+        self.driver.create_network_postcommit(_Ml2Context(network))
+
+    def _create_subnet(self, subnet):
+        self.driver.create_subnet_postcommit(_Ml2Context(subnet))
+
+    def _create_port(self, port):
+        self.driver.create_port_postcommit(_Ml2Context(port))
+
+    def _update_port(self, port):
+        updated = dict(port, name=port['name'] + '-updated')
+        self.driver.update_port_postcommit(
+            _Ml2Context(updated, original=port))
+
+    def _delete_port(self, port):
+        self.driver.delete_port_postcommit(_Ml2Context(port))
+
+    def _delete_subnet(self, subnet):
+        self.driver.delete_subnet_postcommit(_Ml2Context(subnet))
+
+    def _delete_network(self, network):
+        self.driver.delete_network_postcommit(_Ml2Context(network))
+
+
+def configure(server, config_files=None):
+    """Point the plugin to ``server``, on top of the given config files."""
+    args = []
+    for config_file in config_files or []:
+        args.extend(['--config-file', config_file])
+    common_config.register_core_common_config_opts()
+    utils.register_vnc_api_options()
+    cfg.CONF(args=args, project='neutron')
+    cfg.CONF.set_override('auth_strategy', 'noauth')
+    cfg.CONF.set_override('api_server_ip', server.host, 'APISERVER')
+    cfg.CONF.set_override('api_server_port', server.port, 'APISERVER')
+    cfg.CONF.set_override('use_ssl', False, 'APISERVER')
+    # Injected errors are 503 responses, which would open the circuit
+    cfg.CONF.set_override('circuit_breaker_threshold', 0, 'APISERVER')
+    # Every run talks to its own server
+    session_pool.reset()
+
+
+def format_results(results):
+    header = ("%-16s %7s %10s %9s %9s %8s %7s" %
+              ('operation', 'ops', 'ops/s', 'p50 ms', 'p99 ms', 'req/op',
+               'errors'))
+    lines = [header, '-' * len(header)]
+    for result in results:
+        lines.append("%(operation)-16s %(ops)7d %(ops_per_second)10.1f "
+                     "%(p50_ms)9.2f %(p99_ms)9.2f %(requests_per_op)8.2f "
+                     "%(errors)7d" % result)
+    return '\n'.join(lines)
+
+
+def run(count=100, concurrency=1, latency=0.0, error_rate=0.0,
+        config_files=None):
+    server = fake_contrail_server.FakeContrailServer(
+        latency=latency, error_rate=error_rate).start()
+    try:
+        configure(server, config_files)
+        return Ml2Benchmark(server, count, concurrency).run()
+    finally:
+        server.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark networking-opencontrail ML2 driver against '
+                    'a fake Contrail API server.')
+    parser.add_argument('--count', type=int, default=100,
+                        help='Number of networks, subnets and ports')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='Number of concurrent API workers')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Latency of API server responses in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Fraction of API server requests failing')
+    parser.add_argument('--config-file', action='append', default=[],
+                        help='Plugin configuration file, may be repeated')
+    args = parser.parse_args(argv)
+
+    results = run(args.count, args.concurrency, args.latency,
+                  args.error_rate, args.config_file)
+    print(format_results(results))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
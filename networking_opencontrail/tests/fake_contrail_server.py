@@ -0,0 +1,367 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""In-process stand-in of the Contrail API server.
+
+It serves the Neutron relay endpoint (``POST /neutron/<object>``) used by
+OpenContrailDrivers and the subset of VNC REST API used by VncApiClient and
+TFHelper, keeping all resources in memory. Latency and errors can be
+injected to see how the plugin behaves with a slow or failing server.
+"""
+
+import collections
+import copy
+import gzip
+import io
+import json
+import random
+import threading
+import time
+import uuid
+
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+from six.moves.urllib import parse as urlparse
+
+NEUTRON_PREFIX = '/neutron/'
+# VNC resource types advertised on the home page, as used by VncApiClient
+# and TFHelper
+VNC_RESOURCE_TYPES = (
+    'fabric', 'instance-ip', 'logical-router', 'node', 'physical-interface',
+    'physical-router', 'port', 'project', 'service-instance',
+    'virtual-machine', 'virtual-machine-interface', 'virtual-network',
+    'virtual-port-group', 'virtual-router',
+)
+# Arguments of Neutron NotFound exceptions, as sent by the API server
+NOT_FOUND_ID_KEYS = {
+    'floatingip': 'floatingip_id',
+    'network': 'net_id',
+    'port': 'port_id',
+    'router': 'router_id',
+    'subnet': 'subnet_id',
+}
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn,
+                           BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # Keep-alive connections, as served by the real API server
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, do not delay the body
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else None
+        compressed = self.headers.get('Content-Encoding') == 'gzip'
+        if body and compressed:
+            body = gzip.GzipFile(fileobj=io.BytesIO(body)).read()
+        url = urlparse.urlparse(self.path)
+        query = dict(urlparse.parse_qsl(url.query))
+        status, content = self.server.fake.handle(
+            method, url.path, query,
+            json.loads(body.decode('utf-8')) if body else None,
+            compressed=compressed)
+
+        payload = json.dumps(content).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if 'gzip' in (self.headers.get('Accept-Encoding') or ''):
+            payload = self._gzip(payload)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    @staticmethod
+    def _gzip(payload):
+        buf = io.BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+            f.write(payload)
+        return buf.getvalue()
+
+
+class FakeContrailServer(object):
+    """Contrail API server keeping resources in memory.
+
+    :param latency: time in seconds each request is delayed by
+    :param error_rate: fraction of requests failing with HTTP 503
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0,
+                 error_rate=0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        # Neutron resources served by the relay, by object name and id
+        self.resources = collections.defaultdict(dict)
+        # VNC objects, by type and uuid
+        self.vnc_objects = collections.defaultdict(dict)
+        self.request_counts = collections.Counter()
+        self.error_counts = collections.Counter()
+        self.compressed_requests = 0
+        self._injected_errors = collections.deque()
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return "http://%s:%s" % (self.host, self.port)
+
+    @property
+    def total_requests(self):
+        return sum(self.request_counts.values())
+
+    @property
+    def total_errors(self):
+        return sum(self.error_counts.values())
+
+    def start(self):
+        self._server = _ThreadingHTTPServer((self.host, self.port),
+                                            _RequestHandler)
+        self._server.fake = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='fake-contrail-server')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def inject_error(self, status=500, content=None, count=1):
+        """Make the next ``count`` requests fail with ``status``."""
+        content = content or {'message': 'Injected error'}
+        with self._lock:
+            self._injected_errors.extend([(status, content)] * count)
+
+    def add_vnc_object(self, res_type, obj):
+        """Store VNC object of ``res_type`` and return its uuid."""
+        obj = copy.deepcopy(obj)
+        obj.setdefault('uuid', str(uuid.uuid4()))
+        obj.setdefault('fq_name', [res_type, obj['uuid']])
+        with self._lock:
+            self.vnc_objects[res_type][obj['uuid']] = obj
+        return obj['uuid']
+
+    def reset_counters(self):
+        with self._lock:
+            self.request_counts.clear()
+            self.error_counts.clear()
+            self.compressed_requests = 0
+
+    def handle(self, method, path, query, body, compressed=False):
+        if self.latency:
+            time.sleep(self.latency)
+
+        key = self._get_counter_key(method, path, body)
+        with self._lock:
+            self.request_counts[key] += 1
+            if compressed:
+                self.compressed_requests += 1
+            status, content = self._get_injected_error()
+            if status is None:
+                try:
+                    status, content = self._dispatch(method, path, query,
+                                                     body)
+                except (KeyError, TypeError, ValueError) as e:
+                    status, content = 400, {'message': str(e)}
+            if status >= 400:
+                self.error_counts[key] += 1
+        return status, content
+
+    @staticmethod
+    def _get_counter_key(method, path, body):
+        if path.startswith(NEUTRON_PREFIX):
+            operation = (body or {}).get('context', {}).get('operation')
+            return "%s %s" % (operation, path)
+        return "%s /%s" % (method, path.strip('/').split('/')[0])
+
+    def _get_injected_error(self):
+        if self._injected_errors:
+            return self._injected_errors.popleft()
+        if self.error_rate and random.random() < self.error_rate:
+            return 503, {'message': 'Injected error'}
+        return None, None
+
+    def _dispatch(self, method, path, query, body):
+        if path.startswith(NEUTRON_PREFIX):
+            return self._handle_neutron(path[len(NEUTRON_PREFIX):], body)
+
+        parts = path.strip('/').split('/')
+        if parts == ['']:
+            return 200, self._get_home_page()
+        if parts == ['fqname-to-id'] and method == 'POST':
+            return self._fqname_to_id(body['type'], body['fq_name'])
+        if len(parts) == 2:
+            res_type, res_id = parts
+            if method == 'GET':
+                return self._get_vnc_object(res_type, res_id)
+            if method == 'PUT':
+                return self._update_vnc_object(res_type, res_id, body)
+            if method == 'DELETE':
+                return self._delete_vnc_object(res_type, res_id)
+        if len(parts) == 1 and parts[0].endswith('s'):
+            res_type = parts[0][:-1]
+            if method == 'GET':
+                return self._list_vnc_objects(res_type, query)
+            if method == 'POST':
+                return self._create_vnc_object(res_type, body[res_type])
+        return 404, {'message': 'Unknown path %s' % path}
+
+    # Neutron relay
+
+    def _handle_neutron(self, obj_name, body):
+        operation = body['context']['operation']
+        data = body['data']
+        resources = self.resources[obj_name]
+        res_id = data.get('id')
+
+        if operation == 'CREATE':
+            resource = copy.deepcopy(data['resource'])
+            resource.setdefault('id', str(uuid.uuid4()))
+            resources[resource['id']] = resource
+            return 200, resource
+        if operation == 'READALL':
+            return 200, [res for res in resources.values()
+                         if self._matches(res, data.get('filters'))]
+        if operation == 'READCOUNT':
+            return 200, {'count': len([
+                res for res in resources.values()
+                if self._matches(res, data.get('filters'))])}
+        if operation in ('ADDINTERFACE', 'DELINTERFACE'):
+            if res_id not in resources:
+                return self._not_found(obj_name, res_id)
+            return 200, dict(data.get('resource') or {}, id=res_id)
+
+        if res_id not in resources:
+            return self._not_found(obj_name, res_id)
+        if operation == 'READ':
+            return 200, resources[res_id]
+        if operation == 'UPDATE':
+            resources[res_id].update(copy.deepcopy(data['resource']))
+            return 200, resources[res_id]
+        if operation == 'DELETE':
+            del resources[res_id]
+            return 200, None
+        return 400, {'exception': 'BadRequest', 'resource': obj_name,
+                     'msg': 'Unknown operation %s' % operation}
+
+    @staticmethod
+    def _matches(resource, filters):
+        for key, values in (filters or {}).items():
+            if values and resource.get(key) not in values:
+                return False
+        return True
+
+    @staticmethod
+    def _not_found(obj_name, res_id):
+        exception = ''.join(word.capitalize()
+                            for word in obj_name.split('_')) + 'NotFound'
+        return 404, {'exception': exception,
+                     NOT_FOUND_ID_KEYS.get(obj_name, 'id'): res_id}
+
+    # VNC REST API
+
+    def _get_home_page(self):
+        links = [{'link': {'rel': 'action', 'name': 'name-to-id',
+                           'href': '%s/fqname-to-id' % self.url}}]
+        for res_type in VNC_RESOURCE_TYPES:
+            links.append({'link': {'rel': 'collection', 'name': res_type,
+                                   'href': '%s/%ss' % (self.url, res_type)}})
+            links.append({'link': {'rel': 'resource-base', 'name': res_type,
+                                   'href': '%s/%s' % (self.url, res_type)}})
+        return {'href': self.url, 'links': links}
+
+    def _fqname_to_id(self, res_type, fq_name):
+        for obj in self.vnc_objects[res_type].values():
+            if obj['fq_name'] == fq_name:
+                return 200, {'uuid': obj['uuid']}
+        return 404, {'message': 'Name %s not found' % ':'.join(fq_name)}
+
+    def _get_vnc_object(self, res_type, res_id):
+        obj = self.vnc_objects[res_type].get(res_id)
+        if obj is None:
+            return 404, {'message': 'ID %s not found' % res_id}
+        return 200, {res_type: obj}
+
+    def _list_vnc_objects(self, res_type, query):
+        objects = self.vnc_objects[res_type]
+        if query.get('obj_uuids'):
+            uuids = query['obj_uuids'].split(',')
+            objs = [objects[res_id] for res_id in uuids if res_id in objects]
+        else:
+            objs = list(objects.values())
+
+        if str(query.get('detail')).lower() == 'true':
+            items = [{res_type: obj} for obj in objs]
+        else:
+            items = [{'uuid': obj['uuid'], 'fq_name': obj['fq_name'],
+                      'href': self._get_href(res_type, obj['uuid'])}
+                     for obj in objs]
+        return 200, {'%ss' % res_type: items}
+
+    def _create_vnc_object(self, res_type, obj):
+        obj = copy.deepcopy(obj)
+        obj.setdefault('uuid', str(uuid.uuid4()))
+        if 'fq_name' not in obj:
+            obj['fq_name'] = (obj.get('parent_fq_name', [])
+                              + [obj.get('name', obj['uuid'])])
+        self.vnc_objects[res_type][obj['uuid']] = obj
+        return 200, {res_type: {
+            'uuid': obj['uuid'], 'fq_name': obj['fq_name'],
+            'href': self._get_href(res_type, obj['uuid'])}}
+
+    def _update_vnc_object(self, res_type, res_id, body):
+        obj = self.vnc_objects[res_type].get(res_id)
+        if obj is None:
+            return 404, {'message': 'ID %s not found' % res_id}
+        obj.update(copy.deepcopy(body[res_type]))
+        return 200, {res_type: {'uuid': res_id,
+                                'href': self._get_href(res_type, res_id)}}
+
+    def _delete_vnc_object(self, res_type, res_id):
+        if self.vnc_objects[res_type].pop(res_id, None) is None:
+            return 404, {'message': 'ID %s not found' % res_id}
+        return 200, None
+
+    def _get_href(self, res_type, res_id):
+        return "%s/%s/%s" % (self.url, res_type, res_id)
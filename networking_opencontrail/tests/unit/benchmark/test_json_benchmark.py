@@ -0,0 +1,30 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+from networking_opencontrail.drivers import json_codec
+from networking_opencontrail.tests.benchmark import json_benchmark
+from networking_opencontrail.tests import base
+
+
+class JsonBenchmarkTestCase(base.TestCase):
+    def test_installed_codecs_are_benchmarked(self):
+        results = json_benchmark.run(count=10, repeat=1, fixed_ips=2)
+
+        self.assertEqual(sorted(json_codec.CODECS),
+                         [result['codec'] for result in results])
+        for result in results:
+            self.assertEqual(10, result['resources'])
+            self.assertGreater(result['body_kb'], 0)
+        self.assertIn('decode ms', json_benchmark.format_results(results))
@@ -0,0 +1,158 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import logging
+
+from neutron.tests.unit.extensions import base as test_extensions_base
+from neutron_lib import context as n_context
+from neutron_lib import exceptions
+from oslo_config import cfg
+
+from networking_opencontrail.common import utils
+from networking_opencontrail.drivers import drv_opencontrail
+from networking_opencontrail.drivers import rest_driver
+from networking_opencontrail.drivers import session_pool
+from networking_opencontrail.drivers import token_manager
+from networking_opencontrail.tests.benchmark import ml2_benchmark
+from networking_opencontrail.tests import fake_contrail_server
+
+
+class FakeServerTestCase(test_extensions_base.ExtensionTestCase):
+    def setUp(self):
+        super(FakeServerTestCase, self).setUp()
+        logging.disable(logging.CRITICAL)
+        self.server = fake_contrail_server.FakeContrailServer().start()
+        self.addCleanup(self.server.stop)
+
+        utils.register_vnc_api_options()
+        cfg.CONF.set_override('auth_strategy', 'noauth')
+        cfg.CONF.set_override('api_server_ip', self.server.host, 'APISERVER')
+        cfg.CONF.set_override('api_server_port', self.server.port,
+                              'APISERVER')
+        cfg.CONF.set_override('use_ssl', False, 'APISERVER')
+        cfg.CONF.set_override('resource_cache_size', 0, 'APISERVER')
+        session_pool.reset()
+        self.addCleanup(session_pool.reset)
+        token_manager.reset()
+        self.addCleanup(token_manager.reset)
+
+    def tearDown(self):
+        super(FakeServerTestCase, self).tearDown()
+        logging.disable(logging.NOTSET)
+
+
+class FakeContrailServerTestCases(FakeServerTestCase):
+    def setUp(self):
+        super(FakeContrailServerTestCases, self).setUp()
+        self.driver = drv_opencontrail.OpenContrailDrivers()
+        self.context = n_context.Context('user', 'tenant', is_admin=True)
+
+    def test_relayed_resources_are_stored(self):
+        network = {'id': 'net-1', 'name': 'network', 'tenant_id': 'tenant'}
+
+        self.driver.create_network(self.context, {'network': network})
+        result = self.driver.get_network(self.context, 'net-1')
+
+        self.assertEqual(network, result)
+        self.assertEqual(
+            1, self.server.request_counts['CREATE /neutron/network'])
+        self.assertEqual(
+            1, self.server.request_counts['READ /neutron/network'])
+
+    def test_missing_resource_is_not_found(self):
+        self.assertRaises(exceptions.NetworkNotFound,
+                          self.driver.get_network, self.context, 'net-1')
+        self.assertEqual(1, self.server.total_errors)
+
+    def test_injected_error_is_returned_once(self):
+        self.server.inject_error(status=503)
+
+        network = {'network': {'id': 'net-1'}}
+
+        self.assertRaises(Exception, self.driver.create_network,
+                          self.context, network)
+        self.driver.create_network(self.context, network)
+
+        self.assertEqual(2, self.server.total_requests)
+        self.assertEqual(1, self.server.total_errors)
+
+    def test_vnc_objects_are_listed(self):
+        first = self.server.add_vnc_object('virtual-router', {'name': 'a'})
+        self.server.add_vnc_object('virtual-router', {'name': 'b'})
+        driver = rest_driver.ContrailRestApiDriver()
+
+        status, content = driver.list_resource('virtual-router', {
+            'obj_uuids': first, 'detail': True})
+
+        self.assertEqual(200, status)
+        self.assertEqual(['a'], [item['virtual-router']['name']
+                                 for item in content['virtual-routers']])
+
+    def _enable_compression(self, threshold):
+        cfg.CONF.set_override('compression', True, 'APISERVER')
+        cfg.CONF.set_override('compression_threshold', threshold,
+                              'APISERVER')
+        self.addCleanup(cfg.CONF.clear_override, 'compression', 'APISERVER')
+        self.addCleanup(cfg.CONF.clear_override, 'compression_threshold',
+                        'APISERVER')
+
+    def test_large_requests_are_compressed(self):
+        self._enable_compression(1024)
+        network = {'id': 'net-1', 'name': 'n' * 2048, 'tenant_id': 'tenant'}
+
+        self.driver.create_network(self.context, {'network': network})
+        result = self.driver.get_networks(self.context)
+
+        self.assertEqual([network], result)
+        # Only the create request is large enough
+        self.assertEqual(1, self.server.compressed_requests)
+
+    def test_rest_requests_are_compressed(self):
+        self._enable_compression(0)
+        driver = rest_driver.ContrailRestApiDriver()
+
+        status, content = driver.create_resource('virtual-router', {
+            'virtual-router': {'name': 'a'}})
+
+        self.assertEqual(200, status)
+        stored = self.server.vnc_objects['virtual-router']
+        self.assertEqual('a', stored[content['virtual-router']['uuid']]
+                         ['name'])
+        self.assertEqual(1, self.server.compressed_requests)
+
+
+class Ml2BenchmarkTestCases(FakeServerTestCase):
+    def test_benchmark_runs_all_operations(self):
+        benchmark = ml2_benchmark.Ml2Benchmark(self.server, 3, concurrency=2)
+
+        results = benchmark.run()
+
+        self.assertEqual(list(ml2_benchmark.PHASES),
+                         [result['operation'] for result in results])
+        for result in results:
+            self.assertEqual(3, result['ops'])
+            self.assertEqual(0, result['errors'])
+            self.assertGreater(result['requests_per_op'], 0)
+        self.assertEqual({}, dict(self.server.resources['port']))
+        self.assertEqual({}, dict(self.server.resources['network']))
+        self.assertIn('create_port',
+                      ml2_benchmark.format_results(results))
+
+    def test_percentile(self):
+        values = [0.4, 0.1, 0.3, 0.2]
+
+        self.assertEqual(0.2, ml2_benchmark.percentile(values, 50))
+        self.assertEqual(0.4, ml2_benchmark.percentile(values, 99))
+        self.assertEqual(0.0, ml2_benchmark.percentile([], 50))
@@ -0,0 +1,84 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import mock
+
+from networking_opencontrail.common import cache
+from networking_opencontrail.tests import base
+
+
+@mock.patch("networking_opencontrail.common.cache.timeutils")
+class LRUCacheTestCase(base.TestCase):
+    def setUp(self):
+        super(LRUCacheTestCase, self).setUp()
+        self.cache = cache.LRUCache(2, 10)
+
+    def test_get_returns_stored_value(self, timeutils):
+        timeutils.now.return_value = 100
+        self.cache.set('key', {'id': 'value'})
+
+        self.assertEqual({'id': 'value'}, self.cache.get('key'))
+        self.assertIsNone(self.cache.get('other'))
+        self.assertEqual(1, self.cache.stats['hits'])
+        self.assertEqual(1, self.cache.stats['misses'])
+
+    def test_returned_value_is_a_copy(self, timeutils):
+        timeutils.now.return_value = 100
+        value = {'fixed_ips': ['10.0.0.1']}
+        self.cache.set('key', value)
+        value['fixed_ips'].append('10.0.0.2')
+
+        self.cache.get('key')['fixed_ips'].remove('10.0.0.1')
+
+        self.assertEqual({'fixed_ips': ['10.0.0.1']}, self.cache.get('key'))
+
+    def test_entry_expires(self, timeutils):
+        timeutils.now.return_value = 100
+        self.cache.set('key', 'value')
+        self.cache.set('short', 'value', ttl=1)
+
+        timeutils.now.return_value = 105
+        self.assertIsNone(self.cache.get('short'))
+        self.assertEqual('value', self.cache.get('key'))
+
+        timeutils.now.return_value = 110
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(2, self.cache.stats['expirations'])
+        self.assertEqual(0, len(self.cache))
+
+    def test_least_recently_used_entry_is_evicted(self, timeutils):
+        timeutils.now.return_value = 100
+        self.cache.set('first', 1)
+        self.cache.set('second', 2)
+        self.cache.get('first')
+
+        self.cache.set('third', 3)
+
+        self.assertIsNone(self.cache.get('second'))
+        self.assertEqual(1, self.cache.get('first'))
+        self.assertEqual(3, self.cache.get('third'))
+        self.assertEqual(1, self.cache.stats['evictions'])
+
+    def test_invalidate(self, timeutils):
+        timeutils.now.return_value = 100
+        self.cache.set(('port', 'a'), 1)
+        self.cache.set(('network', 'b'), 2)
+
+        removed = self.cache.invalidate(lambda key: key[0] == 'port')
+
+        self.assertEqual(1, removed)
+        self.assertIsNone(self.cache.get(('port', 'a')))
+        self.assertEqual(2, self.cache.get(('network', 'b')))
+        self.assertEqual(1, self.cache.stats['invalidations'])
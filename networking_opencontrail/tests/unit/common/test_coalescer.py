@@ -0,0 +1,138 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import threading
+
+import mock
+
+from networking_opencontrail.common import coalescer
+from networking_opencontrail.tests import base
+
+
+@mock.patch("networking_opencontrail.common.coalescer.eventlet")
+class CoalescerTestCase(base.TestCase):
+    def setUp(self):
+        super(CoalescerTestCase, self).setUp()
+        self.flush = mock.Mock()
+        self.coalescer = coalescer.Coalescer(0.2, self.flush)
+
+    def test_first_item_schedules_flush(self, eventlet):
+        self.coalescer.submit('key', 1)
+
+        eventlet.spawn_after.assert_called_once_with(
+            0.2, self.coalescer.flush, 'key')
+        self.flush.assert_not_called()
+
+    def test_items_within_window_are_collapsed(self, eventlet):
+        self.coalescer.submit('key', 1)
+        self.coalescer.submit('key', 2)
+        self.coalescer.submit('key', 3)
+
+        self.coalescer.flush('key')
+
+        self.flush.assert_called_once_with('key', 3)
+        self.assertEqual(1, eventlet.spawn_after.call_count)
+        self.assertEqual({'submitted': 3, 'flushed': 1, 'collapsed': 2,
+                          'discarded': 0}, self.coalescer.stats)
+
+    def test_custom_merge(self, eventlet):
+        self.coalescer = coalescer.Coalescer(
+            0.2, self.flush, merge=lambda pending, new: pending + [new])
+
+        self.coalescer.submit('key', [1])
+        self.coalescer.submit('key', 2)
+        self.coalescer.flush('key')
+
+        self.flush.assert_called_once_with('key', [1, 2])
+
+    def test_keys_are_flushed_separately(self, eventlet):
+        self.coalescer.submit('key1', 1)
+        self.coalescer.submit('key2', 2)
+
+        self.coalescer.flush_all()
+
+        self.flush.assert_has_calls([mock.call('key1', 1),
+                                     mock.call('key2', 2)], any_order=True)
+
+    def test_discarded_item_is_not_flushed(self, eventlet):
+        self.coalescer.submit('key', 1)
+
+        self.assertEqual(1, self.coalescer.discard('key'))
+        self.coalescer.flush('key')
+
+        self.flush.assert_not_called()
+        self.assertEqual(1, self.coalescer.stats['discarded'])
+
+    def test_discard_cancels_flush_of_window(self, eventlet):
+        timer = eventlet.spawn_after.return_value
+        self.coalescer.submit('key', 1)
+
+        self.coalescer.discard('key')
+        self.coalescer.submit('key', 2)
+
+        timer.cancel.assert_called_once_with()
+        self.assertEqual(2, eventlet.spawn_after.call_count)
+
+    def test_flush_cancels_timer(self, eventlet):
+        timer = eventlet.spawn_after.return_value
+        self.coalescer.submit('key', 1)
+
+        self.coalescer.flush_all()
+
+        timer.cancel.assert_called_once_with()
+
+    def test_flushes_of_key_are_serialized(self, eventlet):
+        flushing = threading.Event()
+        release = threading.Event()
+
+        def flush(key, item):
+            if item == 1:
+                flushing.set()
+                release.wait(5)
+        self.flush.side_effect = flush
+        self.coalescer.submit('key', 1)
+        first = threading.Thread(target=self.coalescer.flush, args=('key',))
+        first.start()
+        flushing.wait(5)
+        self.coalescer.submit('key', 2)
+        second = threading.Thread(target=self.coalescer.flush,
+                                  args=('key',))
+        second.start()
+        second.join(0.1)
+
+        self.flush.assert_called_once_with('key', 1)
+        release.set()
+        first.join(5)
+        second.join(5)
+        self.assertEqual([mock.call('key', 1), mock.call('key', 2)],
+                         self.flush.call_args_list)
+
+    def test_new_window_after_flush(self, eventlet):
+        self.coalescer.submit('key', 1)
+        self.coalescer.flush('key')
+        self.coalescer.submit('key', 2)
+        self.coalescer.flush('key')
+
+        self.flush.assert_has_calls([mock.call('key', 1),
+                                     mock.call('key', 2)])
+        self.assertEqual(2, eventlet.spawn_after.call_count)
+
+    def test_flush_failure_is_logged(self, eventlet):
+        self.flush.side_effect = Exception()
+        self.coalescer.submit('key', 1)
+
+        self.coalescer.flush('key')
+
+        self.assertEqual(1, self.coalescer.stats['flushed'])
@@ -0,0 +1,252 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import os
+import shutil
+import tempfile
+
+import mock
+from oslo_config import cfg
+
+from networking_opencontrail.common import metrics
+from networking_opencontrail.common import utils
+from networking_opencontrail.tests import base
+
+
+class RequestMetricsTestCase(base.TestCase):
+    def setUp(self):
+        super(RequestMetricsTestCase, self).setUp()
+        self.sink = mock.Mock()
+        self.metrics = metrics.RequestMetrics(self.sink)
+
+    def test_requests_are_aggregated(self):
+        self.metrics.record('port', 'CREATE', 0.02, 100, 200, 200)
+        self.metrics.record('port', 'CREATE', 0.3, 100, 50, 404, retries=1)
+        self.metrics.record('port', 'READ', 20.0)
+
+        snapshot = self.metrics.snapshot()
+
+        create = snapshot[('port', 'CREATE')]
+        self.assertEqual(2, create['count'])
+        self.assertAlmostEqual(0.32, create['duration_sum'])
+        self.assertEqual(0.3, create['duration_max'])
+        self.assertEqual(200, create['request_bytes'])
+        self.assertEqual(250, create['response_bytes'])
+        self.assertEqual(1, create['retries'])
+        self.assertEqual({'200': 1, '404': 1}, dict(create['statuses']))
+        self.assertEqual(1, create['duration_buckets'][2])
+        self.assertEqual(1, create['duration_buckets'][6])
+        read = snapshot[('port', 'READ')]
+        self.assertEqual({'error': 1}, dict(read['statuses']))
+        self.assertEqual(1, read['duration_buckets'][-1])
+
+    def test_request_is_emitted_to_sink(self):
+        self.metrics.record('port', 'CREATE', 0.02, 100, 200, 200)
+
+        self.sink.emit.assert_called_once_with(
+            self.metrics, 'port', 'CREATE', 0.02, 100, 200, 200, 0)
+
+    def test_sink_error_is_ignored(self):
+        self.sink.emit.side_effect = IOError()
+
+        self.metrics.record('port', 'CREATE', 0.02, 100, 200, 200)
+
+        self.assertEqual(1, self.metrics.snapshot()[('port', 'CREATE')]
+                         ['count'])
+
+    def test_circuit_states_are_recorded(self):
+        endpoint = 'http://10.0.0.1:8082'
+        self.metrics.record_circuit(endpoint, 'open')
+        self.metrics.record_circuit(endpoint, 'half_open')
+        self.metrics.record_circuit(endpoint, 'open')
+
+        self.assertEqual({endpoint: {'state': 'open', 'opened': 2}},
+                         self.metrics.circuits())
+        self.sink.emit_circuit.assert_called_with(self.metrics, endpoint,
+                                                  'open')
+
+
+class StatsdSinkTestCase(base.TestCase):
+    @mock.patch("networking_opencontrail.common.metrics.socket")
+    def test_request_is_sent(self, socket):
+        sink = metrics.StatsdSink('127.0.0.1', 8125, 'prefix')
+
+        sink.emit(None, 'virtual-router', 'GET', 0.0125, 0, 300, 200, 1)
+
+        sock = socket.socket.return_value
+        sock.sendto.assert_called_once_with(
+            b'prefix.virtual_router.get.duration:12.500|ms\n'
+            b'prefix.virtual_router.get.status.200:1|c\n'
+            b'prefix.virtual_router.get.request_bytes:0|c\n'
+            b'prefix.virtual_router.get.response_bytes:300|c\n'
+            b'prefix.virtual_router.get.retries:1|c',
+            ('127.0.0.1', 8125))
+
+    @mock.patch("networking_opencontrail.common.metrics.socket")
+    def test_circuit_state_is_sent(self, socket):
+        sink = metrics.StatsdSink('127.0.0.1', 8125, 'prefix')
+
+        sink.emit_circuit(None, 'http://10.0.0.1:8082', 'open')
+
+        sock = socket.socket.return_value
+        sock.sendto.assert_called_once_with(
+            b'prefix.circuit.http_10_0_0_1_8082.state:2|g',
+            ('127.0.0.1', 8125))
+
+
+class PrometheusFileSinkTestCase(base.TestCase):
+    def setUp(self):
+        super(PrometheusFileSinkTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.eventlet = mock.patch(
+            "networking_opencontrail.common.metrics.eventlet").start()
+        self.addCleanup(mock.patch.stopall)
+        self.path = os.path.join(self.directory, 'metrics.prom')
+        self.sink = metrics.PrometheusFileSink(self.path, 'prefix', 10)
+        self.metrics = metrics.RequestMetrics(self.sink)
+
+    def _read(self, pid=None):
+        with open(self.sink.get_path(pid)) as f:
+            return f.read()
+
+    def test_metrics_are_written(self):
+        self.metrics.record('port', 'CREATE', 0.02, 100, 200, 200)
+        self.sink.flush()
+
+        content = self._read()
+
+        labels = 'pid="%d",obj_type="port",operation="CREATE"' % os.getpid()
+        self.assertIn('prefix_request_duration_seconds_bucket{%s,le="0.01"} 0'
+                      % labels, content)
+        self.assertIn('prefix_request_duration_seconds_bucket{%s,le="0.025"} '
+                      '1' % labels, content)
+        self.assertIn('prefix_request_duration_seconds_bucket{%s,le="+Inf"} 1'
+                      % labels, content)
+        self.assertIn('prefix_request_duration_seconds_count{%s} 1' % labels,
+                      content)
+        self.assertIn('prefix_request_response_bytes_total{%s} 200' % labels,
+                      content)
+        self.assertIn('prefix_requests_total{%s,status="200"} 1' % labels,
+                      content)
+
+    def test_requests_do_not_write_file(self):
+        self.metrics.record('port', 'CREATE', 0.02, 100, 200, 200)
+        self.metrics.record_circuit('http://10.0.0.1:8082', 'open')
+
+        self.assertEqual([], os.listdir(self.directory))
+        self.eventlet.spawn_n.assert_called_once_with(self.sink._run)
+
+    def test_writer_rewrites_file_once_per_interval(self):
+        self.eventlet.sleep.side_effect = [None, StopIteration()]
+        self.metrics.record('port', 'CREATE', 0.02, 100, 200, 200)
+        self.metrics.record('port', 'READ', 0.02, 100, 200, 200)
+
+        with mock.patch.object(self.sink, 'write',
+                               wraps=self.sink.write) as write:
+            self.sink._changed.wait = mock.Mock()
+            self.assertRaises(StopIteration, self.sink._run)
+
+        write.assert_called_once_with(self.metrics)
+        self.eventlet.sleep.assert_called_with(10)
+        self.assertIn('READ', self._read())
+        self.assertEqual(['metrics.%d.prom' % os.getpid()],
+                         os.listdir(self.directory))
+
+    def test_unchanged_metrics_are_not_rewritten(self):
+        self.metrics.record('port', 'CREATE', 0.02, 100, 200, 200)
+        self.sink.flush()
+        os.remove(self.sink.get_path())
+
+        self.sink.flush()
+
+        self.assertEqual([], os.listdir(self.directory))
+
+    @mock.patch("atexit.register")
+    @mock.patch("os.getpid")
+    def test_each_process_writes_own_file(self, getpid, register):
+        getpid.return_value = 100
+        self.sink.emit(self.metrics)
+        self.sink.flush()
+        getpid.return_value = 101
+        self.metrics.record('port', 'CREATE', 0.02, 100, 200, 200)
+        self.sink.flush()
+
+        self.assertEqual(os.path.join(self.directory, 'metrics.100.prom'),
+                         self.sink.get_path(100))
+        self.assertNotIn('CREATE', self._read(100))
+        self.assertIn('pid="101"', self._read(101))
+        self.assertEqual(['metrics.100.prom', 'metrics.101.prom'],
+                         sorted(os.listdir(self.directory)))
+        self.assertEqual(2, register.call_count)
+        self.assertEqual(2, self.eventlet.spawn_n.call_count)
+
+    @mock.patch("atexit.register")
+    def test_file_is_removed_at_exit(self, register):
+        self.metrics.record('port', 'CREATE', 0.02, 100, 200, 200)
+        self.metrics.record('port', 'READ', 0.02, 100, 200, 200)
+        self.sink.flush()
+
+        remove, path = register.call_args[0]
+        remove(path)
+
+        register.assert_called_once_with(mock.ANY, self.sink.get_path())
+        self.assertEqual([], os.listdir(self.directory))
+
+    def test_circuit_state_is_written(self):
+        self.metrics.record('port', 'CREATE', 0.02, 100, 200, 200)
+        self.metrics.record_circuit('http://10.0.0.1:8082', 'open')
+        self.sink.flush()
+
+        content = self._read()
+        labels = 'pid="%d",endpoint="http://10.0.0.1:8082"' % os.getpid()
+        self.assertIn('prefix_circuit_state{%s} 2' % labels, content)
+        self.assertIn('prefix_circuit_opened_total{%s} 1' % labels, content)
+
+
+class MetricsTestCase(base.TestCase):
+    def setUp(self):
+        super(MetricsTestCase, self).setUp()
+        utils.register_vnc_api_options()
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def _set_sink(self, sink):
+        cfg.CONF.set_override('sink', sink, 'METRICS')
+        self.addCleanup(cfg.CONF.clear_override, 'sink', 'METRICS')
+
+    def test_disabled_metrics_are_not_recorded(self):
+        self._set_sink('none')
+
+        metrics.record('port', 'CREATE', 0.02)
+
+        self.assertIsNone(metrics.get_metrics())
+        self.assertEqual({}, metrics.snapshot())
+
+    def test_metrics_are_kept_in_memory(self):
+        self._set_sink('memory')
+
+        metrics.record('port', 'CREATE', 0.02)
+
+        self.assertIsNone(metrics.get_metrics().sink)
+        self.assertEqual(1, metrics.snapshot()[('port', 'CREATE')]['count'])
+
+    def test_statsd_sink_is_configured(self):
+        self._set_sink('statsd')
+
+        sink = metrics.get_metrics().sink
+
+        self.assertIsInstance(sink, metrics.StatsdSink)
+        self.assertEqual(('127.0.0.1', 8125), sink.address)
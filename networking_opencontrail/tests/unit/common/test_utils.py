@@ -18,6 +18,7 @@ import mock
 import requests
 
 from neutron.tests.unit.extensions import base as test_extensions_base
+from neutron_lib import context as n_context
 
 from networking_opencontrail.common import utils
 
@@ -94,3 +95,15 @@ class UtilsTestCases(test_extensions_base.ExtensionTestCase):
                           utils.vnc_api_is_authenticated)
 
         request.assert_called_with(mock.ANY)
+
+    def test_detach_context(self):
+        context = n_context.Context('user-1', 'project-1', roles=['member'],
+                                    request_id='req-1')
+
+        detached = utils.detach_context(context)
+
+        self.assertIsNot(context, detached)
+        self.assertEqual(utils.context_to_dict(context),
+                         utils.context_to_dict(detached))
+        self.assertEqual('req-1', detached.request_id)
+        self.assertFalse(detached.is_admin)
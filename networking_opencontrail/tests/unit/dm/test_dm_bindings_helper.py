@@ -34,8 +34,10 @@ class DmBindingsHelperTestCase(base.TestCase):
     @mock.patch("networking_opencontrail.dm.dm_bindings_helper.DmTopologyFile")
     def setUp(self, topology, config):
         super(DmBindingsHelperTestCase, self).setUp()
+        config.DM_INTEGRATION.cache_ttl = 60
         self.tf_client = mock.Mock(spec_set=VncApiClient())
         self.dm_topology = mock.Mock(spec_set=DmTopologyFile)
+        self.dm_topology.refresh_node.return_value = False
         topology.return_value = self.dm_topology
 
         self.helper = DmBindingsHelper(self.tf_client)
@@ -48,7 +50,9 @@ class DmBindingsHelperTestCase(base.TestCase):
 
         helper.initialize()
 
-        topology.assert_called_with(cfg.CONF.DM_INTEGRATION.topology)
+        topology.assert_called_with(
+            cfg.CONF.DM_INTEGRATION.topology,
+            cfg.CONF.DM_INTEGRATION.topology_file_check_interval)
         topology().initialize.assert_called()
 
     def test_check_host_managed_true_when_dm_topology_true(self):
@@ -197,6 +201,7 @@ class DmBindingsHelperTestCase(base.TestCase):
     def test_get_bindings_for_host_raise_when_pi_not_exist(self):
         self._mock_get_node()
         self._mock_tf_client_read_fabric_name()
+        self._mock_tf_client_when_no_vpg()
         self.tf_client.read_pi_from_switch = mock.Mock(return_value=None)
 
         self.assertRaises(PhysicalInterfaceNotFoundError,
@@ -206,6 +211,161 @@ class DmBindingsHelperTestCase(base.TestCase):
         self.tf_client.read_pi_from_switch('leaf1', 'xe-0/0/1')
         self.dm_topology.get_node.assert_called_with('compute1')
 
+    def test_get_bindings_for_host_retried_with_refreshed_node(self):
+        self._mock_get_node()
+        self._mock_tf_client_read_fabric_name()
+        self._mock_tf_client_when_no_vpg()
+        physical_interface = self.tf_client.read_pi_from_switch.return_value
+        self.tf_client.read_pi_from_switch = mock.Mock(
+            side_effect=[None, physical_interface])
+        self.dm_topology.refresh_node.return_value = True
+        tf_kvpairs = self._mock_tf_client_make_key_value_pairs()
+
+        bindings = self.helper.get_bindings_for_host('compute1')
+
+        self.assertEqual(tf_kvpairs, bindings)
+        self.dm_topology.refresh_node.assert_called_once_with('compute1')
+        self.assertEqual(2, self.dm_topology.get_node.call_count)
+
+    def test_tf_reads_are_cached(self):
+        self._mock_get_node()
+        self._mock_tf_client_when_autocreated_vpg_exists()
+        self._mock_tf_client_read_fabric_name()
+        self._mock_tf_client_make_key_value_pairs()
+
+        self.helper.get_bindings_for_host('compute1')
+        self.helper.get_bindings_for_host('compute1')
+
+        self.assertEqual(
+            2, self.tf_client.read_fabric_name_from_switch.call_count)
+        self.tf_client.read_pi_from_switch.assert_called_once_with(
+            'leaf1', 'xe-0/0/1')
+        self.assertEqual(2, self.tf_client.get_virtual_port_group.call_count)
+        self.assertIn(('vpg', 'vpg-2'), self._get_last_bindings())
+
+    def test_vpg_created_meanwhile_is_read_on_index_miss(self):
+        self._mock_get_node()
+        self._mock_tf_client_when_no_vpg()
+        self._mock_tf_client_read_fabric_name()
+        self._mock_tf_client_make_key_value_pairs()
+        self.helper.get_bindings_for_host('compute1')
+
+        # e.g. created by Device Manager or another Neutron worker
+        self._mock_tf_client_when_autocreated_vpg_exists()
+        self.helper.get_bindings_for_host('compute1')
+
+        self.assertIn(('vpg', 'vpg-2'), self._get_last_bindings())
+
+    @mock.patch("networking_opencontrail.common.cache.timeutils")
+    def test_vpg_index_entry_expires_after_ttl(self, timeutils):
+        self._mock_get_node()
+        self._mock_tf_client_when_autocreated_vpg_exists()
+        self._mock_tf_client_read_fabric_name()
+        self._mock_tf_client_make_key_value_pairs()
+        timeutils.now.return_value = 100
+        self.helper.get_bindings_for_host('compute1')
+
+        timeutils.now.return_value = 159
+        self.helper.get_bindings_for_host('compute1')
+        self.assertEqual(1, self.tf_client.read_pi_from_switch.call_count)
+
+        timeutils.now.return_value = 160
+        self.helper.get_bindings_for_host('compute1')
+        self.assertEqual(2, self.tf_client.read_pi_from_switch.call_count)
+
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_vpg_index_is_not_used_when_ttl_is_zero(self, config):
+        config.DM_INTEGRATION.cache_ttl = 0
+        self.tf_client.reset_mock()
+        topology = self.helper.topology
+        self.helper = DmBindingsHelper(self.tf_client)
+        self.helper.topology = topology
+        self._mock_get_node()
+        self._mock_tf_client_when_autocreated_vpg_exists()
+        self._mock_tf_client_read_fabric_name()
+        self._mock_tf_client_make_key_value_pairs()
+        listener = self.tf_client.add_change_listener.call_args[0][0]
+        vpg = self._make_vpg('vpg-3', self.PI_REFS)
+
+        listener('virtual_port_group', 'update', vpg)
+        self.helper.get_bindings_for_host('compute1')
+        self.helper.get_bindings_for_host('compute1')
+
+        self.assertEqual(2, self.tf_client.read_pi_from_switch.call_count)
+        self.assertIn(('vpg', 'vpg-2'), self._get_last_bindings())
+
+    def test_vpg_index_entry_is_set_on_vpg_update(self):
+        self._mock_get_node()
+        self._mock_tf_client_when_no_vpg()
+        self._mock_tf_client_read_fabric_name()
+        self._mock_tf_client_make_key_value_pairs()
+        listener = self.tf_client.add_change_listener.call_args[0][0]
+
+        listener('virtual_port_group', 'update',
+                 self._make_vpg('vpg-3', self.PI_REFS))
+        self.helper.get_bindings_for_host('compute1')
+
+        self.tf_client.read_pi_from_switch.assert_not_called()
+        self.assertIn(('vpg', 'vpg-3'), self._get_last_bindings())
+
+    def test_vpg_index_entry_is_moved_when_vpg_pis_change(self):
+        self._mock_get_node()
+        self._mock_tf_client_when_autocreated_vpg_exists()
+        self._mock_tf_client_read_fabric_name()
+        self._mock_tf_client_make_key_value_pairs()
+        self.helper.get_bindings_for_host('compute1')
+        listener = self.tf_client.add_change_listener.call_args[0][0]
+        self._mock_tf_client_when_no_vpg()
+
+        listener('virtual_port_group', 'update', self._make_vpg(
+            'vpg-2', [{'to': ['config', 'leaf3', 'xe-0/0/3']}]))
+        self.helper.get_bindings_for_host('compute1')
+
+        self.tf_client.read_pi_from_switch.assert_called_once_with(
+            'leaf1', 'xe-0/0/1')
+        self.assertNotIn(('vpg', 'vpg-2'), self._get_last_bindings())
+
+    def test_vpg_index_entry_is_dropped(self):
+        """VPG without VMIs is deleted, so it must not be used anymore."""
+        self._mock_get_node()
+        self._mock_tf_client_when_autocreated_vpg_exists()
+        self._mock_tf_client_read_fabric_name()
+        self._mock_tf_client_make_key_value_pairs()
+        self.helper.get_bindings_for_host('compute1')
+        listener = self.tf_client.add_change_listener.call_args[0][0]
+        self._mock_tf_client_when_no_vpg()
+
+        listener('virtual_port_group', 'update',
+                 self._make_vpg('vpg-2', self.PI_REFS, vmi_refs=[]))
+        self.helper.get_bindings_for_host('compute1')
+
+        self.tf_client.read_pi_from_switch.assert_called_once_with(
+            'leaf1', 'xe-0/0/1')
+        self.assertNotIn(('vpg', 'vpg-2'), self._get_last_bindings())
+
+    def test_drop_cached_vpg(self):
+        self._mock_get_node()
+        self._mock_tf_client_when_autocreated_vpg_exists()
+        self._mock_tf_client_read_fabric_name()
+        self._mock_tf_client_make_key_value_pairs()
+        self.helper.get_bindings_for_host('compute1')
+        # e.g. deleted through another Neutron worker
+        self._mock_tf_client_when_no_vpg()
+
+        self.assertTrue(self.helper.drop_cached_vpg('compute1'))
+        self.helper.get_bindings_for_host('compute1')
+
+        self.tf_client.read_pi_from_switch.assert_called_once_with(
+            'leaf1', 'xe-0/0/1')
+        self.assertNotIn(('vpg', 'vpg-2'), self._get_last_bindings())
+        self.assertFalse(self.helper.drop_cached_vpg('compute1'))
+
+    PI_REFS = [{'to': ['config', 'leaf1', 'xe-0/0/1']},
+               {'to': ['config', 'leaf2', 'xe-0/0/2']}]
+
+    def _get_last_bindings(self):
+        return self.tf_client.make_key_value_pairs.call_args[0][0]
+
     def _mock_get_node(self):
         switch_port_1 = {'name': 'ens1f1', 'switch_name': 'leaf1',
                          'port_name': 'xe-0/0/1'}
@@ -217,57 +377,47 @@ class DmBindingsHelperTestCase(base.TestCase):
     def _mock_get_node_none(self):
         self.dm_topology.get_node.return_value = None
 
+    @staticmethod
+    def _make_vpg(name, pi_refs, user_created=False, vmi_refs=None):
+        vpg = mock.Mock(fq_name=['parent-name', name],
+                        uuid=name.replace('vpg', 'vpg-id'))
+        vpg.get_physical_interface_refs = mock.Mock(return_value=pi_refs)
+        vpg.get_virtual_port_group_user_created = mock.Mock(
+            return_value=user_created)
+        if vmi_refs is None:
+            vmi_refs = [{'to': ['project', 'vmi']}]
+        vpg.get_virtual_machine_interface_refs = mock.Mock(
+            return_value=vmi_refs)
+        return vpg
+
     def _mock_tf_client_when_no_vpg(self):
-        self._mock_tf_client_physical_interface(vpg_refs=None)
+        self._mock_tf_client_vpgs([])
 
     def _mock_tf_client_when_only_manually_created_vpg_exists(self):
         """Mock existing one, manually-created VPG"""
-        vpg_1 = mock.Mock(fq_name=['parent-name', 'vpg-1'], uuid='vpg-id-1')
-        vpg_1.get_virtual_port_group_user_created = mock.Mock(
-            return_value=True)
-        self.tf_client.get_virtual_port_group = mock.Mock(side_effect=[vpg_1])
-
-        vpg_refs = [{'to': vpg_1.fq_name, 'uuid': vpg_1.uuid}]
-        self._mock_tf_client_physical_interface(vpg_refs)
+        self._mock_tf_client_vpgs([
+            self._make_vpg('vpg-1', self.PI_REFS, user_created=True)])
 
     def _mock_tf_client_when_autocreated_vpg_exists(self):
         """Mock existing two VPGs: one manually created, one auto-generated"""
-        vpg_1 = mock.Mock(fq_name=['parent-name', 'vpg-1'], uuid='vpg-id-1')
-        vpg_1.get_virtual_port_group_user_created = mock.Mock(
-            return_value=True)
-        vpg_2 = mock.Mock(fq_name=['parent-name', 'vpg-2'], uuid='vpg-id-2')
-        vpg_2_pi_refs = [{'to': ['config', 'leaf1', 'xe-0/0/1']},
-                         {'to': ['config', 'leaf2', 'xe-0/0/2']}]
-        vpg_2.get_physical_interface_refs = mock.Mock(
-            return_value=vpg_2_pi_refs)
-        vpg_2.get_virtual_port_group_user_created = mock.Mock(
-            return_value=False)
-        self.tf_client.get_virtual_port_group = mock.Mock(
-            side_effect=[vpg_1, vpg_2])
-
-        vpg_refs = [{'to': vpg_1.fq_name, 'uuid': vpg_1.uuid},
-                    {'to': vpg_2.fq_name, 'uuid': vpg_2.uuid}]
-        self._mock_tf_client_physical_interface(vpg_refs)
+        self._mock_tf_client_vpgs([
+            self._make_vpg('vpg-1', None, user_created=True),
+            self._make_vpg('vpg-2', self.PI_REFS)])
 
     def _mock_tf_client_when_autocreated_invalid_vpg_exists(self, vpg_pi_refs):
         """Mock VPG that doesn't have refs to all related PIs"""
-        vpg = mock.Mock(fq_name=['parent-name', 'vpg-1'], uuid='vpg-id-1')
-        vpg.get_physical_interface_refs = mock.Mock(
-            return_value=vpg_pi_refs)
-        vpg.get_virtual_port_group_user_created = mock.Mock(
-            return_value=False)
-        self.tf_client.get_virtual_port_group = mock.Mock(
-            side_effect=[vpg])
+        self._mock_tf_client_vpgs([self._make_vpg('vpg-1', vpg_pi_refs)])
 
-        vpg_refs = [{'to': vpg.fq_name, 'uuid': vpg.uuid}]
-        self._mock_tf_client_physical_interface(vpg_refs)
-
-    def _mock_tf_client_physical_interface(self, vpg_refs):
+    def _mock_tf_client_vpgs(self, vpgs):
+        """Mock VPGs referring to the first physical interface of node"""
         physical_interface = mock.Mock()
         physical_interface.get_virtual_port_group_back_refs = mock.Mock(
-            return_value=vpg_refs)
+            return_value=[{'uuid': vpg.uuid} for vpg in vpgs])
         self.tf_client.read_pi_from_switch = mock.Mock(
             return_value=physical_interface)
+        vpgs_by_uuid = dict((vpg.uuid, vpg) for vpg in vpgs)
+        self.tf_client.get_virtual_port_group = mock.Mock(
+            side_effect=lambda uuid: vpgs_by_uuid.get(uuid))
 
     def _mock_tf_client_read_fabric_name(self, fabric_name='fabric-1'):
         self.tf_client.read_fabric_name_from_switch = mock.Mock(
@@ -26,7 +26,8 @@ from networking_opencontrail.tests import base
 @ddt.ddt
 class DeviceManagerIntegratorTestCase(base.TestCase):
     @mock.patch("oslo_config.cfg.CONF",
-                DM_INTEGRATION=mock.MagicMock(enabled=True))
+                DM_INTEGRATION=mock.MagicMock(
+                    enabled=True, vlan_tagging_reconcile_window=0))
     @mock.patch("networking_opencontrail.dm.dm_integrator.DmBindingsHelper")
     def setUp(self, _, config):
         super(DeviceManagerIntegratorTestCase, self).setUp()
@@ -53,7 +54,8 @@ class DeviceManagerIntegratorTestCase(base.TestCase):
             self.assertEqual(self.dm_integrator.enabled, False)
 
     @mock.patch("oslo_config.cfg.CONF",
-                DM_INTEGRATION=mock.MagicMock(enabled=False))
+                DM_INTEGRATION=mock.MagicMock(
+                    enabled=False, vlan_tagging_reconcile_window=0))
     @mock.patch("networking_opencontrail.dm.dm_integrator"
                 ".DmBindingsHelper")
     def test_bindings_helper_is_not_initialized_when_disabled(self, helper, _):
@@ -64,7 +66,8 @@ class DeviceManagerIntegratorTestCase(base.TestCase):
         helper().initialize.assert_not_called()
 
     @mock.patch("oslo_config.cfg.CONF",
-                DM_INTEGRATION=mock.MagicMock(enabled=True))
+                DM_INTEGRATION=mock.MagicMock(
+                    enabled=True, vlan_tagging_reconcile_window=0))
     @mock.patch("networking_opencontrail.dm.dm_integrator"
                 ".DmBindingsHelper")
     def test_bindings_helper_is_loaded_on_initializing(self, helper, _):
@@ -113,6 +116,36 @@ class DeviceManagerIntegratorTestCase(base.TestCase):
         self.dm_integrator.delete_vlan_tagging_for_port.assert_called_with(
             context, self._disconnected_port)
 
+    @ddt.data(True, False)
+    def test_sync_create_tagging_retries_without_cached_vpg(self, cached):
+        self._mock_core_get_network()
+        self._mock_bindings_helper_check_host_managed()
+        self._mock_bindings_helper_get_bindings()
+        self.bindings_helper.drop_cached_vpg = mock.Mock(return_value=cached)
+        self._mock_tf_client_get_vmi(None)
+        self._mock_tf_client_get_project()
+        self._mock_tf_client_get_vn()
+        self._mock_tf_client_make_vmi_properties()
+        tf_created_vmi = self._mock_tf_client_make_vmi()
+        create_vmi = self.tf_client.create_virtual_machine_interface
+        create_vmi.side_effect = [RuntimeError, None]
+        context = self._get_fake_context()
+
+        if cached:
+            self.dm_integrator.sync_vlan_tagging_for_port(
+                context, self._port_data, self._port_data)
+        else:
+            self.assertRaises(
+                RuntimeError, self.dm_integrator.sync_vlan_tagging_for_port,
+                context, self._port_data, self._port_data)
+
+        self.bindings_helper.drop_cached_vpg.assert_called_once_with(
+            'compute1')
+        self.assertEqual(1 + cached,
+                         self.bindings_helper.get_bindings_for_host.call_count)
+        create_vmi.assert_called_with(tf_created_vmi)
+        self.assertEqual(1 + cached, create_vmi.call_count)
+
     @ddt.data('binding:host_id', 'device_id', 'device_owner', 'network_id')
     def test_sync_recreate_vlan_tagging_on_port_change(self, updated_field):
         """On update those fields, remove old and create new VMI"""
@@ -410,6 +443,90 @@ class DeviceManagerIntegratorTestCase(base.TestCase):
         self.tf_client.assert_has_calls(tf_expected_calls)
         self.tf_client.delete_virtual_machine_interface.assert_not_called()
 
+    @mock.patch("oslo_config.cfg.CONF",
+                DM_INTEGRATION=mock.MagicMock(
+                    enabled=True, vlan_tagging_reconcile_window=1.0))
+    def _make_reconciling_integrator(self, _):
+        integrator = dm_integrator.DeviceManagerIntegrator()
+        integrator.tf_client = self.tf_client
+        integrator.bindings_helper = self.bindings_helper
+        integrator.reconciler.submit = mock.Mock(
+            wraps=integrator.reconciler.submit)
+        return integrator
+
+    @mock.patch("networking_opencontrail.common.utils.detach_context")
+    @mock.patch("networking_opencontrail.common.coalescer.eventlet")
+    def test_reconcile_deletes_vmi_once_for_deleted_ports(
+            self, _, detach_context):
+        integrator = self._make_reconciling_integrator()
+        existing_vmi, vpg = self._mock_tf_client_vmi_with_vpg()
+        tf_project = self._mock_tf_client_get_project()
+        context = self._get_fake_context()
+        self.core_plugin.get_ports.return_value = []
+        second_port = dict(self._port_data, id='port-2', device_id='vm-2')
+
+        integrator.delete_vlan_tagging_for_port(context, self._port_data)
+        integrator.delete_vlan_tagging_for_port(context, second_port)
+        self.core_plugin.get_ports.assert_not_called()
+        integrator.reconciler.flush_all()
+
+        detach_context.assert_called_with(context)
+        self.core_plugin.get_ports.assert_called_once_with(
+            detach_context.return_value,
+            filters={'network_id': ['net-1'],
+                     'binding:host_id': ['compute1']})
+        expected_vmi_name = "_vlan_tag_for_vn_net-1_compute_compute1"
+        delete_vmi = self.tf_client.delete_virtual_machine_interface
+        delete_vmi.assert_called_once_with(
+            fq_name=tf_project.fq_name + [expected_vmi_name])
+        vpg.del_virtual_machine_interface.assert_called_with(existing_vmi)
+
+    @mock.patch("networking_opencontrail.common.utils.detach_context")
+    @mock.patch("networking_opencontrail.common.coalescer.eventlet")
+    def test_reconcile_keeps_vmi_when_ports_exist(self, *_):
+        integrator = self._make_reconciling_integrator()
+        self._mock_bindings_helper_check_host_managed()
+        self._mock_tf_client_vmi_with_vpg()
+        self._mock_tf_client_get_project()
+        self._mock_core_get_network()
+        context = self._get_fake_context()
+        self.core_plugin.get_ports.return_value = [self._port_data]
+        second_port = dict(self._port_data, id='port-2', device_id='vm-2')
+
+        integrator.delete_vlan_tagging_for_port(context, second_port)
+        integrator.reconciler.flush_all()
+
+        self.tf_client.delete_virtual_machine_interface.assert_not_called()
+        self.tf_client.create_virtual_machine_interface.assert_not_called()
+
+    @mock.patch("networking_opencontrail.common.utils.detach_context")
+    @mock.patch("networking_opencontrail.common.coalescer.eventlet")
+    def test_reconcile_creates_vmi_once_for_plugged_ports(self, *_):
+        integrator = self._make_reconciling_integrator()
+        self._mock_bindings_helper_check_host_managed()
+        self._mock_bindings_helper_get_bindings()
+        self._mock_tf_client_get_project()
+        self._mock_tf_client_get_vmi(None)
+        self._mock_tf_client_get_vn()
+        self._mock_tf_client_make_vmi_properties()
+        vmi = self._mock_tf_client_make_vmi()
+        self._mock_core_get_network()
+        context = self._get_fake_context()
+        second_port = dict(self._port_data, id='port-2', device_id='vm-2')
+        self.core_plugin.get_ports.return_value = [self._port_data,
+                                                   second_port]
+
+        integrator.sync_vlan_tagging_for_port(
+            context, self._port_data, self._port_data)
+        integrator.sync_vlan_tagging_for_port(
+            context, second_port, second_port)
+        integrator.reconciler.flush_all()
+
+        self.assertEqual(2, integrator.reconciler.submit.call_count)
+        self.core_plugin.get_ports.assert_called_once()
+        create_vmi = self.tf_client.create_virtual_machine_interface
+        create_vmi.assert_called_once_with(vmi)
+
     @property
     def _port_data(self):
         port_data = {'network_id': 'net-1',
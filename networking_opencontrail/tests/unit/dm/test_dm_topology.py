@@ -16,17 +16,25 @@
 import ddt
 import mock
 
+from networking_opencontrail.common import utils
 from networking_opencontrail.dm.dm_topology import DmTopologyApi
+from networking_opencontrail.dm.dm_topology import DmTopologyApiCached
 from networking_opencontrail.dm.dm_topology import DmTopologyFile
 from networking_opencontrail.dm.dm_topology import InvalidNodeError
 from networking_opencontrail.dm.dm_topology import NodeNotFoundError
 from networking_opencontrail.dm.dm_topology_loader import ConfigInvalidFormat
+from networking_opencontrail.dm.dm_topology_loader import DmTopologyLoader
 from networking_opencontrail.drivers.vnc_api_driver import VncApiClient
 from networking_opencontrail.tests import base
 
 
 @ddt.ddt
 class DmTopologyApiTestCase(base.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(DmTopologyApiTestCase, cls).setUpClass()
+        utils.register_vnc_api_options()
+
     @mock.patch("oslo_config.cfg.CONF")
     def setUp(self, config):
         super(DmTopologyApiTestCase, self).setUp()
@@ -168,6 +176,125 @@ class DmTopologyApiTestCase(base.TestCase):
         self.tf_client.get_port = mock.Mock(side_effect=[port_1, port_2])
 
 
+@mock.patch("networking_opencontrail.dm.dm_topology.timeutils")
+class DmTopologyApiCachedTestCase(base.TestCase):
+    def setUp(self):
+        super(DmTopologyApiCachedTestCase, self).setUp()
+        utils.register_vnc_api_options()
+        self.tf_client = mock.Mock(spec_set=VncApiClient())
+        self.tf_client.list_nodes.return_value = [
+            self._make_node('compute-1'), self._make_node('compute-2')]
+        self.tf_client.list_ports.return_value = [
+            self._make_port('compute-1', 'port-1', ['leaf1', 'xe-0/0/1']),
+            self._make_port('compute-1', 'port-2', ['leaf2', 'xe-0/0/2']),
+            self._make_port('compute-2', 'port-3', None)]
+        self.dm_topology = DmTopologyApiCached(self.tf_client, 300)
+
+    @staticmethod
+    def _make_node(host_id):
+        return mock.Mock(fq_name=['default-global-system-config', host_id])
+
+    @staticmethod
+    def _make_port(host_id, name, pi):
+        port = mock.Mock(
+            fq_name=['default-global-system-config', host_id, name])
+        pi_refs = None
+        if pi:
+            pi_refs = [{'to': ['default-global-system-config'] + pi}]
+        port.get_physical_interface_back_refs.return_value = pi_refs
+        return port
+
+    def test_topology_is_loaded_once(self, timeutils):
+        timeutils.now.return_value = 100
+        self.dm_topology.initialize()
+
+        node = self.dm_topology.get_node('compute-1')
+
+        self.assertEqual({'name': 'compute-1',
+                          'ports': [{'name': 'port-1',
+                                     'switch_name': 'leaf1',
+                                     'port_name': 'xe-0/0/1'},
+                                    {'name': 'port-2',
+                                     'switch_name': 'leaf2',
+                                     'port_name': 'xe-0/0/2'}]}, node)
+        self.assertIn('compute-2', self.dm_topology)
+        self.assertNotIn('compute-3', self.dm_topology)
+        self.tf_client.list_nodes.assert_called_once_with()
+        self.tf_client.list_ports.assert_called_once_with(
+            fields=['physical_interface_back_refs'])
+        self.tf_client.read_node_by_hostname.assert_not_called()
+
+    def test_get_node_raises_like_api_topology(self, timeutils):
+        timeutils.now.return_value = 100
+
+        self.assertRaises(InvalidNodeError,
+                          self.dm_topology.get_node, 'compute-2')
+        self.assertRaises(NodeNotFoundError,
+                          self.dm_topology.get_node, 'compute-3')
+
+    def test_stale_topology_is_reloaded(self, timeutils):
+        timeutils.now.return_value = 100
+        self.dm_topology.initialize()
+        self.tf_client.list_nodes.return_value = [self._make_node('compute-3')]
+        self.tf_client.list_ports.return_value = []
+
+        timeutils.now.return_value = 399
+        self.assertIn('compute-1', self.dm_topology)
+
+        timeutils.now.return_value = 400
+        self.assertNotIn('compute-1', self.dm_topology)
+        self.assertIn('compute-3', self.dm_topology)
+        self.assertEqual(2, self.tf_client.list_nodes.call_count)
+
+    def test_topology_is_kept_when_reload_fails(self, timeutils):
+        timeutils.now.return_value = 100
+        self.dm_topology.initialize()
+        self.tf_client.list_nodes.side_effect = RuntimeError()
+
+        timeutils.now.return_value = 500
+        self.assertIn('compute-1', self.dm_topology)
+        self.assertIn('compute-1', self.dm_topology)
+
+        self.assertEqual(3, self.tf_client.list_nodes.call_count)
+
+    def test_initialize_does_not_fail_when_api_is_down(self, timeutils):
+        timeutils.now.return_value = 100
+        self.tf_client.list_nodes.side_effect = RuntimeError()
+
+        self.dm_topology.initialize()
+
+        self.assertRaises(RuntimeError, self.dm_topology.get_node,
+                          'compute-1')
+
+    def test_refresh_node(self, timeutils):
+        timeutils.now.return_value = 100
+        self.dm_topology.initialize()
+        node = mock.Mock(get_ports=mock.Mock(
+            return_value=[{'uuid': 'port-3'}]))
+        self.tf_client.read_node_by_hostname.return_value = node
+        self.tf_client.get_port.return_value = self._make_port(
+            'compute-2', 'port-3', ['leaf1', 'xe-0/0/3'])
+
+        refreshed = self.dm_topology.refresh_node('compute-2')
+
+        self.assertTrue(refreshed)
+        self.assertEqual(['port-3'], [port['name'] for port in
+                                      self.dm_topology.get_node('compute-2')
+                                      ['ports']])
+        self.tf_client.read_node_by_hostname.assert_called_once_with(
+            'compute-2')
+        self.tf_client.list_nodes.assert_called_once_with()
+
+    def test_refresh_removed_node(self, timeutils):
+        timeutils.now.return_value = 100
+        self.dm_topology.initialize()
+        self.tf_client.read_node_by_hostname.return_value = None
+
+        self.dm_topology.refresh_node('compute-1')
+
+        self.assertNotIn('compute-1', self.dm_topology)
+
+
 @ddt.ddt
 class DmTopologyFileTestCase(base.TestCase):
     @mock.patch("oslo_config.cfg.CONF")
@@ -222,3 +349,77 @@ class DmTopologyFileTestCase(base.TestCase):
         switch_port = {'name': 'ens1f1', 'switch_name': 'leaf1',
                        'port_name': 'xe-0/0/1'}
         return {'compute1': {'name': 'compute1', 'ports': [switch_port]}}
+
+
+class DmTopologyFileReloadTestCase(base.TestCase):
+    def setUp(self):
+        super(DmTopologyFileReloadTestCase, self).setUp()
+        timeutils_patch = mock.patch(
+            "networking_opencontrail.dm.dm_topology.timeutils")
+        self.timeutils = timeutils_patch.start()
+        self.addCleanup(timeutils_patch.stop)
+        self.timeutils.now.return_value = 100
+
+        self.dm_topology = DmTopologyFile('path/', check_interval=30)
+        self.loader = mock.Mock(spec_set=DmTopologyLoader('path/'))
+        self.loader.stat.return_value = (1.0, 100, 1)
+        self.loader.load.return_value = {'compute1': self._make_node()}
+        self.dm_topology.topology_loader = self.loader
+        self.dm_topology.initialize()
+        self.loader.load.return_value = {'compute2': self._make_node()}
+
+    def test_file_is_not_checked_before_interval(self):
+        self.loader.stat.return_value = (2.0, 100, 1)
+        self.timeutils.now.return_value = 129
+
+        self.assertIn('compute1', self.dm_topology)
+        self.assertEqual(1, self.loader.stat.call_count)
+
+    def test_unchanged_file_is_not_reloaded(self):
+        self.timeutils.now.return_value = 130
+
+        self.assertIn('compute1', self.dm_topology)
+        self.assertEqual(2, self.loader.stat.call_count)
+        self.assertEqual(1, self.loader.load.call_count)
+
+    def test_changed_file_is_reloaded(self):
+        self.loader.stat.return_value = (2.0, 100, 1)
+        self.timeutils.now.return_value = 130
+
+        self.assertNotIn('compute1', self.dm_topology)
+        self.assertIn('compute2', self.dm_topology)
+        self.assertEqual(2, self.loader.load.call_count)
+
+    def test_previous_topology_is_used_when_changed_file_invalid(self):
+        self.loader.stat.return_value = (2.0, 100, 1)
+        self.loader.load.side_effect = ConfigInvalidFormat()
+        self.timeutils.now.return_value = 130
+
+        self.assertIn('compute1', self.dm_topology)
+
+        self.loader.load.side_effect = None
+        self.timeutils.now.return_value = 160
+
+        self.assertIn('compute2', self.dm_topology)
+
+    def test_previous_topology_is_used_when_file_removed(self):
+        self.loader.stat.return_value = None
+        self.timeutils.now.return_value = 130
+
+        self.assertIn('compute1', self.dm_topology)
+        self.assertEqual(1, self.loader.load.call_count)
+
+    def test_file_is_not_checked_when_disabled(self):
+        dm_topology = DmTopologyFile('path/')
+        dm_topology.topology_loader = self.loader
+        dm_topology.initialize()
+        self.loader.stat.return_value = (2.0, 100, 1)
+        self.timeutils.now.return_value = 1000
+
+        self.assertIn('compute2', dm_topology)
+        self.assertEqual(2, self.loader.stat.call_count)
+        self.assertEqual(2, self.loader.load.call_count)
+
+    def _make_node(self):
+        return {'name': 'compute', 'ports': [{'switch_name': 'leaf1',
+                                              'port_name': 'xe-0/0/1'}]}
@@ -86,12 +86,33 @@ class TestDmTopologyLoader(base.TestCase):
     @mock.patch("oslo_config.cfg.CONF")
     @mock.patch("networking_opencontrail.dm.dm_topology_loader.yaml")
     def test_load_yaml_file_loads_right_file(self, yaml, _):
-        yaml.safe_load = mock.Mock(return_value='loaded')
+        yaml.load = mock.Mock(return_value='loaded')
 
         with mock.patch("networking_opencontrail.dm.dm_topology_loader.open",
                         mock.mock_open(), create=True) as mocked_open:
             value = self.dm_topology_loader._load_yaml_file('path/to/file')
 
             mocked_open.assert_called_with('path/to/file', 'r')
-            yaml.safe_load.assert_called_with(mocked_open())
+            yaml.load.assert_called_with(
+                mocked_open(), Loader=dm_topology_loader.SafeLoader)
             self.assertEqual('loaded', value)
+
+    def test_load_yaml_file_is_safe(self):
+        with mock.patch("networking_opencontrail.dm.dm_topology_loader.open",
+                        mock.mock_open(read_data="!!python/object/apply:"
+                                       "os.getcwd []"),
+                        create=True):
+            self.assertRaises(Exception,
+                              self.dm_topology_loader._load_yaml_file,
+                              'path/to/file')
+
+    @mock.patch("networking_opencontrail.dm.dm_topology_loader.os")
+    def test_stat_returns_file_version(self, os):
+        os.stat.return_value = mock.Mock(st_mtime=10.5, st_size=100,
+                                         st_ino=7)
+
+        self.assertEqual((10.5, 100, 7), self.dm_topology_loader.stat())
+        os.stat.assert_called_with('path/')
+
+    def test_stat_returns_none_when_no_file(self):
+        self.assertIsNone(self.dm_topology_loader.stat())
@@ -0,0 +1,114 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import mock
+import requests
+
+from networking_opencontrail.drivers import circuit_breaker
+from networking_opencontrail.tests import base
+
+ENDPOINT = 'http://10.0.0.1:8082'
+
+
+class CircuitBreakerTestCase(base.TestCase):
+    def setUp(self):
+        super(CircuitBreakerTestCase, self).setUp()
+        self.timeutils = mock.patch(
+            "networking_opencontrail.drivers.circuit_breaker.timeutils"
+        ).start()
+        self.timeutils.now.return_value = 100
+        self.metrics = mock.patch(
+            "networking_opencontrail.drivers.circuit_breaker.metrics"
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+        self.breaker = circuit_breaker.CircuitBreaker(ENDPOINT, 3, 30)
+
+    def _fail(self, count):
+        for _ in range(count):
+            self.breaker.before_request()
+            self.breaker.record_failure()
+
+    def test_circuit_opens_after_consecutive_failures(self):
+        self._fail(2)
+        self.breaker.before_request()
+        self.breaker.record_success()
+        self._fail(2)
+
+        self.assertEqual(circuit_breaker.CLOSED, self.breaker.state)
+
+        self._fail(1)
+
+        self.assertEqual(circuit_breaker.OPEN, self.breaker.state)
+        self.metrics.record_circuit.assert_called_once_with(
+            ENDPOINT, circuit_breaker.OPEN)
+
+    def test_open_circuit_fails_immediately(self):
+        self._fail(3)
+        self.timeutils.now.return_value = 129
+
+        self.assertRaises(circuit_breaker.CircuitOpenError,
+                          self.breaker.before_request)
+        self.assertRaises(requests.exceptions.ConnectionError,
+                          self.breaker.before_request)
+        self.assertEqual(2, self.breaker.rejected)
+
+    def test_single_probe_is_sent_after_reset_timeout(self):
+        self._fail(3)
+        self.timeutils.now.return_value = 130
+
+        self.breaker.before_request()
+
+        self.assertEqual(circuit_breaker.HALF_OPEN, self.breaker.state)
+        self.assertRaises(circuit_breaker.CircuitOpenError,
+                          self.breaker.before_request)
+
+    def test_successful_probe_closes_circuit(self):
+        self._fail(3)
+        self.timeutils.now.return_value = 130
+        self.breaker.before_request()
+
+        self.breaker.record_success()
+
+        self.assertEqual(circuit_breaker.CLOSED, self.breaker.state)
+        self.breaker.before_request()
+        self.assertEqual(
+            [mock.call(ENDPOINT, circuit_breaker.OPEN),
+             mock.call(ENDPOINT, circuit_breaker.HALF_OPEN),
+             mock.call(ENDPOINT, circuit_breaker.CLOSED)],
+            self.metrics.record_circuit.call_args_list)
+
+    def test_failed_probe_opens_circuit_again(self):
+        self._fail(3)
+        self.timeutils.now.return_value = 130
+        self.breaker.before_request()
+
+        self.breaker.record_failure()
+
+        self.assertEqual(circuit_breaker.OPEN, self.breaker.state)
+        self.timeutils.now.return_value = 159
+        self.assertRaises(circuit_breaker.CircuitOpenError,
+                          self.breaker.before_request)
+        self.timeutils.now.return_value = 160
+        self.breaker.before_request()
+
+    def test_released_probe_lets_next_request_probe(self):
+        self._fail(3)
+        self.timeutils.now.return_value = 130
+        self.breaker.before_request()
+
+        self.breaker.release()
+
+        self.assertEqual(circuit_breaker.HALF_OPEN, self.breaker.state)
+        self.breaker.before_request()
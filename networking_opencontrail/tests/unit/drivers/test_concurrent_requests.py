@@ -0,0 +1,88 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import functools
+
+import eventlet
+from oslo_config import cfg
+
+from networking_opencontrail.common import utils
+from networking_opencontrail.drivers import concurrent_requests
+from networking_opencontrail.tests import base
+
+
+class GatherTestCase(base.TestCase):
+    def setUp(self):
+        super(GatherTestCase, self).setUp()
+        utils.register_vnc_api_options()
+        self.running = 0
+        self.max_running = 0
+
+    def _set_limit(self, limit):
+        cfg.CONF.set_override('max_concurrent_requests', limit, 'APISERVER')
+        self.addCleanup(cfg.CONF.clear_override, 'max_concurrent_requests',
+                        'APISERVER')
+
+    def _request(self, value, delay=0.01, error=None):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            eventlet.sleep(delay)
+            if error:
+                raise error
+            return value
+        finally:
+            self.running -= 1
+
+    def test_results_are_returned_in_order(self):
+        results = concurrent_requests.gather(
+            functools.partial(self._request, 'first', delay=0.03),
+            functools.partial(self._request, 'second', delay=0.01),
+            functools.partial(self._request, 'third', delay=0.02))
+
+        self.assertEqual(['first', 'second', 'third'], results)
+        self.assertEqual(3, self.max_running)
+
+    def test_concurrency_is_limited(self):
+        self._set_limit(2)
+
+        results = concurrent_requests.gather(*[
+            functools.partial(self._request, i) for i in range(5)])
+
+        self.assertEqual(list(range(5)), results)
+        self.assertEqual(2, self.max_running)
+
+    def test_first_error_is_raised_after_all_calls(self):
+        calls = [functools.partial(self._request, 'first'),
+                 functools.partial(self._request, 'second',
+                                   error=KeyError('second')),
+                 functools.partial(self._request, 'third',
+                                   error=ValueError('third'))]
+
+        self.assertRaises(KeyError, concurrent_requests.gather, *calls)
+        self.assertEqual(0, self.running)
+
+    def test_errors_are_returned(self):
+        error = KeyError('second')
+
+        results = concurrent_requests.gather(
+            functools.partial(self._request, 'first'),
+            functools.partial(self._request, 'second', error=error),
+            return_exceptions=True)
+
+        self.assertEqual(['first', error], results)
+
+    def test_nothing_to_gather(self):
+        self.assertEqual([], concurrent_requests.gather())
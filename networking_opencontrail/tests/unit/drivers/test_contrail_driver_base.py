@@ -181,7 +181,9 @@ class NetworkTestCases(test_extensions_base.ExtensionTestCase):
 
         self.assertEqual(result, list)
         drv._list_resource.assert_called_with(self.RESOURCE_NAME, context,
-                                              None, None)
+                                              None, None, sorts=None,
+                                              limit=None, marker=None,
+                                              page_reverse=False)
 
     def test_get_networks_count(self):
         drv = self._get_drv()
@@ -435,11 +437,15 @@ class SecurityGroupTestCases(test_extensions_base.ExtensionTestCase):
         context = mock.Mock()
         drv._list_resource.return_value = list
 
-        result = drv.get_security_groups(context)
+        result = drv.get_security_groups(context, sorts=[('name', False)],
+                                         limit=10, marker='sg-1')
 
         self.assertEqual(result, list)
         drv._list_resource.assert_called_with(self.RESOURCE_NAME, context,
-                                              None, None)
+                                              None, None,
+                                              sorts=[('name', False)],
+                                              limit=10, marker='sg-1',
+                                              page_reverse=False)
 
     def test_get_security_groups_count(self):
         drv = self._get_drv()
@@ -521,7 +527,9 @@ class SecurityGroupRuleTestCases(test_extensions_base.ExtensionTestCase):
 
         self.assertEqual(result, list)
         drv._list_resource.assert_called_with(self.RESOURCE_NAME, context,
-                                              None, None)
+                                              None, None, sorts=None,
+                                              limit=None, marker=None,
+                                              page_reverse=False)
 
     def test_get_security_group_rules_count(self):
         drv = self._get_drv()
@@ -697,6 +705,22 @@ class PortTestCases(test_extensions_base.ExtensionTestCase):
         drv._create_resource.assert_called_with(self.RESOURCE_NAME, context,
                                                 port)
 
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_create_ports(self, config):
+        config.APISERVER.port_create_batch_size = 2
+        drv = self._get_drv()
+        created = self._get_port()['port']
+        error = exceptions.NeutronException()
+        drv.create_port = mock.Mock(side_effect=[created, error, created])
+        ports = [self._get_port(), self._get_port(), self._get_port()]
+        context = mock.Mock()
+
+        result = drv.create_ports(context, ports)
+
+        self.assertEqual([created, error, created], result)
+        drv.create_port.assert_has_calls(
+            [mock.call(context, port) for port in ports], any_order=True)
+
     def test_get_port(self):
         drv = self._get_drv()
         drv._get_resource = mock.Mock()
@@ -781,6 +805,58 @@ class PortTestCases(test_extensions_base.ExtensionTestCase):
         drv._update_resource.assert_called_with(self.RESOURCE_NAME, context,
                                                 port_id, port)
 
+    def test_update_port_without_fixed_ips_does_not_read_port(self):
+        drv = self._get_drv()
+        drv._update_resource = mock.Mock()
+        drv._get_port = mock.Mock()
+        port = self._get_port(host_id="mock123")
+        port_id = port['port']['id']
+        context = mock.Mock()
+
+        drv.update_port(context, port_id, port)
+
+        drv._get_port.assert_not_called()
+
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_update_port_fixed_ips_uses_original(self, config):
+        config.max_fixed_ips_per_port = 10
+        drv = self._get_drv()
+        drv._update_resource = mock.Mock()
+        drv._get_port = mock.Mock()
+        port = self._get_port(fixed_ips=[self._get_ip("192.168.0.1")])
+        port_id = port['port']['id']
+        original_ips = [self._get_ip(), self._get_ip("192.168.0.1")]
+        original = self._get_port(fixed_ips=original_ips)['port']
+        context = mock.Mock()
+
+        drv.update_port(context, port_id, port, original=original)
+
+        drv._get_port.assert_not_called()
+        self.assertEqual([self._get_ip("192.168.0.1")],
+                         port['port']['fixed_ips'])
+        self.assertEqual(2, len(original_ips))
+        drv._update_resource.assert_called_with(self.RESOURCE_NAME, context,
+                                                port_id, port)
+
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_update_port_fixed_ips_reads_port_if_original_differs(self,
+                                                                  config):
+        config.max_fixed_ips_per_port = 10
+        drv = self._get_drv()
+        drv._update_resource = mock.Mock()
+        drv._get_port = mock.Mock()
+        drv._get_port.return_value = self._get_port(
+            fixed_ips=[self._get_ip()])['port']
+        port = self._get_port(fixed_ips=[self._get_ip()])
+        port_id = port['port']['id']
+        original = {'id': 'other-port-id', 'network_id': 'net-id',
+                    'fixed_ips': []}
+        context = mock.Mock()
+
+        drv.update_port(context, port_id, port, original=original)
+
+        drv._get_port.assert_called_once_with(context, port_id)
+
     def test_get_ports(self):
         drv = self._get_drv()
         drv._list_resource = mock.Mock()
@@ -792,7 +868,9 @@ class PortTestCases(test_extensions_base.ExtensionTestCase):
 
         self.assertEqual(result, list)
         drv._list_resource.assert_called_with(self.RESOURCE_NAME, context,
-                                              None, None)
+                                              None, None, sorts=None,
+                                              limit=None, marker=None,
+                                              page_reverse=False)
 
     def test_get_ports_count(self):
         drv = self._get_drv()
@@ -13,16 +13,21 @@
 #    under the License.
 #
 
+import io
 import json
 import logging
 import mock
 import requests
+import zlib
 
 from neutron.tests.unit.extensions import base as test_extensions_base
 from neutron_lib.constants import ATTR_NOT_SPECIFIED
 from neutron_lib import exceptions
+from osprofiler import profiler
 
+from networking_opencontrail.common import metrics
 from networking_opencontrail.drivers import drv_opencontrail
+from networking_opencontrail.drivers import token_manager
 
 
 class ApiRequestsTestCases(test_extensions_base.ExtensionTestCase):
@@ -30,6 +35,8 @@ class ApiRequestsTestCases(test_extensions_base.ExtensionTestCase):
     def setUp(self):
         super(ApiRequestsTestCases, self).setUp()
         logging.disable(logging.CRITICAL)
+        token_manager.reset()
+        self.addCleanup(token_manager.reset)
 
     def tearDown(self):
         super(ApiRequestsTestCases, self).tearDown()
@@ -39,13 +46,54 @@ class ApiRequestsTestCases(test_extensions_base.ExtensionTestCase):
         config.APISERVER = mock.MagicMock(api_server_ip="localhost",
                                           use_ssl=False,
                                           cafile=None,
-                                          api_server_port="8082")
+                                          api_server_port="8082",
+                                          resource_cache_size=0,
+                                          list_page_size=0,
+                                          compression=False)
+        config.METRICS = mock.MagicMock(sink='none')
         config.auth_strategy = 'keystone'
-        config.keystone_authtoken = mock.MagicMock(cafile=None)
+        config.keystone_authtoken = mock.MagicMock(cafile=None,
+                                                   admin_token=None)
 
         return drv_opencontrail.OpenContrailDrivers()
 
-    @mock.patch("requests.post")
+    @mock.patch("requests.Session.post")
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("oslo_config.cfg.CONF.register_opts")
+    def test_request_api_server_propagates_trace(self, options, config,
+                                                 request):
+        driver = self._get_driver(options, config)
+        driver._apiinsecure = True
+        response = requests.Response()
+        response.status_code = requests.codes.ok
+        request.return_value = response
+        profiler.init('secret-key', base_id='base-id', parent_id='parent-id')
+        self.addCleanup(profiler.clean)
+
+        driver._request_api_server("/URL", headers={'X-AUTH-TOKEN': 'token'})
+
+        headers = request.call_args[1]['headers']
+        self.assertEqual('token', headers['X-AUTH-TOKEN'])
+        self.assertIn('X-Trace-Info', headers)
+        self.assertIn('X-Trace-HMAC', headers)
+
+    @mock.patch("requests.Session.post")
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("oslo_config.cfg.CONF.register_opts")
+    def test_request_api_server_without_trace(self, options, config,
+                                              request):
+        driver = self._get_driver(options, config)
+        driver._apiinsecure = True
+        response = requests.Response()
+        response.status_code = requests.codes.ok
+        request.return_value = response
+
+        driver._request_api_server("/URL")
+
+        request.assert_called_with("/URL", data=None, headers=None,
+                                   verify=False)
+
+    @mock.patch("requests.Session.post")
     @mock.patch("oslo_config.cfg.CONF")
     @mock.patch("oslo_config.cfg.CONF.register_opts")
     def test_request_api_server_authorized(self, options, config, request):
@@ -63,7 +111,7 @@ class ApiRequestsTestCases(test_extensions_base.ExtensionTestCase):
         request.assert_called_with(url, data=None, headers=mock.ANY,
                                    verify=False)
 
-    @mock.patch("requests.post")
+    @mock.patch("requests.Session.post")
     @mock.patch("oslo_config.cfg.CONF")
     @mock.patch("oslo_config.cfg.CONF.register_opts")
     def test_request_api_server_auth_failed(self, options, config, request):
@@ -78,7 +126,7 @@ class ApiRequestsTestCases(test_extensions_base.ExtensionTestCase):
         self.assertRaises(RuntimeError, driver._request_api_server, url)
 
     @mock.patch("requests.Response.text", new_callable=mock.PropertyMock)
-    @mock.patch("requests.post")
+    @mock.patch("requests.Session.post")
     @mock.patch("oslo_config.cfg.CONF")
     @mock.patch("oslo_config.cfg.CONF.register_opts")
     def test_request_api_server_auth_recover(self, options, config, request,
@@ -106,7 +154,56 @@ class ApiRequestsTestCases(test_extensions_base.ExtensionTestCase):
         request.assert_called_with('/URL', data=None,
                                    headers={'X-AUTH-TOKEN': token})
 
-    @mock.patch("requests.post")
+    @mock.patch("requests.Session.post")
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("oslo_config.cfg.CONF.register_opts")
+    def test_request_api_server_reuses_refreshed_token(self, options, config,
+                                                       request):
+        driver = self._get_driver(options, config)
+        driver._apiinsecure = False
+        driver._use_api_certs = False
+        token_manager.set_initial_token('refreshed-token')
+        response_bad = requests.Response()
+        response_bad.status_code = requests.codes.unauthorized
+        response_good = requests.Response()
+        response_good.status_code = requests.codes.ok
+        request.side_effect = [response_bad, response_good]
+
+        driver._request_api_server('/URL',
+                                   headers={'X-AUTH-TOKEN': 'stale-token'})
+
+        self.assertEqual(2, request.call_count)
+        request.assert_called_with('/URL', data=None,
+                                   headers={'X-AUTH-TOKEN': 'refreshed-token'})
+
+    @mock.patch("requests.Session.post")
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("oslo_config.cfg.CONF.register_opts")
+    def test_request_api_server_closes_rejected_stream(self, options, config,
+                                                       request):
+        driver = self._get_driver(options, config)
+        driver._apiinsecure = False
+        driver._use_api_certs = False
+        token_manager.set_initial_token('refreshed-token')
+        response_bad = requests.Response()
+        response_bad.status_code = requests.codes.unauthorized
+        response_bad.raw = mock.Mock()
+        response_good = requests.Response()
+        response_good.status_code = requests.codes.ok
+        response_good.raw = mock.Mock()
+        request.side_effect = [response_bad, response_good]
+
+        response = driver._request_api_server(
+            '/URL', headers={'X-AUTH-TOKEN': 'stale-token'}, stream=True)
+
+        self.assertEqual(response_good, response)
+        response_bad.raw.close.assert_called_once_with()
+        response_good.raw.close.assert_not_called()
+        request.assert_called_with('/URL', data=None,
+                                   headers={'X-AUTH-TOKEN': 'refreshed-token'},
+                                   stream=True)
+
+    @mock.patch("requests.Session.post")
     @mock.patch("oslo_config.cfg.CONF")
     @mock.patch("oslo_config.cfg.CONF.register_opts")
     def test_request_api_server_authn(self, options, config, request):
@@ -139,7 +236,28 @@ class ApiRequestsTestCases(test_extensions_base.ExtensionTestCase):
         url = "API://localhost:8082/URL"
         driver._request_api_server_authn.assert_called_with(url,
                                                             data=None,
-                                                            headers=mock.ANY)
+                                                            headers=mock.ANY,
+                                                            stream=False)
+
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("oslo_config.cfg.CONF.register_opts")
+    def test_relay_request_compressed(self, options, config):
+        driver = self._get_driver(options, config)
+        config.APISERVER.compression = True
+        config.APISERVER.compression_threshold = 10
+        driver._request_api_server_authn = mock.MagicMock()
+
+        driver._relay_request("/URL", data='{"id": "port-1"}')
+        driver._relay_request("/URL", data='{}')
+
+        (large, small) = driver._request_api_server_authn.call_args_list
+        self.assertEqual(b'{"id": "port-1"}',
+                         zlib.decompress(large[1]['data'],
+                                         16 + zlib.MAX_WBITS))
+        self.assertEqual({'Content-type': 'application/json',
+                          'Content-Encoding': 'gzip'}, large[1]['headers'])
+        self.assertEqual('{}', small[1]['data'])
+        self.assertNotIn('Content-Encoding', small[1]['headers'])
 
     @mock.patch("oslo_config.cfg.CONF")
     @mock.patch("oslo_config.cfg.CONF.register_opts")
@@ -162,6 +280,32 @@ class ApiRequestsTestCases(test_extensions_base.ExtensionTestCase):
         self.assertEqual({'message': None}, message)
         driver._relay_request.assert_called()
 
+    @mock.patch("networking_opencontrail.drivers.drv_opencontrail.timeutils")
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("oslo_config.cfg.CONF.register_opts")
+    def test_request_backend_records_metrics(self, options, config,
+                                             timeutils):
+        driver = self._get_driver(options, config)
+        config.METRICS.sink = 'memory'
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        timeutils.now.side_effect = [100.0, 100.25]
+        response = requests.Response()
+        response.status_code = requests.codes.ok
+        response._content = b'{"id": "port-1"}'
+        response.retries = 1
+        driver._relay_request = mock.MagicMock(return_value=response)
+
+        driver._request_backend(mock.MagicMock(), {}, 'port', 'CREATE')
+
+        stats = metrics.snapshot()[('port', 'CREATE')]
+        self.assertEqual(1, stats['count'])
+        self.assertEqual(0.25, stats['duration_sum'])
+        self.assertEqual(16, stats['response_bytes'])
+        self.assertGreater(stats['request_bytes'], 0)
+        self.assertEqual(1, stats['retries'])
+        self.assertEqual({'200': 1}, dict(stats['statuses']))
+
     @mock.patch("oslo_config.cfg.CONF")
     @mock.patch("oslo_config.cfg.CONF.register_opts")
     def test_encode_resource(self, options, config):
@@ -203,6 +347,19 @@ class ApiRequestsTestCases(test_extensions_base.ExtensionTestCase):
 
         self.assertEqual(info, result)
 
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("oslo_config.cfg.CONF.register_opts")
+    def test_transform_response_projected_by_server(self, options, config):
+        driver = self._get_driver(options, config)
+        code = requests.codes.ok
+        projected = {'id': 'port-1'}
+        info = [projected, {'id': 'port-2', 'name': 'port'}]
+
+        result = driver._transform_response(code, info, fields=['id'])
+
+        self.assertIs(projected, result[0])
+        self.assertEqual([{'id': 'port-1'}, {'id': 'port-2'}], result)
+
     @mock.patch("oslo_config.cfg.CONF")
     @mock.patch("oslo_config.cfg.CONF.register_opts")
     def test_transform_response_error(self, options, config):
@@ -231,9 +388,14 @@ class ApiCrudTestCases(test_extensions_base.ExtensionTestCase):
         config.APISERVER = mock.MagicMock(api_server_ip="localhost",
                                           use_ssl=False,
                                           cafile=None,
-                                          api_server_port="8082")
+                                          api_server_port="8082",
+                                          resource_cache_size=0,
+                                          list_page_size=0,
+                                          compression=False)
+        config.METRICS = mock.MagicMock(sink='none')
         config.auth_strategy = 'keystone'
-        config.keystone_authtoken = mock.MagicMock(cafile=None)
+        config.keystone_authtoken = mock.MagicMock(cafile=None,
+                                                   admin_token=None)
 
         return drv_opencontrail.OpenContrailDrivers()
 
@@ -338,6 +500,134 @@ class ApiCrudTestCases(test_extensions_base.ExtensionTestCase):
         driver._request_backend.assert_called_with(context, mock.ANY,
                                                    res_type, 'READALL')
 
+    @staticmethod
+    def _make_list_response(resources):
+        response = requests.Response()
+        response.status_code = requests.codes.ok
+        response.raw = io.BytesIO(json.dumps(resources).encode('utf-8'))
+        return response
+
+    @staticmethod
+    def _get_requested_pages(relay_request):
+        return [json.loads(call[1]['data'])['data']
+                for call in relay_request.call_args_list]
+
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("oslo_config.cfg.CONF.register_opts")
+    def test_list_resource_in_pages(self, options, config):
+        driver = self._get_driver(options, config)
+        config.APISERVER.list_page_size = 2
+        driver._relay_request = mock.MagicMock(side_effect=[
+            self._make_list_response([{'id': 'port-1', 'name': 'a'},
+                                      {'id': 'port-2', 'name': 'b'}]),
+            self._make_list_response([{'id': 'port-3', 'name': 'c'}])])
+
+        response = driver._list_resource('port', mock.MagicMock(), None,
+                                         ['name'])
+
+        self.assertEqual([{'name': 'a'}, {'name': 'b'}, {'name': 'c'}],
+                         response)
+        pages = self._get_requested_pages(driver._relay_request)
+        self.assertEqual([None, 'port-2'], [page['marker'] for page in pages])
+        self.assertEqual([2, 2], [page['limit'] for page in pages])
+        self.assertEqual(['name', 'id'], pages[0]['fields'])
+        self.assertEqual([['id', True]], pages[0]['sorts'])
+        driver._relay_request.assert_called_with(mock.ANY, data=mock.ANY,
+                                                 stream=True)
+
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("oslo_config.cfg.CONF.register_opts")
+    def test_list_resource_with_limit_and_marker(self, options, config):
+        driver = self._get_driver(options, config)
+        driver._relay_request = mock.MagicMock(return_value=(
+            self._make_list_response([{'id': 'sg-2'}])))
+
+        response = driver.get_security_groups(
+            mock.MagicMock(), sorts=[('name', False)], limit=1,
+            marker='sg-1')
+
+        self.assertEqual([{'id': 'sg-2'}], response)
+        page, = self._get_requested_pages(driver._relay_request)
+        self.assertEqual(1, page['limit'])
+        self.assertEqual('sg-1', page['marker'])
+        self.assertEqual([['name', False], ['id', True]], page['sorts'])
+
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("oslo_config.cfg.CONF.register_opts")
+    def test_list_resource_not_paginated_by_server(self, options, config):
+        driver = self._get_driver(options, config)
+        config.APISERVER.list_page_size = 2
+        resources = [{'id': 'port-%d' % index} for index in range(3)]
+        driver._relay_request = mock.MagicMock(return_value=(
+            self._make_list_response(resources)))
+
+        response = driver._list_resource('port', mock.MagicMock(), None,
+                                         None)
+
+        self.assertEqual(resources, response)
+        self.assertEqual(1, driver._relay_request.call_count)
+
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("oslo_config.cfg.CONF.register_opts")
+    def test_list_resource_of_one_page_not_paginated_by_server(
+            self, options, config):
+        driver = self._get_driver(options, config)
+        config.APISERVER.list_page_size = 2
+        resources = [{'id': 'port-%d' % index} for index in range(2)]
+        driver._relay_request = mock.MagicMock(
+            side_effect=lambda *args, **kwargs: (
+                self._make_list_response(resources)))
+
+        response = driver._list_resource('port', mock.MagicMock(), None,
+                                         None)
+
+        self.assertEqual(resources, response)
+        self.assertEqual(2, driver._relay_request.call_count)
+
+    def _list_when_server_ignores_marker(self, driver, sorts):
+        resources = [{'id': 'sg-%d' % index, 'name': 'sg-%d' % index}
+                     for index in range(5)]
+
+        def relay_request(*args, **kwargs):
+            page = json.loads(kwargs['data'])['data']
+            return self._make_list_response(resources[:page['limit']])
+        driver._relay_request = mock.MagicMock(side_effect=relay_request)
+
+        response = driver.get_security_groups(mock.MagicMock(), sorts=sorts)
+
+        self.assertEqual(resources[:2], response)
+        self.assertEqual(2, driver._relay_request.call_count)
+
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("oslo_config.cfg.CONF.register_opts")
+    def test_list_resource_when_server_ignores_marker(self, options, config):
+        driver = self._get_driver(options, config)
+        config.APISERVER.list_page_size = 2
+
+        self._list_when_server_ignores_marker(driver, [('id', True)])
+
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("oslo_config.cfg.CONF.register_opts")
+    def test_list_resource_sorted_when_server_ignores_marker(self, options,
+                                                             config):
+        driver = self._get_driver(options, config)
+        config.APISERVER.list_page_size = 2
+
+        self._list_when_server_ignores_marker(driver, [('name', True)])
+
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("oslo_config.cfg.CONF.register_opts")
+    def test_iter_resources_error(self, options, config):
+        driver = self._get_driver(options, config)
+        response = requests.Response()
+        response.status_code = requests.codes.bad_request
+        response._content = b'{"exception": "BadRequest", "msg": "error"}'
+        driver._relay_request = mock.MagicMock(return_value=response)
+
+        resources = driver.iter_resources('port', mock.MagicMock())
+
+        self.assertRaises(exceptions.BadRequest, list, resources)
+
     @mock.patch("oslo_config.cfg.CONF")
     @mock.patch("oslo_config.cfg.CONF.register_opts")
     def test_count_resource(self, options, config):
@@ -394,3 +684,124 @@ class ApiCrudTestCases(test_extensions_base.ExtensionTestCase):
         self.assertEqual(response, res_data)
         driver._request_backend.assert_called_with(context, mock.ANY,
                                                    res_type, 'DELINTERFACE')
+
+
+class ResourceCacheTestCases(test_extensions_base.ExtensionTestCase):
+
+    def setUp(self):
+        super(ResourceCacheTestCases, self).setUp()
+        logging.disable(logging.CRITICAL)
+        drv_opencontrail.reset_resource_cache()
+        self.addCleanup(drv_opencontrail.reset_resource_cache)
+
+    def tearDown(self):
+        super(ResourceCacheTestCases, self).tearDown()
+        logging.disable(logging.NOTSET)
+
+    def _get_driver(self, options, config):
+        config.APISERVER = mock.MagicMock(api_server_ip="localhost",
+                                          use_ssl=False,
+                                          cafile=None,
+                                          api_server_port="8082",
+                                          resource_cache_size=10,
+                                          resource_cache_ttl=60)
+        config.auth_strategy = 'keystone'
+        config.keystone_authtoken = mock.MagicMock(cafile=None,
+                                                   admin_token=None)
+
+        driver = drv_opencontrail.OpenContrailDrivers()
+        driver._request_backend = mock.MagicMock()
+        driver._request_backend.return_value = (requests.codes.ok,
+                                                {'id': 'network-123'})
+        return driver
+
+    def _get_context(self, user_id='user', tenant_id='tenant'):
+        return mock.Mock(user_id=user_id, tenant_id=tenant_id,
+                         is_admin=False)
+
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("oslo_config.cfg.CONF.register_opts")
+    def test_resource_is_read_once(self, options, config):
+        driver = self._get_driver(options, config)
+        context = self._get_context()
+
+        first = driver._get_resource('network', context, 'network-123', None)
+        first['name'] = 'modified by caller'
+        second = driver._get_resource('network', context, 'network-123',
+                                      None)
+
+        self.assertEqual({'id': 'network-123'}, second)
+        self.assertEqual(1, driver._request_backend.call_count)
+        cache_stats = drv_opencontrail.get_resource_cache().stats
+        self.assertEqual(1, cache_stats['hits'])
+        self.assertEqual(1, cache_stats['misses'])
+
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("oslo_config.cfg.CONF.register_opts")
+    def test_resource_is_cached_per_fields_and_user(self, options, config):
+        driver = self._get_driver(options, config)
+
+        driver._get_resource('network', self._get_context(), 'network-123',
+                             None)
+        driver._get_resource('network', self._get_context(), 'network-123',
+                             ['id'])
+        driver._get_resource('network', self._get_context('other'),
+                             'network-123', None)
+
+        self.assertEqual(3, driver._request_backend.call_count)
+
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("oslo_config.cfg.CONF.register_opts")
+    def test_update_invalidates_resource(self, options, config):
+        driver = self._get_driver(options, config)
+        context = self._get_context()
+        driver._get_resource('network', context, 'network-123', None)
+
+        driver._update_resource('network', context, 'network-123',
+                                {'network': {'name': 'new'}})
+        driver._get_resource('network', context, 'network-123', None)
+
+        self.assertEqual(3, driver._request_backend.call_count)
+
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("oslo_config.cfg.CONF.register_opts")
+    def test_failed_delete_invalidates_resource(self, options, config):
+        driver = self._get_driver(options, config)
+        context = self._get_context()
+        driver._get_resource('network', context, 'network-123', None)
+        driver._request_backend.side_effect = [
+            requests.exceptions.Timeout(),
+            (requests.codes.ok, {'id': 'network-123'})]
+
+        self.assertRaises(requests.exceptions.Timeout,
+                          driver._delete_resource, 'network', context,
+                          'network-123')
+        driver._get_resource('network', context, 'network-123', None)
+
+        self.assertEqual(3, driver._request_backend.call_count)
+
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("oslo_config.cfg.CONF.register_opts")
+    def test_subnet_change_invalidates_networks(self, options, config):
+        driver = self._get_driver(options, config)
+        context = self._get_context()
+        driver._get_resource('network', context, 'network-123', None)
+
+        driver._create_resource('subnet', context,
+                                {'subnet': {'network_id': 'network-123'}})
+        driver._get_resource('network', context, 'network-123', None)
+
+        self.assertEqual(3, driver._request_backend.call_count)
+
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("oslo_config.cfg.CONF.register_opts")
+    def test_cache_disabled(self, options, config):
+        driver = self._get_driver(options, config)
+        config.APISERVER.resource_cache_size = 0
+        context = self._get_context()
+
+        driver._get_resource('network', context, 'network-123', None)
+        driver._get_resource('network', context, 'network-123', None)
+
+        self.assertEqual(2, driver._request_backend.call_count)
+        self.assertIsNone(drv_opencontrail.get_resource_cache())
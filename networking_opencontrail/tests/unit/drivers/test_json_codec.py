@@ -0,0 +1,90 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import mock
+from oslo_config import cfg
+
+from networking_opencontrail.common import utils
+from networking_opencontrail.drivers import json_codec
+from networking_opencontrail.tests import base
+
+
+class StdlibCodecTestCase(base.TestCase):
+    def setUp(self):
+        super(StdlibCodecTestCase, self).setUp()
+        self.codec = json_codec.StdlibCodec()
+
+    def test_body_is_decoded_from_bytes(self):
+        body = u'{"name": "pórt", "fixed_ips": []}'.encode('utf-8')
+
+        self.assertEqual({'name': u'pórt', 'fixed_ips': []},
+                         self.codec.loads(body))
+
+    def test_empty_body_is_invalid(self):
+        self.assertRaises(ValueError, self.codec.loads, None)
+        self.assertRaises(ValueError, self.codec.loads, b'<html>')
+
+
+class OrjsonCodecTestCase(base.TestCase):
+    def setUp(self):
+        super(OrjsonCodecTestCase, self).setUp()
+        self.orjson = mock.patch(
+            "networking_opencontrail.drivers.json_codec.orjson").start()
+        self.addCleanup(mock.patch.stopall)
+        self.codec = json_codec.OrjsonCodec()
+
+    def test_body_is_encoded_to_bytes(self):
+        self.orjson.dumps.return_value = b'{"id": "port-1"}'
+
+        body = self.codec.dumps({'id': 'port-1'})
+
+        self.assertEqual(b'{"id": "port-1"}', body)
+
+    def test_unsupported_object_is_encoded_by_stdlib(self):
+        self.orjson.dumps.side_effect = TypeError()
+
+        body = self.codec.dumps({'count': 2 ** 64})
+
+        self.assertEqual('{"count": 18446744073709551616}', body)
+
+
+class GetCodecTestCase(base.TestCase):
+    def setUp(self):
+        super(GetCodecTestCase, self).setUp()
+        utils.register_vnc_api_options()
+        json_codec.reset()
+        self.addCleanup(json_codec.reset)
+
+    def _set_codec(self, name):
+        cfg.CONF.set_override('json_codec', name, 'APISERVER')
+        self.addCleanup(cfg.CONF.clear_override, 'json_codec', 'APISERVER')
+
+    @mock.patch.dict(json_codec.CODECS, {'orjson': json_codec.OrjsonCodec})
+    def test_fast_codec_is_used_when_installed(self):
+        self.assertIsInstance(json_codec.get_codec(), json_codec.OrjsonCodec)
+
+    @mock.patch.dict(json_codec.CODECS, clear=True,
+                     values={'json': json_codec.StdlibCodec})
+    def test_stdlib_is_used_when_fast_codec_is_missing(self):
+        self._set_codec('orjson')
+
+        self.assertIsInstance(json_codec.get_codec(), json_codec.StdlibCodec)
+
+    def test_codec_is_shared(self):
+        self._set_codec('json')
+
+        self.assertIs(json_codec.get_codec(), json_codec.get_codec())
+        self.assertEqual({'id': 'port-1'},
+                         json_codec.loads(json_codec.dumps({'id': 'port-1'})))
@@ -0,0 +1,52 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import json
+
+from networking_opencontrail.drivers import json_stream
+from networking_opencontrail.tests import base
+
+
+class IterListTestCase(base.TestCase):
+    ITEMS = [{'id': 'port-1', 'name': u'pórt', 'fixed_ips': []},
+             12345, 'text', [1, 2.5], None]
+
+    @staticmethod
+    def _split(body, size):
+        return [body[i:i + size] for i in range(0, len(body), size)]
+
+    def test_items_split_between_chunks_are_decoded(self):
+        body = json.dumps(self.ITEMS, ensure_ascii=False).encode('utf-8')
+
+        for size in (1, 2, 3, 7, len(body)):
+            self.assertEqual(
+                self.ITEMS,
+                list(json_stream.iter_list(self._split(body, size))))
+
+    def test_items_are_yielded_before_end_of_body(self):
+        chunks = iter([b'[{"id": "port-1"}, ', b'{"id": "port-2"}]'])
+
+        items = json_stream.iter_list(chunks)
+
+        self.assertEqual({'id': 'port-1'}, next(items))
+        self.assertEqual([b'{"id": "port-2"}]'], list(chunks))
+
+    def test_empty_list(self):
+        self.assertEqual([], list(json_stream.iter_list([b' [ ', b'] '])))
+
+    def test_invalid_body(self):
+        for body in (b'', b'{}', b'[1 2]', b'[{"id": '):
+            self.assertRaises(ValueError, list,
+                              json_stream.iter_list([body]))
@@ -0,0 +1,194 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import mock
+import requests
+
+from networking_opencontrail.drivers import circuit_breaker
+from networking_opencontrail.drivers import session_pool
+from networking_opencontrail.tests import base
+
+
+class SessionPoolTestCase(base.TestCase):
+    @mock.patch("oslo_config.cfg.CONF")
+    def setUp(self, config):
+        super(SessionPoolTestCase, self).setUp()
+        self.pool = session_pool.SessionPool()
+        self.addCleanup(self.pool.reset)
+
+    def _configure(self, config, maxsize=10, block=False):
+        config.APISERVER = mock.MagicMock(http_pool_connections=4,
+                                          http_pool_maxsize=maxsize,
+                                          http_pool_block=block,
+                                          connect_timeout=5.0,
+                                          circuit_breaker_threshold=2,
+                                          circuit_breaker_reset_timeout=30.0)
+
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_session_is_reused(self, config):
+        self._configure(config)
+
+        first = self.pool.get_session()
+        second = self.pool.get_session()
+
+        self.assertIs(first, second)
+
+    @mock.patch("os.getpid")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_session_is_recreated_after_fork(self, config, getpid):
+        self._configure(config)
+        getpid.return_value = 100
+        parent_session = self.pool.get_session()
+
+        getpid.return_value = 101
+        child_session = self.pool.get_session()
+
+        self.assertIsNot(parent_session, child_session)
+
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_adapter_uses_configured_pool_size(self, config):
+        self._configure(config, maxsize=25, block=True)
+
+        session = self.pool.get_session()
+
+        for prefix in ('http://', 'https://'):
+            adapter = session.get_adapter(prefix + 'localhost')
+            self.assertEqual(25, adapter._pool_maxsize)
+            self.assertTrue(adapter._pool_block)
+
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_stats_report_pools_per_host(self, config):
+        self._configure(config, maxsize=5)
+        session = self.pool.get_session()
+        adapter = session.get_adapter('http://localhost')
+        adapter.poolmanager.connection_from_url('http://10.0.0.1:8082')
+
+        stats = self.pool.get_stats()
+
+        self.assertEqual({'http://10.0.0.1:8082': {'connections_created': 0,
+                                                   'requests': 0,
+                                                   'idle_connections': 0,
+                                                   'maxsize': 5}},
+                         stats)
+
+    def test_stats_are_empty_before_first_request(self):
+        self.assertEqual({}, self.pool.get_stats())
+
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_stats_report_circuit_state(self, config):
+        self._configure(config)
+        adapter = self.pool.get_session().get_adapter('http://localhost')
+        adapter.get_breaker('http://10.0.0.1:8082/ports')
+
+        stats = self.pool.get_stats()
+
+        self.assertEqual({'http://10.0.0.1:8082': {'circuit': 'closed'}},
+                         stats)
+
+
+@mock.patch("requests.adapters.HTTPAdapter.send")
+class HTTPAdapterTestCase(base.TestCase):
+    def setUp(self):
+        super(HTTPAdapterTestCase, self).setUp()
+        mock.patch(
+            "networking_opencontrail.drivers.circuit_breaker.metrics").start()
+        self.addCleanup(mock.patch.stopall)
+        self.adapter = session_pool.HTTPAdapter(
+            connect_timeout=5.0, failure_threshold=2, reset_timeout=30.0)
+        self.request = requests.Request(
+            'POST', 'http://10.0.0.1:8082/neutron/port').prepare()
+
+    @staticmethod
+    def _response(status_code):
+        response = requests.Response()
+        response.status_code = status_code
+        return response
+
+    def test_connect_timeout_is_applied(self, send):
+        self.adapter.send(self.request)
+        self.adapter.send(self.request, timeout=60)
+
+        self.assertEqual(
+            [mock.call(self.request, timeout=(5.0, None)),
+             mock.call(self.request, timeout=60)],
+            send.call_args_list)
+
+    def test_unavailable_endpoint_fails_immediately(self, send):
+        send.side_effect = requests.exceptions.ConnectionError()
+        for _ in range(2):
+            self.assertRaises(requests.exceptions.ConnectionError,
+                              self.adapter.send, self.request)
+
+        self.assertRaises(circuit_breaker.CircuitOpenError,
+                          self.adapter.send, self.request)
+        self.assertEqual(2, send.call_count)
+
+    def test_gateway_errors_are_failures(self, send):
+        send.return_value = self._response(503)
+        self.adapter.send(self.request)
+        send.return_value = self._response(404)
+        self.adapter.send(self.request)
+        send.return_value = self._response(502)
+        self.adapter.send(self.request)
+
+        self.assertEqual(circuit_breaker.CLOSED,
+                         self.adapter.get_breaker(self.request.url).state)
+
+        send.return_value = self._response(504)
+        self.adapter.send(self.request)
+
+        self.assertEqual(circuit_breaker.OPEN,
+                         self.adapter.get_breaker(self.request.url).state)
+
+    @mock.patch("networking_opencontrail.drivers.circuit_breaker.timeutils")
+    def test_probe_is_released_on_other_errors(self, timeutils, send):
+        timeutils.now.return_value = 100
+        send.side_effect = requests.exceptions.ConnectionError()
+        for _ in range(2):
+            self.assertRaises(requests.exceptions.ConnectionError,
+                              self.adapter.send, self.request)
+        timeutils.now.return_value = 130
+        send.side_effect = ValueError()
+        self.assertRaises(ValueError, self.adapter.send, self.request)
+        send.side_effect = None
+        send.return_value = self._response(200)
+
+        self.adapter.send(self.request)
+
+        self.assertEqual(circuit_breaker.CLOSED,
+                         self.adapter.get_breaker(self.request.url).state)
+
+    def test_endpoints_have_separate_circuits(self, send):
+        send.side_effect = requests.exceptions.ConnectionError()
+        for _ in range(2):
+            self.assertRaises(requests.exceptions.ConnectionError,
+                              self.adapter.send, self.request)
+        send.side_effect = None
+        keystone = requests.Request(
+            'POST', 'http://10.0.0.2:5000/v3/auth/tokens').prepare()
+
+        self.adapter.send(keystone)
+
+        self.assertEqual(3, send.call_count)
+
+    def test_disabled_circuit_breaker_sends_requests(self, send):
+        adapter = session_pool.HTTPAdapter(failure_threshold=0)
+        send.side_effect = requests.exceptions.ConnectionError()
+        for _ in range(3):
+            self.assertRaises(requests.exceptions.ConnectionError,
+                              adapter.send, self.request)
+
+        self.assertEqual(3, send.call_count)
+        self.assertEqual({}, adapter.breakers)
@@ -0,0 +1,111 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import datetime
+import logging
+import mock
+
+from oslo_config import cfg
+from oslo_utils import timeutils
+
+from networking_opencontrail.common import utils
+from networking_opencontrail.drivers import token_manager
+from networking_opencontrail.tests import base
+
+
+class TokenManagerTestCase(base.TestCase):
+    def setUp(self):
+        super(TokenManagerTestCase, self).setUp()
+        logging.disable(logging.CRITICAL)
+        utils.register_vnc_api_options()
+        self.manager = token_manager.TokenManager()
+        self.fetch = mock.Mock(return_value=('new-token', None))
+
+    def tearDown(self):
+        super(TokenManagerTestCase, self).tearDown()
+        logging.disable(logging.NOTSET)
+
+    @staticmethod
+    def _expires_in(seconds):
+        expires = timeutils.utcnow() + datetime.timedelta(seconds=seconds)
+        return expires.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    def test_first_refresh_fetches_token(self):
+        token = self.manager.refresh(self.fetch)
+
+        self.assertEqual('new-token', token)
+        self.assertEqual('new-token', self.manager.get_token())
+        self.fetch.assert_called_once_with()
+
+    def test_stale_token_is_refreshed_once(self):
+        self.manager.set_initial_token('old-token')
+
+        first = self.manager.refresh(self.fetch, 'old-token')
+        second = self.manager.refresh(self.fetch, 'old-token')
+
+        self.assertEqual('new-token', first)
+        self.assertEqual('new-token', second)
+        self.fetch.assert_called_once_with()
+
+    def test_rejected_current_token_is_refreshed(self):
+        self.fetch.side_effect = [('token-1', None), ('token-2', None)]
+        self.manager.refresh(self.fetch)
+
+        token = self.manager.refresh(self.fetch, 'token-1')
+
+        self.assertEqual('token-2', token)
+
+    def test_initial_token_does_not_replace_fetched_one(self):
+        self.manager.refresh(self.fetch)
+
+        self.manager.set_initial_token('admin-token')
+
+        self.assertEqual('new-token', self.manager.get_token())
+
+    @mock.patch("networking_opencontrail.drivers.token_manager.eventlet")
+    def test_token_is_refreshed_before_expiration(self, eventlet):
+        self.fetch.return_value = ('new-token', self._expires_in(30))
+        self.manager.refresh(self.fetch)
+
+        self.assertEqual('new-token', self.manager.get_token(self.fetch))
+        self.manager.get_token(self.fetch)
+
+        eventlet.spawn_n.assert_called_once_with(
+            self.manager._refresh_in_background, self.fetch, 'new-token')
+
+    @mock.patch("networking_opencontrail.drivers.token_manager.eventlet")
+    def test_token_far_from_expiration_is_not_refreshed(self, eventlet):
+        self.fetch.return_value = ('new-token', self._expires_in(3600))
+        self.manager.refresh(self.fetch)
+
+        self.manager.get_token(self.fetch)
+
+        eventlet.spawn_n.assert_not_called()
+
+    @mock.patch("networking_opencontrail.drivers.token_manager.eventlet")
+    def test_failed_background_refresh_is_not_repeated(self, eventlet):
+        cfg.CONF.set_override('auth_token_refresh_margin', 60, 'APISERVER')
+        self.addCleanup(cfg.CONF.clear_override,
+                        'auth_token_refresh_margin', 'APISERVER')
+        self.fetch.return_value = ('new-token', self._expires_in(30))
+        self.manager.refresh(self.fetch)
+        self.fetch.side_effect = RuntimeError()
+
+        self.manager.get_token(self.fetch)
+        self.manager._refresh_in_background(self.fetch, 'new-token')
+        self.manager.get_token(self.fetch)
+
+        self.assertEqual(1, eventlet.spawn_n.call_count)
+        self.assertEqual('new-token', self.manager.get_token())
@@ -173,6 +173,19 @@ class VncApiDriverTestCase(base.TestCase):
 
         self.vnc_api.virtual_port_group_update.assert_called_with(vpg)
 
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_change_listeners_are_notified(self, cfg):
+        listener = mock.Mock()
+        self.driver.add_change_listener(listener)
+
+        vpg = mock.Mock()
+
+        self.driver.create_virtual_machine_interface(mock.Mock())
+        self.driver.delete_virtual_machine_interface(["name"])
+        self.driver.update_virtual_port_group(vpg)
+
+        listener.assert_called_once_with("virtual_port_group", "update", vpg)
+
     @mock.patch("oslo_config.cfg.CONF")
     def test_update_virtual_port_group_no_raise_on_noiderror(self, cfg):
         vpg = mock.Mock()
@@ -0,0 +1,223 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import logging
+import mock
+
+from neutron.tests.unit import testlib_api
+from neutron_lib import context as n_context
+from oslo_config import cfg
+
+from networking_opencontrail.common import utils
+from networking_opencontrail.db import journal_db
+from networking_opencontrail.db import models
+from networking_opencontrail.journal import journal
+from networking_opencontrail.tests import base
+
+NETWORK_ID = '6f4b2e2c-8a4e-4f1d-9d55-06bd73b0f5f2'
+SUBNET_ID = '0a1d4c9b-6e2a-4a0d-8a0b-0b4b0a86f2e1'
+PORT_ID = 'd8a0a2f4-5a2c-4fd3-9e43-1e0a3e1c7b3a'
+
+
+class JournalTestCase(testlib_api.SqlTestCase):
+    def setUp(self):
+        super(JournalTestCase, self).setUp()
+        logging.disable(logging.CRITICAL)
+        utils.register_vnc_api_options()
+        cfg.CONF.set_override('max_retries', 2, 'JOURNAL')
+        self.addCleanup(cfg.CONF.clear_override, 'max_retries', 'JOURNAL')
+
+        self.context = n_context.get_admin_context()
+        self.handler = mock.Mock()
+        self.journal = journal.JournalThread(self.handler)
+        self.journal.start = mock.Mock()
+
+    def tearDown(self):
+        super(JournalTestCase, self).tearDown()
+        logging.disable(logging.NOTSET)
+
+    def _record(self, object_type, object_uuid, operation, resource):
+        self.journal.record(self.context, object_type, object_uuid,
+                            operation, {object_type: resource})
+
+    def _get_rows(self):
+        return self.context.session.query(models.OpenContrailJournal).all()
+
+    def _synced_operations(self):
+        return [(call[0][1], call[0][2])
+                for call in self.handler.call_args_list]
+
+    def test_record_stores_entry(self):
+        self._record('network', NETWORK_ID, 'create', {'id': NETWORK_ID})
+
+        rows = self._get_rows()
+        self.assertEqual(1, len(rows))
+        self.assertEqual(models.PENDING, rows[0].state)
+        self.assertEqual({'network': {'id': NETWORK_ID}},
+                         journal_db.get_row_data(rows[0]))
+        # Entry may not be committed yet
+        self.journal.start.assert_not_called()
+
+    def test_notify_starts_and_wakes_thread(self):
+        self.journal.notify()
+
+        self.journal.start.assert_called_once_with()
+        self.assertTrue(self.journal._sync_event.is_set())
+
+    def test_synced_entries_are_removed(self):
+        self._record('network', NETWORK_ID, 'create', {'id': NETWORK_ID})
+
+        self.journal.sync_pending_entries()
+
+        self.handler.assert_called_once_with(
+            mock.ANY, 'network', 'create',
+            {'network': {'id': NETWORK_ID}})
+        self.assertEqual([], self._get_rows())
+
+    def test_entry_is_synced_on_behalf_of_recording_request(self):
+        self.context = n_context.Context('user-1', 'tenant-1',
+                                         roles=['member'],
+                                         request_id='req-1')
+        self._record('network', NETWORK_ID, 'create', {'id': NETWORK_ID})
+
+        self.journal.sync_pending_entries()
+
+        context = self.handler.call_args[0][0]
+        self.assertEqual(('user-1', 'tenant-1', False, ['member'], 'req-1'),
+                         (context.user_id, context.project_id,
+                          context.is_admin, context.roles,
+                          context.request_id))
+
+    def test_entries_are_read_once_per_window(self):
+        for network_id in (NETWORK_ID, SUBNET_ID, PORT_ID):
+            self._record('network', network_id, 'create', {'id': network_id})
+
+        with mock.patch.object(journal_db, 'get_unfinished_rows',
+                               wraps=journal_db.get_unfinished_rows) as get:
+            self.journal.sync_pending_entries()
+
+        self.assertEqual(3, self.handler.call_count)
+        get.assert_called_once_with(mock.ANY, journal.UNFINISHED_ROWS_WINDOW)
+
+    def test_entries_are_synced_in_order(self):
+        self._record('network', NETWORK_ID, 'create', {'id': NETWORK_ID})
+        self._record('network', NETWORK_ID, 'update', {'id': NETWORK_ID})
+        self._record('network', NETWORK_ID, 'delete', {'id': NETWORK_ID})
+
+        self.journal.sync_pending_entries()
+
+        self.assertEqual([('network', 'create'), ('network', 'update'),
+                          ('network', 'delete')],
+                         self._synced_operations())
+
+    def test_failed_entry_blocks_dependent_entries(self):
+        self.handler.side_effect = [Exception(), None, None, None]
+        self._record('network', NETWORK_ID, 'create', {'id': NETWORK_ID})
+        self._record('subnet', SUBNET_ID, 'create',
+                     {'id': SUBNET_ID, 'network_id': NETWORK_ID})
+        self._record('port', PORT_ID, 'create',
+                     {'id': PORT_ID, 'network_id': NETWORK_ID,
+                      'fixed_ips': [{'subnet_id': SUBNET_ID}]})
+
+        self.journal.sync_pending_entries()
+
+        self.assertEqual([('network', 'create')], self._synced_operations())
+        self.assertEqual(3, len(self._get_rows()))
+
+        self.journal.sync_pending_entries()
+
+        self.assertEqual([('network', 'create'), ('network', 'create'),
+                          ('subnet', 'create'), ('port', 'create')],
+                         self._synced_operations())
+        self.assertEqual([], self._get_rows())
+
+    def test_delete_waits_for_dependent_entries(self):
+        self.handler.side_effect = [Exception(), None, None]
+        self._record('port', PORT_ID, 'delete',
+                     {'id': PORT_ID, 'network_id': NETWORK_ID})
+        self._record('network', NETWORK_ID, 'delete', {'id': NETWORK_ID})
+
+        self.journal.sync_pending_entries()
+
+        self.assertEqual([('port', 'delete')], self._synced_operations())
+
+    def test_independent_entries_are_not_blocked(self):
+        other_network = '8b8c7d6e-0000-4000-8000-000000000001'
+        self.handler.side_effect = [Exception(), None]
+        self._record('network', NETWORK_ID, 'create', {'id': NETWORK_ID})
+        self._record('network', other_network, 'create',
+                     {'id': other_network})
+
+        self.journal.sync_pending_entries()
+
+        self.assertEqual([('network', 'create'), ('network', 'create')],
+                         self._synced_operations())
+        self.assertEqual([NETWORK_ID],
+                         [row.object_uuid for row in self._get_rows()])
+
+    def test_entry_is_failed_after_max_retries(self):
+        self.handler.side_effect = Exception()
+        self._record('network', NETWORK_ID, 'create', {'id': NETWORK_ID})
+
+        self.journal.sync_pending_entries()
+        self.journal.sync_pending_entries()
+        self.journal.sync_pending_entries()
+
+        self.assertEqual(2, self.handler.call_count)
+        rows = self._get_rows()
+        self.assertEqual(models.FAILED, rows[0].state)
+        self.assertEqual(2, rows[0].retry_count)
+
+    def test_entry_locked_by_other_worker_is_skipped(self):
+        self._record('network', NETWORK_ID, 'create', {'id': NETWORK_ID})
+        row = self._get_rows()[0]
+        journal_db.lock_pending_row(self.context, row)
+
+        self.journal.sync_pending_entries()
+
+        self.handler.assert_not_called()
+
+    def test_stale_processing_entry_is_retried(self):
+        cfg.CONF.set_override('processing_timeout', 1, 'JOURNAL')
+        self.addCleanup(cfg.CONF.clear_override, 'processing_timeout',
+                        'JOURNAL')
+        self._record('network', NETWORK_ID, 'create', {'id': NETWORK_ID})
+        row = self._get_rows()[0]
+        journal_db.lock_pending_row(self.context, row)
+        self.context.session.query(models.OpenContrailJournal).update(
+            {'last_retried': row.created_at.replace(year=2000)})
+
+        self.journal.sync_pending_entries()
+
+        self.handler.assert_called_once_with(mock.ANY, 'network', 'create',
+                                             mock.ANY)
+
+
+class JournalDependenciesTestCase(base.TestCase):
+    def test_network_has_no_dependencies(self):
+        self.assertEqual(set(), journal.get_dependencies(
+            'network', {'network': {'id': NETWORK_ID}}))
+
+    def test_subnet_depends_on_network(self):
+        self.assertEqual({NETWORK_ID}, journal.get_dependencies(
+            'subnet', {'subnet': {'id': SUBNET_ID,
+                                  'network_id': NETWORK_ID}}))
+
+    def test_port_depends_on_network_and_subnets(self):
+        port = {'id': PORT_ID, 'network_id': NETWORK_ID,
+                'fixed_ips': [{'subnet_id': SUBNET_ID,
+                               'ip_address': '10.0.0.3'}]}
+        self.assertEqual({NETWORK_ID, SUBNET_ID},
+                         journal.get_dependencies('port', {'port': port}))
@@ -16,6 +16,8 @@
 import logging
 import mock
 
+from oslo_config import cfg
+
 from networking_opencontrail.l3 import snat_synchronizer
 
 from neutron.tests.unit.extensions import base as test_extensions_base
@@ -86,6 +88,55 @@ class SnatSynchronizerTestCases(test_extensions_base.ExtensionTestCase):
 
         self._assert_nothing_happened()
 
+    @mock.patch("networking_opencontrail.common.utils.detach_context")
+    @mock.patch("networking_opencontrail.l3.snat_synchronizer.eventlet")
+    def test_sync_in_background(self, eventlet, detach_context):
+        self._enable_async_sync()
+        self.tf_helper.get_snat_ips.return_value = ['10.10.10.10']
+        self.neutron_helper.get_snat_interfaces.return_value = []
+
+        self.snat_sync.sync_snat_interfaces(self.context,
+                                            self.router['id'],
+                                            self.router)
+        self._assert_nothing_happened()
+        eventlet.spawn_n.assert_called_once_with(
+            self.snat_sync._run_background_syncs, self.router['id'])
+        self.snat_sync._run_background_syncs(self.router['id'])
+
+        self.neutron_helper.create_snat_interface.assert_called_once_with(
+            detach_context.return_value,
+            self.router['external_gateway_info'],
+            self.router['id'],
+            '10.10.10.10')
+        detach_context.assert_called_once_with(self.context)
+
+    @mock.patch("networking_opencontrail.common.utils.detach_context")
+    @mock.patch("networking_opencontrail.l3.snat_synchronizer.eventlet")
+    def test_background_syncs_of_router_are_merged(self, eventlet,
+                                                   detach_context):
+        self._enable_async_sync()
+        self.tf_helper.get_snat_ips.return_value = []
+        self.neutron_helper.get_snat_interfaces.return_value = []
+        updated_router = dict(self.router, name='updated')
+
+        self.snat_sync.sync_snat_interfaces(self.context,
+                                            self.router['id'],
+                                            self.router)
+        self.snat_sync.sync_snat_interfaces(self.context,
+                                            self.router['id'],
+                                            updated_router)
+        self.snat_sync._run_background_syncs(self.router['id'])
+
+        eventlet.spawn_n.assert_called_once_with(
+            self.snat_sync._run_background_syncs, self.router['id'])
+        self.tf_helper.get_snat_ips.assert_called_once_with(
+            self.router['id'])
+
+    def _enable_async_sync(self):
+        cfg.CONF.set_override('snat_sync_async', True, 'APISERVER')
+        self.addCleanup(cfg.CONF.clear_override, 'snat_sync_async',
+                        'APISERVER')
+
     @mock.patch("networking_opencontrail.drivers.drv_opencontrail.cfg")
     def _get_snat_synchronizer(self, cfg):
         cfg.CONF.APISERVER.use_ssl = False
@@ -149,7 +200,8 @@ class NeutronSNATTestCases(test_extensions_base.ExtensionTestCase):
                                                         self.router_id)
 
         self.core_plugin.get_ports.assert_called_once_with(
-            self.context, filters=expected_filters)
+            self.context, filters=expected_filters,
+            fields=['id', 'fixed_ips'])
         self.assertEqual(ports, expected_ports)
 
     def test_delete_snate_interface(self):
@@ -188,6 +240,35 @@ class TungstenFabricSNATTestCases(test_extensions_base.ExtensionTestCase):
 
         self.assertEqual(['10.10.10.10'], snat_ips)
 
+    def test_get_snat_ips_requests_each_level_once(self):
+        self.tf_helper.get_snat_ips('9e824605-64b4-4f29-bbbb-4a537dea9f4c')
+
+        self.assertEqual([('get', 'logical-router'),
+                          ('get', 'service-instance'),
+                          ('list', 'virtual-machine'),
+                          ('list', 'virtual-machine-interface'),
+                          ('list', 'instance-ip')],
+                         self.rest_driver_mock.requests)
+
+    def test_list_resources_in_chunks(self):
+        self.tf_helper.rest_driver = mock.Mock()
+        self.tf_helper.rest_driver.list_resource.return_value = (
+            200, {'instance-ips': [{'instance-ip': {'uuid': 'iip'}}]})
+        uuids = ['iip-%03d' % i for i in range(
+            snat_synchronizer.LIST_CHUNK_SIZE + 1)]
+
+        resources = self.tf_helper._list_resources('instance-ip', uuids)
+
+        self.assertEqual([{'uuid': 'iip'}] * 2, resources)
+        self.tf_helper.rest_driver.list_resource.assert_has_calls([
+            mock.call('instance-ip', {
+                'obj_uuids': ','.join(
+                    uuids[:snat_synchronizer.LIST_CHUNK_SIZE]),
+                'detail': True}),
+            mock.call('instance-ip', {'obj_uuids': uuids[-1],
+                                      'detail': True}),
+        ], any_order=True)
+
     @mock.patch("retrying.time.sleep")
     def test_retry_get_snat_ips(self, _):
         self.rest_driver_mock.exceptions = [KeyError()]
@@ -197,8 +278,28 @@ class TungstenFabricSNATTestCases(test_extensions_base.ExtensionTestCase):
 
         self.assertEqual(['10.10.10.10'], snat_ips)
 
+    @mock.patch("retrying.time.sleep")
+    def test_retry_get_snat_ips_backs_off_exponentially(self, sleep):
+        cfg.CONF.set_override('snat_retry_attempts', 5, 'APISERVER')
+        cfg.CONF.set_override('snat_retry_max_delay', 0.3, 'APISERVER')
+        self.addCleanup(cfg.CONF.clear_override, 'snat_retry_attempts',
+                        'APISERVER')
+        self.addCleanup(cfg.CONF.clear_override, 'snat_retry_max_delay',
+                        'APISERVER')
+        self.rest_driver_mock.exceptions = [KeyError()] * 4
+
+        snat_ips = self.tf_helper.get_snat_ips(
+            '9e824605-64b4-4f29-bbbb-4a537dea9f4c')
+
+        self.assertEqual(['10.10.10.10'], snat_ips)
+        self.assertEqual([0.05, 0.1, 0.2, 0.3],
+                         [call[0][0] for call in sleep.call_args_list])
+
     @mock.patch("retrying.time.sleep")
     def test_max_attempt_get_snat_ips(self, _):
+        cfg.CONF.set_override('snat_retry_attempts', 3, 'APISERVER')
+        self.addCleanup(cfg.CONF.clear_override, 'snat_retry_attempts',
+                        'APISERVER')
         self.rest_driver_mock.exceptions = [KeyError()] * 4
 
         snat_ips = self.tf_helper.get_snat_ips(
@@ -235,8 +336,23 @@ class RestDriverMock(object):
         self.router_status_code = 200
         self.service_instance_name = 'snat_'
         self._exceptions = iter([])
+        self.requests = []
+
+    def list_resource(self, res_type, query):
+        self.requests.append(('list', res_type))
+        try:
+            raise next(self._exceptions)
+        except StopIteration:
+            pass
+        items = []
+        for res_id in query['obj_uuids'].split(','):
+            _, resource = self._get_resource(res_type, query, res_id)
+            if resource:
+                items.append(resource)
+        return self.router_status_code, {'%ss' % res_type: items}
 
     def get_resource(self, res_type, query, res_id):
+        self.requests.append(('get', res_type))
         if res_type != 'logical-router':
             try:
                 raise next(self._exceptions)
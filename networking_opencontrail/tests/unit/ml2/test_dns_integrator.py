@@ -49,7 +49,8 @@ class SubnetDNSCompatibilityIntegratorTestCase(testlib_api.SqlTestCase):
             'device_id': [subnet['id']],
             'device_owner': [subnet_dns_integrator.TF_DNS_DEVICE_OWNER]}
         expected_calls = [
-            mock.call.get_ports(context, filters=expected_filters),
+            mock.call.get_ports(context, filters=expected_filters,
+                                fields=['id', 'fixed_ips']),
             mock.call.create_port(context, {'port': dns_port})]
         self.core_plugin.assert_has_calls(expected_calls)
 
@@ -66,7 +67,8 @@ class SubnetDNSCompatibilityIntegratorTestCase(testlib_api.SqlTestCase):
             'device_id': [subnet['id']],
             'device_owner': [subnet_dns_integrator.TF_DNS_DEVICE_OWNER]}
         expected_calls = [
-            mock.call.get_ports(context, filters=expected_filters)]
+            mock.call.get_ports(context, filters=expected_filters,
+                                fields=['id', 'fixed_ips'])]
         self.core_plugin.assert_has_calls(expected_calls)
         self.core_plugin.create_port.assert_not_called()
 
@@ -94,7 +96,8 @@ class SubnetDNSCompatibilityIntegratorTestCase(testlib_api.SqlTestCase):
             'device_id': [payload.resource_id],
             'device_owner': [subnet_dns_integrator.TF_DNS_DEVICE_OWNER]}
         expected_calls = [
-            mock.call.get_ports(payload.context, filters=expected_filter),
+            mock.call.get_ports(payload.context, filters=expected_filter,
+                                fields=['id', 'fixed_ips']),
             mock.call.delete_port(payload.context, ports[0]['id'])]
         self.core_plugin.assert_has_calls(expected_calls)
 
@@ -111,7 +114,8 @@ class SubnetDNSCompatibilityIntegratorTestCase(testlib_api.SqlTestCase):
             'device_id': [payload.resource_id],
             'device_owner': [subnet_dns_integrator.TF_DNS_DEVICE_OWNER]}
         expected_calls = [
-            mock.call.get_ports(payload.context, filters=expected_filter)]
+            mock.call.get_ports(payload.context, filters=expected_filter,
+                                fields=['id', 'fixed_ips'])]
         self.core_plugin.assert_has_calls(expected_calls)
         self.core_plugin.delete_port.assert_not_called()
 
@@ -144,7 +148,8 @@ class SubnetDNSCompatibilityIntegratorTestCase(testlib_api.SqlTestCase):
             'network_id': [payload.resource_id],
             'device_owner': [subnet_dns_integrator.TF_DNS_DEVICE_OWNER]}
         expected_calls = [
-            mock.call.get_ports(payload.context, filters=expected_filter),
+            mock.call.get_ports(payload.context, filters=expected_filter,
+                                fields=['id', 'fixed_ips']),
             mock.call.delete_port(payload.context, ports[0]['id']),
             mock.call.delete_port(payload.context, ports[1]['id'])]
         self.core_plugin.assert_has_calls(expected_calls)
@@ -162,7 +167,8 @@ class SubnetDNSCompatibilityIntegratorTestCase(testlib_api.SqlTestCase):
             'network_id': [payload.resource_id],
             'device_owner': [subnet_dns_integrator.TF_DNS_DEVICE_OWNER]}
         expected_calls = [
-            mock.call.get_ports(payload.context, filters=expected_filter)]
+            mock.call.get_ports(payload.context, filters=expected_filter,
+                                fields=['id', 'fixed_ips'])]
         self.core_plugin.assert_has_calls(expected_calls)
         self.core_plugin.delete_port.assert_not_called()
 
@@ -181,7 +187,7 @@ class SubnetDNSCompatibilityIntegratorTestCase(testlib_api.SqlTestCase):
 
         expected_filters = {'network_id': [payload.resource_id]}
         self.core_plugin.get_subnets.assert_called_with(
-            payload.context, filters=expected_filters)
+            payload.context, filters=expected_filters, fields=['id'])
         expected_tf_calls = [
             mock.call.get_subnet(payload.context, subnet1['id']),
             mock.call.get_subnet(payload.context, subnet2['id'])]
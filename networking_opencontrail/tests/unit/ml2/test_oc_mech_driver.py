@@ -17,6 +17,8 @@
 import mock
 
 from neutron.tests.unit import testlib_api
+from oslo_config import cfg
+from oslo_utils import uuidutils
 
 from networking_opencontrail.ml2 import mech_driver
 
@@ -254,7 +256,8 @@ class OpenContrailTestCases(testlib_api.SqlTestCase):
 
         expected_calls.append(
             mock.call.OpenContrailDrivers().update_port(
-                port_context._plugin_context, port_id, port))
+                port_context._plugin_context, port_id, port,
+                original=port_context.original))
 
         mech_driver.drv.assert_has_calls(expected_calls)
 
@@ -284,13 +287,207 @@ class OpenContrailTestCases(testlib_api.SqlTestCase):
 
         expected_calls.append(
             mock.call.OpenContrailDrivers().update_port(
-                port_context._plugin_context, port_id, port))
+                port_context._plugin_context, port_id, port,
+                original=port_context.original))
 
         mech_driver.drv.assert_has_calls(expected_calls)
         self.drv.dm_integrator.sync_vlan_tagging_for_port.assert_called_with(
             port_context._plugin_context, port_context.current,
             port_context.original)
 
+    @mock.patch("networking_opencontrail.ml2.mech_driver.registry")
+    @mock.patch("networking_opencontrail.ml2.mech_driver.journal")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_journal_records_operations(self, config, journal, registry):
+        config.JOURNAL.enabled = True
+        config.APISERVER.port_update_coalescing_window = 0
+        config.APISERVER.port_create_batch_window = 0
+        self.drv.initialize()
+        port_context, port = self.get_port_context('ten-1', 'net-1', 'port-1')
+
+        self.drv.update_port_precommit(port_context)
+
+        journal.JournalThread.assert_called_once_with(
+            self.drv._sync_journal_entry)
+        journal.JournalThread().record.assert_called_once_with(
+            port_context._plugin_context, 'port', 'port-1', 'update',
+            {'port': port['port'], 'original': port_context.original})
+        journal.JournalThread().notify.assert_not_called()
+
+        self.drv.update_port_postcommit(port_context)
+
+        journal.JournalThread().record.assert_called_once()
+        journal.JournalThread().notify.assert_called_once_with()
+        self.drv.drv.update_port.assert_not_called()
+
+    @mock.patch("networking_opencontrail.ml2.mech_driver.registry")
+    @mock.patch("networking_opencontrail.ml2.mech_driver.journal")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_journal_record_error_fails_precommit(self, config, journal,
+                                                  registry):
+        config.JOURNAL.enabled = True
+        config.APISERVER.port_update_coalescing_window = 0
+        config.APISERVER.port_create_batch_window = 0
+        self.drv.initialize()
+        journal.JournalThread().record.side_effect = RuntimeError()
+        net_context, _ = self.get_network_context('ten-1', 'net-1')
+
+        self.assertRaises(RuntimeError,
+                          self.drv.create_network_precommit, net_context)
+
+    @mock.patch("networking_opencontrail.ml2.mech_driver.registry")
+    @mock.patch("networking_opencontrail.ml2.mech_driver.journal")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_journal_is_started_in_each_worker(self, config, journal,
+                                               registry):
+        config.JOURNAL.enabled = True
+        config.APISERVER.port_update_coalescing_window = 0
+        config.APISERVER.port_create_batch_window = 0
+
+        self.drv.initialize()
+
+        journal.JournalThread().start.assert_not_called()
+        callback, resource, event = registry.subscribe.call_args[0]
+        self.assertEqual((mech_driver.resources.PROCESS,
+                          mech_driver.events.AFTER_INIT), (resource, event))
+        callback(resource, event, mock.Mock())
+        journal.JournalThread().start.assert_called_once_with()
+
+    def test_precommit_does_not_record_without_journal(self):
+        net_context, _ = self.get_network_context('ten-1', 'net-1')
+
+        self.drv.create_network_precommit(net_context)
+
+        self.assertIsNone(self.drv.journal)
+
+    def test_journal_entry_is_synced_with_driver(self):
+        network = {'id': 'net-1', 'name': 'net'}
+        plugin_context = mock.Mock()
+
+        self.drv._sync_journal_entry(plugin_context, 'network', 'update',
+                                     {'network': network})
+
+        self.drv.drv.update_network.assert_called_once_with(
+            plugin_context, 'net-1', {'network': network})
+
+    @mock.patch("networking_opencontrail.common.utils.detach_context")
+    @mock.patch("networking_opencontrail.common.coalescer.eventlet")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_port_updates_are_coalesced(self, config, eventlet,
+                                        detach_context):
+        config.JOURNAL.enabled = False
+        config.APISERVER.port_update_coalescing_window = 0.5
+        config.APISERVER.port_create_batch_window = 0
+        self.drv.initialize()
+        self.drv.drv = mock.MagicMock()
+        first_context, _ = self.get_port_context('ten-1', 'net-1', 'port-1')
+        last_context, last_port = self.get_port_context(
+            'ten-1', 'net-1', 'port-1', port_name='renamed')
+
+        self.drv.update_port_postcommit(first_context)
+        self.drv.update_port_postcommit(last_context)
+        self.drv.drv.update_port.assert_not_called()
+        self.drv.port_update_coalescer.flush('port-1')
+
+        eventlet.spawn_after.assert_called_once_with(
+            0.5, self.drv.port_update_coalescer.flush, 'port-1')
+        detach_context.assert_called_with(last_context._plugin_context)
+        self.drv.drv.update_port.assert_called_once_with(
+            detach_context.return_value, 'port-1', last_port,
+            original=first_context.original)
+        self.assertEqual(1, self.drv.port_update_coalescer.stats['collapsed'])
+
+    @mock.patch("networking_opencontrail.common.utils.detach_context")
+    @mock.patch("networking_opencontrail.common.coalescer.eventlet")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_port_creates_are_batched(self, config, eventlet,
+                                      detach_context):
+        config.JOURNAL.enabled = False
+        config.APISERVER.port_update_coalescing_window = 0
+        config.APISERVER.port_create_batch_window = 0.2
+        self.drv.initialize()
+        self.drv.drv = mock.MagicMock()
+        first_context, first_port = self.get_port_context(
+            'ten-1', 'net-1', 'port-1')
+        second_context, second_port = self.get_port_context(
+            'ten-1', 'net-1', 'port-2')
+        second_context._plugin_context = first_context._plugin_context
+        self.drv.drv.create_ports.return_value = [
+            first_port['port'], Exception()]
+
+        self.drv.create_port_postcommit(first_context)
+        self.drv.create_port_postcommit(second_context)
+        self.drv.drv.create_ports.assert_not_called()
+        self.drv.port_create_batcher.flush(
+            detach_context.return_value.request_id)
+
+        detach_context.assert_called_with(first_context._plugin_context)
+        self.drv.drv.create_ports.assert_called_once_with(
+            detach_context.return_value, [first_port, second_port])
+        self.drv.drv.create_port.assert_not_called()
+
+    @mock.patch("networking_opencontrail.common.coalescer.eventlet")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_batched_port_create_flushed_before_update(self, config,
+                                                       eventlet):
+        config.JOURNAL.enabled = False
+        config.APISERVER.port_update_coalescing_window = 0
+        config.APISERVER.port_create_batch_window = 0.2
+        self.drv.initialize()
+        self.drv.drv = mock.MagicMock()
+        port_context, port = self.get_port_context('ten-1', 'net-1',
+                                                   'port-1')
+
+        self.drv.create_port_postcommit(port_context)
+        self.drv.update_port_postcommit(port_context)
+
+        self.assertEqual(
+            ['create_ports', 'update_port'],
+            [call[0] for call in self.drv.drv.method_calls])
+
+    @mock.patch("networking_opencontrail.common.coalescer.eventlet")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_only_batch_of_updated_port_is_flushed(self, config, eventlet):
+        config.JOURNAL.enabled = False
+        config.APISERVER.port_update_coalescing_window = 0
+        config.APISERVER.port_create_batch_window = 0.2
+        self.drv.initialize()
+        self.drv.drv = mock.MagicMock()
+        port_context, port = self.get_port_context('ten-1', 'net-1',
+                                                   'port-1')
+        other_context, other_port = self.get_port_context('ten-2', 'net-2',
+                                                          'port-2')
+
+        self.drv.create_port_postcommit(port_context)
+        self.drv.create_port_postcommit(other_context)
+        self.drv.update_port_postcommit(port_context)
+        self.drv.update_port_postcommit(port_context)
+
+        self.drv.drv.create_ports.assert_called_once_with(
+            mock.ANY, [port])
+        self.drv.port_create_batcher.flush_all()
+        self.assertEqual(2, self.drv.drv.create_ports.call_count)
+        self.drv.drv.create_ports.assert_called_with(
+            mock.ANY, [other_port])
+
+    @mock.patch("networking_opencontrail.common.coalescer.eventlet")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_pending_port_update_dropped_on_delete(self, config, eventlet):
+        config.JOURNAL.enabled = False
+        config.APISERVER.port_update_coalescing_window = 0.5
+        config.APISERVER.port_create_batch_window = 0
+        self.drv.initialize()
+        self.drv.drv = mock.MagicMock()
+        port_context, _ = self.get_port_context('ten-1', 'net-1', 'port-1')
+
+        self.drv.update_port_postcommit(port_context)
+        self.drv.delete_port_postcommit(port_context)
+        self.drv.port_update_coalescer.flush('port-1')
+
+        self.drv.drv.update_port.assert_not_called()
+        self.drv.drv.delete_port.assert_called_once_with(
+            port_context._plugin_context, 'port-1')
+
     def test_create_port_omit_callback(self):
         network_id = 'test_net1'
         tenant_id = 'ten-1'
@@ -362,6 +559,60 @@ class OpenContrailTestCases(testlib_api.SqlTestCase):
 
         self.drv.drv.bind_port.assert_called_with(context)
 
+    def _get_bind_context(self, host_id="asd"):
+        context = mock.Mock()
+        context._port = {"binding:host_id": host_id}
+        context.current = {"id": "port-1"}
+        context.network.current = {"id": "net-1"}
+        return context
+
+    @mock.patch("networking_opencontrail.ml2.mech_driver.registry")
+    @mock.patch("networking_opencontrail.ml2.mech_driver.journal")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_journal_sets_port_binding(self, config, journal, registry):
+        config.JOURNAL.enabled = True
+        config.APISERVER.port_update_coalescing_window = 0
+        config.APISERVER.port_create_batch_window = 0
+        config.APISERVER.vrouter_cache_ttl = 0
+        self.drv.initialize()
+        self.drv.tf_client = mock.MagicMock()
+        context = self._get_bind_context()
+
+        self.drv.bind_port(context)
+
+        # Binding is recorded by update_port_precommit when it is committed
+        journal.JournalThread().record.assert_not_called()
+        self.drv.drv.set_port_binding.assert_called_once_with(context)
+        self.drv.drv.bind_port.assert_not_called()
+
+    def test_bind_port_remembers_vrouter_host(self):
+        self.drv.bind_port(self._get_bind_context())
+        self.drv.bind_port(self._get_bind_context())
+        self.drv.bind_port(self._get_bind_context("other"))
+
+        self.assertEqual(2, self.drv.tf_client.get_virtual_router.call_count)
+        self.assertEqual(3, self.drv.drv.bind_port.call_count)
+
+    def test_bind_port_remembers_host_without_vrouter(self):
+        self.drv.tf_client.get_virtual_router.return_value = None
+
+        self.drv.bind_port(self._get_bind_context())
+        self.drv.bind_port(self._get_bind_context())
+
+        self.drv.tf_client.get_virtual_router.assert_called_once_with(
+            fq_name=[self.drv.tf_client.DEFAULT_GLOBAL_CONF, "asd"])
+        self.drv.drv.bind_port.assert_not_called()
+
+    def test_bind_port_vrouter_cache_disabled(self):
+        cfg.CONF.set_override('vrouter_cache_ttl', 0, 'APISERVER')
+        self.addCleanup(cfg.CONF.clear_override, 'vrouter_cache_ttl',
+                        'APISERVER')
+
+        self.drv.bind_port(self._get_bind_context())
+        self.drv.bind_port(self._get_bind_context())
+
+        self.assertEqual(2, self.drv.tf_client.get_virtual_router.call_count)
+
     def test_create_security_group(self):
         ctx = fake_plugin_context('ten-1')
         sg = {'id': 'sg-1', 'name': 'test-security-group'}
@@ -524,4 +775,5 @@ class fake_plugin_context(object):
 
     def __init__(self, tenant_id):
         self.tenant_id = tenant_id
+        self.request_id = uuidutils.generate_uuid()
         self.session = mock.MagicMock()
@@ -0,0 +1,237 @@
+# Copyright (c) 2019 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import mock
+from oslo_config import cfg
+
+from networking_opencontrail.common import utils
+from networking_opencontrail.sync import full_sync
+from networking_opencontrail.tests import base
+
+
+class FakePlugin(object):
+    """Neutron plugin serving resources of given types, with pagination."""
+
+    def __init__(self, resources):
+        self.resources = resources
+        self.list_calls = []
+
+    def __getattr__(self, name):
+        res_type = name[len('get_'):]
+        if res_type in self.resources:
+            return lambda context, res_id: dict(self.resources[res_type][
+                res_id])
+        if res_type.endswith('s') and res_type[:-1] in self.resources:
+            return lambda context, **kwargs: self._list(res_type[:-1],
+                                                        **kwargs)
+        raise AttributeError(name)
+
+    def _list(self, res_type, fields, sorts, limit, marker):
+        self.list_calls.append((res_type, marker))
+        items = sorted(self.resources[res_type].values(),
+                       key=lambda item: item['id'])
+        if marker is not None:
+            items = [item for item in items if item['id'] > marker]
+        return [{field: item.get(field) for field in fields}
+                for item in items[:limit]]
+
+
+class DigestTestCase(base.TestCase):
+    def test_unsynced_attributes_are_ignored(self):
+        port = {'id': 'port-1', 'name': 'port',
+                'fixed_ips': [{'ip_address': '10.0.0.2', 'subnet_id': 'a'},
+                              {'ip_address': '10.0.0.1', 'subnet_id': 'a'}]}
+        contrail_port = {'id': 'port-1', 'name': 'port', 'status': 'ACTIVE',
+                         'fixed_ips': [{'ip_address': '10.0.0.1'},
+                                       {'ip_address': '10.0.0.2'}]}
+
+        self.assertEqual(full_sync.get_digest('port', port),
+                         full_sync.get_digest('port', contrail_port))
+
+    def test_changed_attribute_changes_digest(self):
+        network = {'id': 'net-1', 'name': 'network', 'admin_state_up': True}
+
+        self.assertNotEqual(
+            full_sync.get_digest('network', network),
+            full_sync.get_digest('network', dict(network, name='renamed')))
+
+    def test_default_security_group_matches_renamed_one(self):
+        self.assertEqual(
+            full_sync.get_digest('security_group', {'name': 'default'}),
+            full_sync.get_digest('security_group', {
+                'name': 'default-openstack',
+                'description': 'default-openstack security group'}))
+
+    def test_diff(self):
+        diff = full_sync.compute_diff({'a': '1', 'b': '2', 'c': '3'},
+                                      {'b': '2', 'c': 'x', 'd': '4'})
+
+        self.assertEqual(full_sync.SyncDiff(['a'], ['c'], ['d']), diff)
+
+
+class FullSyncTestCase(base.TestCase):
+    def setUp(self):
+        super(FullSyncTestCase, self).setUp()
+        utils.register_vnc_api_options()
+        cfg.CONF.set_override('page_size', 2, 'FULL_SYNC')
+        self.addCleanup(cfg.CONF.clear_override, 'page_size', 'FULL_SYNC')
+
+        self.core_plugin = FakePlugin({
+            'network': {}, 'subnet': {}, 'security_group': {}, 'port': {}})
+        self.l3_plugin = FakePlugin({'router': {}, 'floatingip': {}})
+        directory = mock.patch(
+            "networking_opencontrail.sync.full_sync.directory").start()
+        directory.get_plugin.side_effect = (
+            lambda alias=None: self.l3_plugin if alias else self.core_plugin)
+        mock.patch("networking_opencontrail.sync.full_sync.n_context").start()
+        self.addCleanup(mock.patch.stopall)
+
+        self.contrail = {res_type: [] for res_type in full_sync.SYNCED_FIELDS}
+        self.driver = mock.Mock()
+        self.driver.iter_resources.side_effect = (
+            lambda res_type, context, fields: iter(self.contrail[res_type]))
+
+    def _make_sync(self, **kwargs):
+        return full_sync.FullSync(driver=self.driver, **kwargs)
+
+    def _add_networks(self, count):
+        networks = self.core_plugin.resources['network']
+        for index in range(count):
+            network_id = 'net-%d' % index
+            networks[network_id] = {'id': network_id, 'name': network_id,
+                                    'admin_state_up': True, 'shared': False,
+                                    'tenant_id': 'tenant'}
+        return networks
+
+    def test_missing_resources_are_created(self):
+        networks = self._add_networks(3)
+
+        report = self._make_sync().run()
+
+        self.driver.create_network.assert_has_calls([
+            mock.call(mock.ANY, {'network': networks['net-%d' % index]})
+            for index in range(3)], any_order=True)
+        self.assertEqual(3, report['resources']['network']['created'])
+        self.assertEqual(3, report['resources']['network']['missing'])
+        # Pages of 2 networks
+        self.assertEqual([('network', None), ('network', 'net-1')],
+                         [call for call in self.core_plugin.list_calls
+                          if call[0] == 'network'])
+        self.assertIn('list network in neutron', report['timings'])
+        self.assertIn('create network', report['timings'])
+
+    def test_outdated_resources_are_updated(self):
+        networks = self._add_networks(2)
+        self.contrail['network'] = [
+            networks['net-0'], dict(networks['net-1'], name='old')]
+
+        report = self._make_sync().run()
+
+        self.driver.create_network.assert_not_called()
+        self.driver.update_network.assert_called_once_with(
+            mock.ANY, 'net-1', {'network': networks['net-1']})
+        self.assertEqual(1, report['resources']['network']['updated'])
+
+    @mock.patch("networking_opencontrail.ml2.subnet_dns_integrator."
+                "SubnetDNSCompatibilityIntegrator")
+    def test_dns_port_is_added_for_created_subnet(self, integrator):
+        self.core_plugin.resources['subnet']['subnet-1'] = {
+            'id': 'subnet-1', 'network_id': 'net-1', 'cidr': '10.0.0.0/24'}
+
+        self._make_sync().run()
+
+        integrator.assert_called_once_with(self.driver, subscribe=False)
+        add_dns_port = integrator.return_value.add_dns_port_for_subnet
+        add_dns_port.assert_called_once_with(
+            mock.ANY, self.driver.create_subnet.return_value)
+
+    def test_omitted_ports_are_not_synchronized(self):
+        self.core_plugin.resources['port']['port-1'] = {
+            'id': 'port-1', 'device_owner': 'network:floatingip'}
+
+        report = self._make_sync().run()
+
+        self.driver.create_port.assert_not_called()
+        self.assertEqual(0, report['resources']['port']['neutron'])
+
+    def test_extra_resources_are_only_reported_by_default(self):
+        self.contrail['network'] = [{'id': 'net-1'}]
+
+        report = self._make_sync().run()
+
+        self.driver.delete_network.assert_not_called()
+        self.assertEqual(1, report['resources']['network']['extra'])
+
+    def test_extra_resources_are_deleted_children_first(self):
+        self.contrail['network'] = [{'id': 'net-1'}]
+        self.contrail['port'] = [{'id': 'port-1'}]
+
+        self._make_sync(delete_extra=True).run()
+
+        deletions = [call for call in self.driver.mock_calls
+                     if call[0].startswith('delete_')]
+        self.assertEqual([mock.call.delete_port(mock.ANY, 'port-1'),
+                          mock.call.delete_network(mock.ANY, 'net-1')],
+                         deletions)
+
+    def test_dry_run_does_not_change_contrail(self):
+        self._add_networks(1)
+        self.contrail['port'] = [{'id': 'port-1'}]
+
+        report = self._make_sync(dry_run=True, delete_extra=True).run()
+
+        self.driver.create_network.assert_not_called()
+        self.driver.delete_port.assert_not_called()
+        self.assertEqual(1, report['resources']['network']['missing'])
+
+    def test_failures_are_counted(self):
+        self._add_networks(2)
+        self.driver.create_network.side_effect = [None, RuntimeError()]
+
+        report = self._make_sync().run()
+
+        self.assertEqual(1, report['resources']['network']['created'])
+        self.assertEqual(1, report['resources']['network']['failed'])
+        self.assertIn('network', full_sync.format_report(report))
+
+    def test_l3_resources_are_skipped_without_l3_plugin(self):
+        self.l3_plugin = None
+
+        report = self._make_sync().run()
+
+        self.assertNotIn('router', report['resources'])
+        self.assertNotIn('router', [call[0][0] for call in
+                                    self.driver.iter_resources.call_args_list])
+
+
+class FullSyncWorkerTestCase(base.TestCase):
+    @mock.patch("networking_opencontrail.sync.full_sync.eventlet")
+    def test_sync_is_run_in_green_thread(self, eventlet):
+        worker = full_sync.FullSyncWorker(60)
+
+        worker.start()
+        worker.stop()
+
+        eventlet.spawn.assert_called_once_with(worker._run)
+        eventlet.spawn().kill.assert_called_once_with()
+
+    @mock.patch("networking_opencontrail.sync.full_sync.FullSync")
+    def test_sync_error_does_not_stop_worker(self, sync):
+        sync().run.side_effect = RuntimeError()
+        worker = full_sync.FullSyncWorker(60)
+
+        worker._sync()
+
+        sync().run.assert_called_once_with()